@@ -3,32 +3,38 @@ from flask_cors import CORS
 import pyrebase 
 import json 
 import os  
-from .models import db
+from .models import db, ensure_indexes, apply_sqlite_profile, sqlite_engine_options
 from flask_migrate import Migrate
 from .config import Config
-from .service.vehicle import VehicleService
+from .service.vehicle import VehicleService, apply_firebase_event
+from .service.firebase_writer import FirebaseWriter
+from .service.stats import ensure_revenue_rollup
+from .service.session_index import active_sessions
+from .service.price import price_cache
+from .service.journal import journal
+from .service.response_cache import response_cache
+from .service.metrics import metrics, instrument_firebase
+from .service.logs import logging_setup
 import logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('parking.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 migrate = Migrate()
 
-def create_app():     
+def create_app(config=None, firebase_db=None):     
+    """
+    `config` overrides settings of Config (database URI, folders...).
+    `firebase_db` is a pyrebase-compatible database object used instead of the one built from
+    config/firebaseConfig.json, e.g. the in-memory fake of the benchmarks.
+    """
     # Tạo ứng dụng Flask
     app = Flask(__name__)
     app.config.from_object(Config)
     app.config['IMAGE_FOLDER'] = 'app/static/images'
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///example.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if config:
+        app.config.update(config)
     
     # Ensure instance folder exists
     try:
@@ -36,7 +42,33 @@ def create_app():
     except OSError:
         pass
     
+    # Logging through a queue listener thread, with rotation
+    logging_setup.configure(
+        app.config['LOG_PATH'],
+        level=app.config['LOG_LEVEL'],
+        max_bytes=app.config['LOG_MAX_BYTES'],
+        backup_count=app.config['LOG_BACKUP_COUNT'],
+        when=app.config['LOG_ROTATE_WHEN'],
+        log_format=app.config['LOG_FORMAT']
+    )
+    
+    # Change journal of gate events
+    journal.configure(
+        app.config['JOURNAL_PATH'],
+        max_bytes=app.config['JOURNAL_MAX_BYTES'],
+        backup_count=app.config['JOURNAL_BACKUP_COUNT'],
+        sample_rate=app.config['JOURNAL_SAMPLE_RATE']
+    )
+    
+    # Cache of the read endpoints, invalidated by the write paths of this process
+    response_cache.configure(
+        enabled=app.config['RESPONSE_CACHE_ENABLED'],
+        max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+        max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES']
+    )
+    
     # Initialize SQLAlchemy and Migrate
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options(app.config)
     db.init_app(app)
     migrate.init_app(app, db)
     
@@ -44,28 +76,50 @@ def create_app():
     from .routes import routes
     app.register_blueprint(routes)
     
+    # Latency metrics exposed at /metrics
+    metrics.configure(slow_request_seconds=app.config['METRICS_SLOW_REQUEST_SECONDS'])
+    
     # Create tables
     with app.app_context():
+        metrics.instrument_engine(db.engine)
+        apply_sqlite_profile(db.engine, app.config['SQLITE_PROFILES'][app.config['SQLITE_PROFILE']])
         db.create_all()
-        print("Database tables created successfully")
+        ensure_indexes()
+        ensure_revenue_rollup()
+        logger.info("Database tables created successfully")
+        logger.info("Active session index warmed with %d plates", active_sessions.warm())
     
     # Cấu hình CORS
     CORS(app,supports_credentials=True, resources={r"/*": {"origins": "*"}})      
     if not os.path.exists('static'):
         os.makedirs('static')
     
-    # Load Firebase configuration
-    config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'firebaseConfig.json')
-    
-    # Đọc file cấu hình
-    with open(config_path, "r") as config_file:
-        firebase_config = json.load(config_file)      
+    if firebase_db is None:
+        # Load Firebase configuration
+        config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'firebaseConfig.json')
+        
+        # Đọc file cấu hình
+        with open(config_path, "r") as config_file:
+            firebase_config = json.load(config_file)      
 
-    # Khởi tạo Firebase
-    firebase = pyrebase.initialize_app(firebase_config)
-    app.config['DB'] = firebase.database() 
+        # Khởi tạo Firebase
+        firebase = pyrebase.initialize_app(firebase_config)
+        firebase_db = firebase.database()
+        # pyrebase's child() mutates the Database object: the writer thread gets its own
+        writer_db = firebase.database()
+    else:
+        writer_db = firebase_db
+    # Every Firebase call goes through a timed wrapper
+    app.config['DB'] = instrument_firebase(firebase_db)
     app.config['SQLDB'] = db
 
+    # Firebase side effects of the gate are pushed in the background from the outbox
+    app.config['FIREBASE_WRITER'] = FirebaseWriter(app, instrument_firebase(writer_db), apply_firebase_event).start()
+
+    # Exit price is served from memory and followed through a Firebase stream
+    price_cache.refresh(app.config['DB'])
+    price_cache.listen(app.config['DB'])
+
     # Đảm bảo thư mục static tồn tại
     static_path = os.path.join(os.path.dirname(__file__), '..', 'static', 'images')
     os.makedirs(app.config['IMAGE_FOLDER'], exist_ok=True)
@@ -75,8 +129,8 @@ def create_app():
         try:
             logger.info("Starting initial sync to Firebase...")
             results = VehicleService.sync_vehicles_to_firebase(app.config['DB'])
-            logger.info(f"Initial sync completed: {results}")
+            logger.info("Initial sync completed: %s", results)
         except Exception as e:
-            logger.error(f"Failed to sync to Firebase: {str(e)}")
+            logger.error("Failed to sync to Firebase: %s", e)
 
     return app                  
\ No newline at end of file
@@ -4,9 +4,71 @@ class Config:
     # Database configuration
     SQLALCHEMY_DATABASE_URI = 'sqlite:///parking.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite engine profile, applied to every new connection (see apply_sqlite_profile)
+    # - default: SQLite defaults (rollback journal, writers block readers)
+    # - tuned: WAL so dashboard reads do not block gate writes, and a busy timeout
+    #   instead of immediate "database is locked" errors
+    SQLITE_PROFILE = 'tuned'
+    SQLITE_PROFILES = {
+        'default': {},
+        'tuned': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',  # Safe with WAL, fsync only at checkpoints
+            'busy_timeout': 5000,  # ms
+            'cache_size': -20000,  # Negative = KiB, i.e. 20 MB page cache per connection
+            'mmap_size': 268435456,  # 256 MB
+            'temp_store': 'MEMORY',
+        },
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': False,
+        'connect_args': {
+            'timeout': 30,  # Seconds the sqlite3 driver waits for a lock
+            'check_same_thread': False,
+        },
+    }
+    # Connection pool of file databases, added by sqlite_engine_options (in-memory SQLite uses a StaticPool without sizing)
+    SQLITE_FILE_POOL_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+    }
     
+    # Tariff applied on exit (see app/service/tariff.py), None = the flat Firebase `price` per session, e.g.
+    # {'hourly_rate': 2, 'bands': [{'start': '18:00', 'end': '06:00', 'rate': 1}], 'grace_minutes': 10, 'daily_max': 30}
+    TARIFF = None
+
     # Image upload configuration
     IMAGE_FOLDER = 'app/static/images'
+
+    # Requests slower than this (seconds) are logged with their SQL/Firebase/image breakdown, None disables
+    METRICS_SLOW_REQUEST_SECONDS = 1.0
+
+    # Resized variants served by /api/images (LRU, trimmed to the size below)
+    THUMBNAIL_FOLDER = 'app/static/thumbnails'
+    THUMBNAIL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+    # Application log, written by a queue listener thread; size-based rotation unless
+    # LOG_ROTATE_WHEN is set ('midnight', 'H'...), LOG_FORMAT is 'text' or 'json'
+    LOG_PATH = 'parking.log'
+    LOG_LEVEL = 'INFO'
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+    LOG_ROTATE_WHEN = None
+    LOG_FORMAT = 'text'
+
+    # In-memory cache of the read endpoints (see app/service/response_cache.py). Its invalidation
+    # is process-local: disable it when running several worker processes
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_MAX_ENTRIES = 256
+    RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+    # Change journal of gate events (size-based rotation, 1.0 = record every change)
+    JOURNAL_PATH = 'journal.log'
+    JOURNAL_MAX_BYTES = 5 * 1024 * 1024
+    JOURNAL_BACKUP_COUNT = 5
+    JOURNAL_SAMPLE_RATE = 1.0
     
     # Ensure upload folder exists
     @staticmethod
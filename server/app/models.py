@@ -3,7 +3,8 @@ from datetime import datetime
 import random
 import string
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Enum
+from sqlalchemy import Enum, event
+from sqlalchemy.engine import make_url
 from decimal import Decimal
 from werkzeug.security import generate_password_hash
 
@@ -27,8 +28,18 @@ class VehicleDB(db.Model):
 
 class ParkingSession(db.Model):
     __tablename__ = 'parking_sessions'
+    __table_args__ = (
+        # Thứ tự (checkin_time, id) của phân trang keyset, có và không lọc theo xe
+        db.Index('ix_parking_sessions_checkin_id', 'checkin_time', 'id'),
+        db.Index('ix_parking_sessions_vehicle_checkin_id', 'vehicle_id', 'checkin_time', 'id'),
+        # Chỉ mục phủ cho giả lập biểu giá: đọc checkin/checkout theo khoảng mà không chạm vào bảng
+        db.Index('ix_parking_sessions_checkin_checkout', 'checkin_time', 'checkout_time'),
+        # Phiên vào trước một khoảng thời gian mà chưa ra trước khi khoảng đó bắt đầu (thống kê số xe trong bãi)
+        db.Index('ix_parking_sessions_checkout_checkin', 'checkout_time', 'checkin_time'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
+    # Các chỉ mục ghép ở trên bắt đầu bằng vehicle_id, checkin_time và checkout_time: không cần chỉ mục đơn cột
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id'), nullable=False)
     checkin_time = db.Column(db.DateTime, nullable=False)
     checkout_time = db.Column(db.DateTime)
@@ -41,12 +52,84 @@ class ParkingSession(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # Thứ tự (paid_at, id) của phân trang keyset, có và không lọc theo phương thức thanh toán
+        db.Index('ix_transactions_paid_at_id', 'paid_at', 'id'),
+        db.Index('ix_transactions_method_paid_at_id', 'payment_method', 'paid_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    session_id = db.Column(db.Integer, db.ForeignKey('parking_sessions.id'), nullable=False)
+    session_id = db.Column(db.Integer, db.ForeignKey('parking_sessions.id'), nullable=False, index=True)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     payment_method = db.Column(Enum('cash', 'card', 'e-wallet', name='payment_method_enum'), nullable=False)
     paid_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+class RevenueRollup(db.Model):
+    """Doanh thu cộng dồn theo giờ và phương thức thanh toán, cập nhật cùng lúc với Transaction"""
+    __tablename__ = 'revenue_hourly'
+    hour = db.Column(db.DateTime, primary_key=True)  # Đầu giờ (giờ địa phương, không timezone)
+    payment_method = db.Column(Enum('cash', 'card', 'e-wallet', name='payment_method_enum'), primary_key=True)
+    amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+
+class FirebaseOutbox(db.Model):
+    """Các thao tác Firebase chưa được gửi, ghi cùng transaction với thay đổi SQLite"""
+    __tablename__ = 'firebase_outbox'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    plate_number = db.Column(db.String(20))  # Khóa gộp sự kiện, None cho sự kiện không theo xe
+    event = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Single-column indexes of earlier versions, covered by the leading column of a composite index
+REDUNDANT_INDEXES = (
+    'ix_parking_sessions_vehicle_id',
+    'ix_parking_sessions_checkin_time',
+    'ix_parking_sessions_checkout_time',
+)
+
+def ensure_indexes():
+    """
+    Create indexes declared on the models that are missing from an existing database,
+    and drop the redundant ones so gate writes do not maintain them.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    with db.engine.begin() as connection:
+        for name in REDUNDANT_INDEXES:
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+def sqlite_engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS of `config` for its database URI: the pool sizing of
+    SQLITE_FILE_POOL_OPTIONS only applies to file databases, in-memory SQLite rejects it.
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    in_memory = url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory')
+    if not in_memory:
+        for name, value in (config.get('SQLITE_FILE_POOL_OPTIONS') or {}).items():
+            options.setdefault(name, value)
+    return options
+
+def apply_sqlite_profile(engine, pragmas):
+    """Run the PRAGMAs of a SQLite profile on every new connection of `engine`."""
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    # Connections opened before the listener was added do not have the profile
+    engine.dispose()
+
 class Vehicle:
     @staticmethod
     def create(license_plate=None):
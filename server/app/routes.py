@@ -1,21 +1,46 @@
-from flask import request, jsonify, current_app, Blueprint, send_from_directory
+from flask import request, jsonify, current_app, Blueprint, send_from_directory, send_file, Response, stream_with_context
 from . import create_app
-from .service.vehicle import VehicleService, set_door_status, get_door_status
+from .service.vehicle import VehicleService, set_door_status, get_door_status, set_image_src_last_scan, validate_batch_event, MAX_BATCH_EVENTS
 from .models import Vehicle, VehicleDB, ParkingSession, Transaction
 from .state.init import state
 import os
-from .utils.index import store_image
+import json
+import logging
+from .utils.index import store_image, parse_pagination, parse_keyset, keyset_page, format_time_since, get_image_store, get_thumbnail_cache
+from .utils.thumbnails import snap_width, source_version, UnsupportedImage
 from werkzeug.security import generate_password_hash, check_password_hash
 from .models import UserDB
 from datetime import datetime, timedelta
 import pytz
 from sqlalchemy import func
 from .service.vehicle import get_vietnam_time
+from .service.stats import StatsService, add_to_revenue_rollup
+from .service.export import ExportService
+from .service.session_index import active_sessions
+from .service.plates import canonical_plate
+from .service.price import price_cache
+from .service.tariff import Tariff, current_tariff, simulate_tariff
+from .service.journal import journal
+from .service.response_cache import response_cache
+from .service.metrics import metrics
 routes = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
+metrics.instrument_blueprint(routes)
 
 # Define Vietnam timezone
 VIETNAM_TZ = pytz.timezone('Asia/Ho_Chi_Minh')
 
+# Export format -> (stream generator, mimetype)
+EXPORT_FORMATS = {
+    'json': (ExportService.stream_json, 'application/json'),
+    'ndjson': (ExportService.stream_ndjson, 'application/x-ndjson'),
+    'csv': (ExportService.stream_csv, 'text/csv'),
+}
+
+@routes.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @routes.route('/test-connection', methods=['GET'])
 def test_connection():
     try:
@@ -53,6 +78,7 @@ def signup():
     new_user = UserDB(name=name, username=username, password=hashed_password)
     sqldb.session.add(new_user)
     sqldb.session.commit()
+    response_cache.invalidate()
 
     return jsonify({"message": "User created successfully!"}), 201
 @routes.route('/login', methods=['POST'])
@@ -117,24 +143,23 @@ def simulate_exit_vehicle():
         ).first()
 
         if active_session:
-            active_session.checkout_time = datetime.utcnow()
+            active_session.checkout_time = get_vietnam_time()
 
-            # Lấy giá tiền từ Firebase
-            price_data = db.child("price").get()
-            fee = 1.0  # Mặc định
-            if price_data.val() is not None:
-                fee = float(price_data.val())
-
-            active_session.fee = fee
+            # Tính phí theo biểu giá hiện tại (giá cơ bản lấy từ bộ nhớ đệm, đồng bộ với Firebase)
+            fee = current_tariff(db).fee(active_session.checkin_time, active_session.checkout_time)
 
             transaction = Transaction(
                 session_id=active_session.id,
                 amount=fee,
                 payment_method='cash',
-                paid_at=datetime.now().isoformat()
+                paid_at=get_vietnam_time()
             )
             sqldb.session.add(transaction)
+            add_to_revenue_rollup(transaction)
             sqldb.session.commit()
+            active_sessions.close_session(vehicle.plate_number)
+            response_cache.invalidate()
+            journal.record("exit", vehicle.plate_number, session_id=active_session.id, fee=fee, simulated=True)
         else:
             return jsonify({"message": "No active session found"}), 400
         # Gọi service và ghi log
@@ -155,7 +180,7 @@ def toggle_door1():
 @routes.route('/toggle-door2', methods=['POST'])
 def toggle_door2():
     db = current_app.config['DB']
-    print(state['door2']['isOpen'])
+    logger.debug("door2 isOpen: %s", state['door2']['isOpen'])
     if (set_door_status(db, "door2", not state ['door2']['isOpen'])):
         state['door2']['isOpen'] = not state['door2']['isOpen']
         return jsonify({"message": "Door 2 toggled successfully"}), 200
@@ -174,14 +199,44 @@ def upload_file():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
     
-    # Lưu file vào thư mục static/uploads
-    save_path = os.path.join(current_app.config['IMAGE_FOLDER'], file.filename)
-    file.save(save_path)
+    # Lưu file vào kho ảnh (theo hash nội dung)
+    save_path = store_image(file, request.form.get('licensePlate'))
     licensePlate = request.form.get('licensePlate')
     status = request.form.get('status')
-    VehicleService.set_image_src_last_scan(db,save_path,licensePlate,status)
+    set_image_src_last_scan(db,save_path,licensePlate)
     # Trả về đường dẫn file đã lưu
     return jsonify({"message": "File uploaded successfully", "path": save_path}), 200
+@routes.route('/api/images/<path:image_path>', methods=['GET'])
+def get_image(image_path):
+    # ?w=160 -> ảnh thu nhỏ (tạo khi cần, lưu cache), không có w -> ảnh gốc
+    source_path = get_image_store().resolve('/images/' + image_path)
+    if source_path is None or not os.path.isfile(source_path):
+        return jsonify({"error": "Image not found"}), 404
+
+    version, immutable = source_version(source_path)
+    path, etag = source_path, version
+    width = request.args.get('w')
+    if width:
+        try:
+            width = int(width)
+        except ValueError:
+            return jsonify({"error": "w must be an integer"}), 400
+        if width < 1:
+            return jsonify({"error": "w must be positive"}), 400
+        cache = get_thumbnail_cache()
+        if cache.available():
+            try:
+                path, etag = cache.variant(source_path, snap_width(width))
+            except UnsupportedImage:
+                return jsonify({"error": "Stored file is not a supported image"}), 415
+
+    # Content-addressed images never change, so clients can keep them forever
+    max_age = 31536000 if immutable else 300
+    response = send_file(os.path.abspath(path), etag=etag, conditional=True, max_age=max_age)
+    if immutable:
+        response.headers['Cache-Control'] = f"public, max-age={max_age}, immutable"
+    return response
+
 @routes.route('/vehicle/handle', methods=['POST'])
 def handle_vehicle():
     db = current_app.config['DB']
@@ -198,24 +253,185 @@ def handle_vehicle():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
     save_path = store_image(file,licensePlate)
-    print(save_path)
     vehicle = Vehicle.build(save_path,licensePlate,rfid)
-    print("vehicle:     ",vehicle)
+    logger.debug("Scanned vehicle %s, image %s", vehicle, save_path)
     VehicleService.handle_vehicle(db,vehicle,status )
     return jsonify({"message": "Vehicle handled successfully"}), 200
 
+@routes.route('/vehicle/handle/batch', methods=['POST'])
+def handle_vehicle_batch():
+    # Bộ điều khiển cổng gửi lại các lượt quét bị đệm khi mất kết nối, theo đúng thứ tự
+    # JSON: {"events": [...]} hoặc multipart: trường "events" (JSON) + file ảnh, "image" của sự kiện là tên trường file
+    # Camera chỉ gửi URL ảnh: "imageUrl" của sự kiện, tải song song vào kho ảnh
+    db = current_app.config['DB']
+    try:
+        if request.is_json:
+            body = request.get_json(silent=True)
+            events = body.get('events') if isinstance(body, dict) else None
+        else:
+            try:
+                events = json.loads(request.form.get('events', 'null'))
+            except json.JSONDecodeError:
+                events = None
+        if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+            return jsonify({"error": "events must be a list of objects"}), 400
+        if len(events) > MAX_BATCH_EVENTS:
+            return jsonify({"error": f"At most {MAX_BATCH_EVENTS} events per batch"}), 400
+
+        downloads = []
+        for event in events:
+            field = event.pop('image', None)
+            image_url = event.pop('imageUrl', None)
+            # Rejected events are reported by the service, their image is not stored
+            try:
+                validate_batch_event(dict(event))
+            except ValueError:
+                continue
+            file = request.files.get(field) if isinstance(field, str) else None
+            if file is not None and file.filename != '':
+                event['imageSrc'] = store_image(file, event.get('licensePlate'))
+            elif isinstance(image_url, str) and image_url:
+                downloads.append((event, image_url))
+
+        if downloads:
+            stored = VehicleService.store_images([url for _, url in downloads], current_app.config['IMAGE_FOLDER'])
+            for (event, _), image_src in zip(downloads, stored):
+                # A failed download keeps the event, without image
+                if image_src is not None:
+                    event['imageSrc'] = image_src
+
+        results = VehicleService.handle_vehicle_batch(db, events)
+        return jsonify({
+            "applied": sum(1 for result in results if result.get("ok")),
+            "results": results
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@routes.route('/api/active-sessions/check', methods=['GET'])
+def check_active_sessions():
+    try:
+        # Compare the gate in-memory index with SQLite (repair=false only reports)
+        repair = request.args.get('repair', 'true').lower() != 'false'
+        result = active_sessions.check_consistency(repair=repair)
+        result['index'] = active_sessions.stats()
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@routes.route('/api/plates/match', methods=['GET'])
+def match_plate():
+    # Biển số đang đỗ gần nhất với biển số quét được (OCR đọc nhầm 0/O, 8/B, 1/I...)
+    plate = request.args.get('plate')
+    if not plate:
+        return jsonify({"error": "plate is required"}), 400
+    try:
+        max_distance = float(request.args.get('max_distance', 1.0))
+        limit = min(int(request.args.get('limit', 5)), 50)
+    except ValueError:
+        return jsonify({"error": "max_distance must be a number and limit an integer"}), 400
+    try:
+        matches = active_sessions.match(canonical_plate(plate), max_distance, limit)
+        best = active_sessions.resolve(canonical_plate(plate), max_distance)
+        return jsonify({
+            "plate": canonical_plate(plate),
+            "best": best.plate if best else None,
+            "matches": [{
+                "plate": m.plate,
+                "distance": m.distance,
+                "vehicle_id": m.entry.vehicle_id,
+                "session_id": m.entry.session_id,
+                "checkin_time": m.entry.checkin_time.isoformat() if m.entry.checkin_time else None
+            } for m in matches]
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@routes.route('/api/journal', methods=['GET'])
+def get_journal():
+    try:
+        # Audit of recent gate changes, newest first
+        since = request.args.get('since')
+        if since:
+            since = datetime.strptime(since, '%Y-%m-%d')
+        limit = min(int(request.args.get('limit', 100)), 1000)
+        entries = journal.query(
+            plate_number=request.args.get('plate'),
+            action=request.args.get('action'),
+            since=since,
+            limit=limit
+        )
+        return jsonify(entries), 200
+    except ValueError:
+        return jsonify({"error": "Invalid since or limit. Use YYYY-MM-DD and an integer"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+VEHICLE_SORTS = ['id', 'plate_number', 'total_visits', 'last_visit']
+
 @routes.route('/vehicles', methods=['GET'])
 def get_vehicles():
     sqldb = current_app.config['SQLDB']
     try:
-        vehicles = VehicleDB.query.all()
+        sort = request.args.get('sort', 'id')
+        order = request.args.get('order', 'asc')
+        if sort not in VEHICLE_SORTS:
+            return jsonify({"error": f"Invalid sort. Must be one of: {', '.join(VEHICLE_SORTS)}"}), 400
+        if order not in ['asc', 'desc']:
+            return jsonify({"error": "Invalid order. Must be either 'asc' or 'desc'"}), 400
+        pagination = parse_pagination(request.args)
+
+        # Số lượt gửi và lần vào gần nhất tính bằng một GROUP BY vehicle_id (index vehicle_id, checkin_time)
+        visits = sqldb.session.query(
+            ParkingSession.vehicle_id,
+            func.count(ParkingSession.id).label('total_visits'),
+            func.max(ParkingSession.checkin_time).label('last_visit')
+        ).group_by(ParkingSession.vehicle_id).subquery()
+
+        total_visits = func.coalesce(visits.c.total_visits, 0).label('total_visits')
+        last_visit = visits.c.last_visit.label('last_visit')
+        query = sqldb.session.query(
+            VehicleDB.id,
+            VehicleDB.plate_number,
+            total_visits,
+            last_visit
+        ).outerjoin(visits, visits.c.vehicle_id == VehicleDB.id)
+
+        sort_column = {
+            'id': VehicleDB.id,
+            'plate_number': VehicleDB.plate_number,
+            'total_visits': total_visits,
+            'last_visit': last_visit
+        }[sort]
+        if order == 'desc':
+            query = query.order_by(sort_column.desc(), VehicleDB.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), VehicleDB.id.asc())
+
+        if pagination:
+            page, per_page = pagination
+            total = sqldb.session.query(func.count(VehicleDB.id)).scalar()
+            query = query.limit(per_page).offset((page - 1) * per_page)
+
         result = [{
-            'id': v.id,
-            'plate_number': v.plate_number,
-            'total_visits': len(v.parking_sessions),
-            'last_visit': max([s.checkin_time for s in v.parking_sessions]) if v.parking_sessions else None
-        } for v in vehicles]
+            'id': row.id,
+            'plate_number': row.plate_number,
+            'total_visits': row.total_visits,
+            'last_visit': row.last_visit
+        } for row in query.all()]
+
+        if pagination:
+            return jsonify({
+                'items': result,
+                'page': page,
+                'per_page': per_page,
+                'total': total
+            }), 200
         return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -228,11 +444,19 @@ def get_parking_sessions():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        # Build query
-        query = ParkingSession.query.join(VehicleDB)
+        # Chỉ lấy đúng các cột trả về (tuple), không tạo object ORM và không lazy load vehicle từng dòng
+        query = sqldb.session.query(
+            ParkingSession.id,
+            ParkingSession.vehicle_id,
+            VehicleDB.plate_number,
+            ParkingSession.checkin_time,
+            ParkingSession.checkout_time,
+            ParkingSession.rfid_code,
+            ParkingSession.image_src
+        ).join(VehicleDB, VehicleDB.id == ParkingSession.vehicle_id)
         
         if vehicle_id:
-            query = query.filter_by(vehicle_id=vehicle_id)
+            query = query.filter(ParkingSession.vehicle_id == vehicle_id)
         
         if start_date:
             try:
@@ -248,32 +472,36 @@ def get_parking_sessions():
             except ValueError:
                 return jsonify({"error": "Invalid end_date format. Use YYYY-MM-DD"}), 400
         
-        sessions = query.order_by(ParkingSession.checkin_time.desc()).all()
-        
-        result = []
-        for s in sessions:
-            try:
-                session_data = {
-                    'id': s.id,
-                    'vehicle_id': s.vehicle_id,
-                    'plate_number': s.vehicle.plate_number,
-                    'checkin_time': s.checkin_time.isoformat(),
-                    'checkout_time': s.checkout_time.isoformat() if s.checkout_time else None,
-                    'duration_hours': ((s.checkout_time - s.checkin_time).total_seconds() / 3600) if s.checkout_time else None,
-                    'rfid_code': s.rfid_code,
-                    'image_src': s.image_src
-                }
-                result.append(session_data)
-            except Exception as e:
-                print(f"Error processing session {s.id}: {str(e)}")
-                continue
+        # ?limit=&cursor= -> phân trang keyset, không có -> trả toàn bộ danh sách như cũ
+        keyset = parse_keyset(request.args)
+        if keyset:
+            limit, cursor = keyset
+            sessions, next_cursor = keyset_page(query, ParkingSession.checkin_time, ParkingSession.id, limit, cursor)
+        else:
+            sessions = query.order_by(ParkingSession.checkin_time.desc(), ParkingSession.id.desc()).all()
         
+        result = [{
+            'id': session_id,
+            'vehicle_id': vehicle_id,
+            'plate_number': plate_number,
+            'checkin_time': checkin_time.isoformat(),
+            'checkout_time': checkout_time.isoformat() if checkout_time else None,
+            'duration_hours': ((checkout_time - checkin_time).total_seconds() / 3600) if checkout_time else None,
+            'rfid_code': rfid_code,
+            'image_src': image_src
+        } for session_id, vehicle_id, plate_number, checkin_time, checkout_time, rfid_code, image_src in sessions]
+        
+        if keyset:
+            return jsonify({'items': result, 'limit': limit, 'next_cursor': next_cursor}), 200
         return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error in get_parking_sessions: {str(e)}")
+        logger.error("Error in get_parking_sessions: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @routes.route('/transactions', methods=['GET'])
+@response_cache.cached()
 def get_transactions():
     sqldb = current_app.config['SQLDB']
     try:
@@ -283,14 +511,22 @@ def get_transactions():
         end_date = request.args.get('end_date')
         payment_method = request.args.get('payment_method')
         
-        # Build query
-        query = Transaction.query.join(ParkingSession).join(VehicleDB)
+        # Projection theo cột qua join, biển số lấy trực tiếp thay vì t.parking_session.vehicle
+        query = sqldb.session.query(
+            Transaction.id,
+            Transaction.session_id,
+            VehicleDB.plate_number,
+            Transaction.amount,
+            Transaction.payment_method,
+            Transaction.paid_at
+        ).join(ParkingSession, ParkingSession.id == Transaction.session_id)\
+            .join(VehicleDB, VehicleDB.id == ParkingSession.vehicle_id)
         
         if session_id:
-            query = query.filter_by(session_id=session_id)
+            query = query.filter(Transaction.session_id == session_id)
         
         if payment_method:
-            query = query.filter_by(payment_method=payment_method)
+            query = query.filter(Transaction.payment_method == payment_method)
         
         if start_date:
             start_date = datetime.strptime(start_date, '%Y-%m-%d')
@@ -302,82 +538,87 @@ def get_transactions():
             end_date = end_date + timedelta(days=1)
             query = query.filter(Transaction.paid_at < end_date)
         
-        transactions = query.order_by(Transaction.paid_at.desc()).all()
+        keyset = parse_keyset(request.args)
+        if keyset:
+            limit, cursor = keyset
+            transactions, next_cursor = keyset_page(query, Transaction.paid_at, Transaction.id, limit, cursor)
+        else:
+            transactions = query.order_by(Transaction.paid_at.desc(), Transaction.id.desc()).all()
         
         result = [{
-            'id': t.id,
-            'session_id': t.session_id,
-            'plate_number': t.parking_session.vehicle.plate_number,
-            'amount': float(t.amount),
-            'payment_method': t.payment_method,
-            'paid_at': t.paid_at.isoformat()
-        } for t in transactions]
-        
+            'id': transaction_id,
+            'session_id': session_id,
+            'plate_number': plate_number,
+            'amount': float(amount),
+            'payment_method': payment_method,
+            'paid_at': paid_at.isoformat()
+        } for transaction_id, session_id, plate_number, amount, payment_method, paid_at in transactions]
+        
+        if keyset:
+            return jsonify({'items': result, 'limit': limit, 'next_cursor': next_cursor}), 200
         return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error in get_transactions: {str(e)}")  # Thêm log lỗi
+        logger.error("Error in get_transactions: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @routes.route('/api/vehicles/summary', methods=['GET'])
+# time_since depends on the clock, so the cached summary is also refreshed every minute
+@response_cache.cached(max_age=60)
 def get_vehicles_summary():
     sqldb = current_app.config['SQLDB']
     try:
-        # Get all vehicles with their active status
-        vehicles = VehicleDB.query.all()
-        result = []
-        
-        for v in vehicles:
-            # Get total parking count
-            total_visits = len(v.parking_sessions)
-            
-            # Get last session with checkout_time
-            last_session = ParkingSession.query.filter_by(vehicle_id=v.id)\
-                .filter(ParkingSession.checkout_time.isnot(None))\
-                .order_by(ParkingSession.checkout_time.desc()).first()
-            
-            # Calculate time since last entry
-            time_since = None
-            if last_session and last_session.checkout_time:
-                # Get current time in Vietnam timezone and remove timezone info
-                now = get_vietnam_time().replace(tzinfo=None)
-                
-                # Calculate time difference
-                time_diff = now - last_session.checkout_time
-                
-                # Format time difference
-                if time_diff.days > 0:
-                    if time_diff.days == 1:
-                        time_since = "1 day ago"
-                    else:
-                        time_since = f"{time_diff.days} days ago"
-                elif time_diff.seconds >= 3600:
-                    hours = time_diff.seconds // 3600
-                    if hours == 1:
-                        time_since = "1 hour ago"
-                    else:
-                        time_since = f"{hours} hours ago"
-                elif time_diff.seconds >= 60:
-                    minutes = time_diff.seconds // 60
-                    if minutes == 1:
-                        time_since = "1 minute ago"
-                    else:
-                        time_since = f"{minutes} minutes ago"
-                else:
-                    time_since = "Just now"
-            
-            # Check if currently parked
-            status = "in" if last_session and not last_session.checkout_time else "out"
-            
-            result.append({
-                'id': f"V{v.id:03d}",
-                'plate_number': v.plate_number,
-                'parking_count': total_visits,
-                'last_entry': last_session.checkout_time.isoformat() if last_session and last_session.checkout_time else None,
-                'time_since': time_since,
-                'status': status
-            })
-        
+        status = request.args.get('status')  # in, out
+        if status and status not in ['in', 'out']:
+            return jsonify({"error": "Invalid status. Must be either 'in' or 'out'"}), 400
+        pagination = parse_pagination(request.args)
+
+        # One aggregate query: visit count, last checkout and number of open sessions per vehicle
+        total_visits = func.count(ParkingSession.id)
+        open_sessions = total_visits - func.count(ParkingSession.checkout_time)
+        query = sqldb.session.query(
+            VehicleDB.id,
+            VehicleDB.plate_number,
+            total_visits.label('total_visits'),
+            func.max(ParkingSession.checkout_time).label('last_checkout'),
+            open_sessions.label('open_sessions')
+        ).outerjoin(ParkingSession, ParkingSession.vehicle_id == VehicleDB.id)\
+            .group_by(VehicleDB.id)
+
+        if status == 'in':
+            query = query.having(open_sessions > 0)
+        elif status == 'out':
+            query = query.having(open_sessions == 0)
+
+        query = query.order_by(VehicleDB.id)
+        if pagination:
+            page, per_page = pagination
+            total = sqldb.session.query(func.count()).select_from(query.subquery()).scalar()
+            query = query.limit(per_page).offset((page - 1) * per_page)
+
+        # Get current time in Vietnam timezone and remove timezone info
+        now = get_vietnam_time().replace(tzinfo=None)
+
+        result = [{
+            'id': f"V{row.id:03d}",
+            'plate_number': row.plate_number,
+            'parking_count': row.total_visits,
+            'last_entry': row.last_checkout.isoformat() if row.last_checkout else None,
+            'time_since': format_time_since(now - row.last_checkout) if row.last_checkout else None,
+            'status': "in" if row.open_sessions else "out"
+        } for row in query.all()]
+
+        if pagination:
+            return jsonify({
+                'items': result,
+                'page': page,
+                'per_page': per_page,
+                'total': total
+            }), 200
         return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -411,42 +652,38 @@ def get_vehicle_history(vehicle_id):
 def export_vehicles():
     sqldb = current_app.config['SQLDB']
     try:
-        # Get all vehicles with their sessions
-        vehicles = VehicleDB.query.all()
-        result = []
-        
-        for v in vehicles:
-            vehicle_data = {
-                'id': v.id,
-                'plate_number': v.plate_number,
-                'total_visits': len(v.parking_sessions),
-                'sessions': []
-            }
-            
-            for s in v.parking_sessions:
-                session_data = {
-                    'checkin_time': s.checkin_time.isoformat(),
-                    'checkout_time': s.checkout_time.isoformat() if s.checkout_time else None,
-                    'fee': float(s.fee) if s.fee else None,
-                    'transactions': []
-                }
-                
-                for t in s.transactions:
-                    session_data['transactions'].append({
-                        'amount': float(t.amount),
-                        'payment_method': t.payment_method,
-                        'paid_at': t.paid_at.isoformat()
-                    })
-                
-                vehicle_data['sessions'].append(session_data)
-            
-            result.append(vehicle_data)
-        
-        return jsonify(result), 200
+        # Get query parameters
+        export_format = request.args.get('format', 'json')  # json, ndjson, csv
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        plate_number = request.args.get('plate')
+
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({"error": "Invalid format. Must be one of: json, ndjson, csv"}), 400
+
+        if start_date:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d')
+
+        if end_date:
+            end_date = datetime.strptime(end_date, '%Y-%m-%d')
+            # Thêm 1 ngày vào end_date để bao gồm cả ngày cuối
+            end_date = end_date + timedelta(days=1)
+
+        query = ExportService.build_query(start_date, end_date, plate_number)
+        rows = ExportService.iter_rows(sqldb, query)
+
+        stream, mimetype = EXPORT_FORMATS[export_format]
+        response = Response(stream_with_context(stream(rows)), mimetype=mimetype)
+        if export_format == 'csv':
+            response.headers['Content-Disposition'] = 'attachment; filename=vehicles_export.csv'
+        return response
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @routes.route('/api/users', methods=['GET'])
+@response_cache.cached()
 def get_users():
     sqldb = current_app.config['SQLDB']
     try:
@@ -503,6 +740,7 @@ def create_user():
         )
         sqldb.session.add(new_user)
         sqldb.session.commit()
+        response_cache.invalidate()
 
         return jsonify({
             "message": "User created successfully",
@@ -532,6 +770,8 @@ def update_price():
             
         # Update price in Firebase
         db.child("price").set(price)
+        price_cache.set(price)
+        response_cache.invalidate()
         
         return jsonify({
             "message": "Price updated successfully",
@@ -541,175 +781,117 @@ def update_price():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@routes.route('/api/tariff', methods=['GET'])
+def get_tariff():
+    try:
+        db = current_app.config['DB']
+        return jsonify(current_tariff(db).to_dict()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@routes.route('/api/tariff/simulate', methods=['POST'])
+def simulate_tariff_route():
+    """
+    Re-price the closed sessions checked in between start_date and end_date (YYYY-MM-DD, both optional)
+    under the candidate `tariff`, next to the current tariff and the recorded revenue.
+    """
+    try:
+        db = current_app.config['DB']
+        data = request.get_json(silent=True) or {}
+        if 'tariff' not in data:
+            return jsonify({"error": "tariff is required"}), 400
+
+        current = current_tariff(db)
+        candidate = Tariff.from_dict(data['tariff'], default_entry_fee=current.entry_fee)
+
+        start_date = data.get('start_date')
+        end_date = data.get('end_date')
+        if start_date:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d')
+        if end_date:
+            end_date = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+
+        result = simulate_tariff(candidate, current, start_date or None, end_date or None)
+        result['tariff'] = candidate.to_dict()
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @routes.route('/api/stats/parking', methods=['GET'])
+@response_cache.cached()
 def get_parking_stats():
-    sqldb = current_app.config['SQLDB']
     try:
         # Get query parameters
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         time_range = request.args.get('time_range', 'day')  # day, week, month
         
-        # Build query
-        query = ParkingSession.query
-        
         if start_date:
             start_date = datetime.strptime(start_date, '%Y-%m-%d')
-            query = query.filter(ParkingSession.checkin_time >= start_date)
         
         if end_date:
             end_date = datetime.strptime(end_date, '%Y-%m-%d')
             end_date = end_date + timedelta(days=1)
-            query = query.filter(ParkingSession.checkin_time < end_date)
-        
-        result = []
         
-        if time_range == 'day':
-            # Group by hour
-            for hour in range(24):
-                hour_start = start_date.replace(hour=hour, minute=0, second=0, microsecond=0)
-                hour_end = hour_start + timedelta(hours=1)
-                
-                entries = query.filter(
-                    ParkingSession.checkin_time >= hour_start,
-                    ParkingSession.checkin_time < hour_end
-                ).count()
-                
-                exits = query.filter(
-                    ParkingSession.checkout_time >= hour_start,
-                    ParkingSession.checkout_time < hour_end
-                ).count()
-                
-                result.append({
-                    'hour': f"{hour:02d}:00",
-                    'entries': entries,
-                    'exits': exits
-                })
-        
-        elif time_range == 'week':
-            # Group by day of week
-            days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-            for i, day in enumerate(days):
-                day_start = start_date + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                entries = query.filter(
-                    ParkingSession.checkin_time >= day_start,
-                    ParkingSession.checkin_time < day_end
-                ).count()
-                
-                exits = query.filter(
-                    ParkingSession.checkout_time >= day_start,
-                    ParkingSession.checkout_time < day_end
-                ).count()
-                
-                result.append({
-                    'hour': day,
-                    'entries': entries,
-                    'exits': exits
-                })
-        
-        else:  # month
-            # Group by day of month
-            days_in_month = (end_date - start_date).days
-            for day in range(days_in_month):
-                day_start = start_date + timedelta(days=day)
-                day_end = day_start + timedelta(days=1)
-                
-                entries = query.filter(
-                    ParkingSession.checkin_time >= day_start,
-                    ParkingSession.checkin_time < day_end
-                ).count()
-                
-                exits = query.filter(
-                    ParkingSession.checkout_time >= day_start,
-                    ParkingSession.checkout_time < day_end
-                ).count()
-                
-                result.append({
-                    'hour': f"{day + 1}",
-                    'entries': entries,
-                    'exits': exits
-                })
+        # Entries and exits of every bucket are counted with grouped queries
+        result = StatsService.parking_stats(start_date or None, end_date or None, time_range)
         
         return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@routes.route('/api/stats/occupancy', methods=['GET'])
+@response_cache.cached(max_age=60)
+def get_occupancy_stats():
+    try:
+        # start_date/end_date (YYYY-MM-DD, end inclusive) default to today, resolution in minutes
+        now = get_vietnam_time().replace(tzinfo=None)
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        resolution = int(request.args.get('resolution', 60))
+
+        start_date = datetime.strptime(start_date, '%Y-%m-%d') if start_date \
+            else now.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_date = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) if end_date \
+            else start_date + timedelta(days=1)
+        # Cars still inside are counted until now, not into the future
+        if start_date < now < end_date:
+            end_date = now
+
+        result = StatsService.occupancy_stats(start_date, end_date, resolution)
+
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @routes.route('/api/stats/revenue', methods=['GET'])
+@response_cache.cached()
 def get_revenue_stats():
-    sqldb = current_app.config['SQLDB']
     try:
         # Get query parameters
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         time_range = request.args.get('time_range', 'day')  # day, week, month
-        
-        # Build query
-        query = Transaction.query
+        payment_method = request.args.get('payment_method')
         
         if start_date:
             start_date = datetime.strptime(start_date, '%Y-%m-%d')
-            query = query.filter(Transaction.paid_at >= start_date)
         
         if end_date:
             end_date = datetime.strptime(end_date, '%Y-%m-%d')
             end_date = end_date + timedelta(days=1)
-            query = query.filter(Transaction.paid_at < end_date)
-        
-        result = []
         
-        if time_range == 'day':
-            # Group by hour
-            for hour in range(24):
-                hour_start = start_date.replace(hour=hour, minute=0, second=0, microsecond=0)
-                hour_end = hour_start + timedelta(hours=1)
-                
-                revenue = query.filter(
-                    Transaction.paid_at >= hour_start,
-                    Transaction.paid_at < hour_end
-                ).with_entities(func.sum(Transaction.amount)).scalar() or 0
-                
-                result.append({
-                    'name': f"{hour:02d}:00",
-                    'revenue': float(revenue)
-                })
-        
-        elif time_range == 'week':
-            # Group by day of week
-            days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-            for i, day in enumerate(days):
-                day_start = start_date + timedelta(days=i)
-                day_end = day_start + timedelta(days=1)
-                
-                revenue = query.filter(
-                    Transaction.paid_at >= day_start,
-                    Transaction.paid_at < day_end
-                ).with_entities(func.sum(Transaction.amount)).scalar() or 0
-                
-                result.append({
-                    'name': day,
-                    'revenue': float(revenue)
-                })
-        
-        else:  # month
-            # Group by day of month
-            days_in_month = (end_date - start_date).days
-            for day in range(days_in_month):
-                day_start = start_date + timedelta(days=day)
-                day_end = day_start + timedelta(days=1)
-                
-                revenue = query.filter(
-                    Transaction.paid_at >= day_start,
-                    Transaction.paid_at < day_end
-                ).with_entities(func.sum(Transaction.amount)).scalar() or 0
-                
-                result.append({
-                    'name': f"{day + 1}",
-                    'revenue': float(revenue)
-                })
+        # Revenue is read from the hourly rollup instead of scanning transactions
+        result = StatsService.revenue_stats(start_date or None, end_date or None, time_range, payment_method)
         
         return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-
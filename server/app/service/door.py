@@ -1,13 +1,17 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
 def set_door_status(db, door_name, status):
     try:
         db.child("status").child(door_name).set({"isOpen": status})
         return True
     except Exception as e:
-        print(f"Door status retrieval error: {e}")
+        logger.error("Door status retrieval error: %s", e)
         return False
 def get_door_status(db, door_name):
     try:
         return db.child("status").child(door_name).get()
     except Exception as e:
-        print(f"Door status retrieval error: {e}")
+        logger.error("Door status retrieval error: %s", e)
         return None
\ No newline at end of file
@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+from sqlalchemy import func, select
+from ..models import VehicleDB, ParkingSession, Transaction
+
+CSV_HEADERS = [
+    'vehicle_id', 'plate_number', 'total_visits', 'session_id',
+    'checkin_time', 'checkout_time', 'payment_method', 'amount', 'paid_at'
+]
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+class ExportService:
+    """
+    Stream the vehicles export without materializing it.
+    Rows come from one projected query read in batches through a server-side cursor,
+    so no ORM object is hydrated and memory does not grow with the number of rows.
+    """
+    @staticmethod
+    def build_query(start_date=None, end_date=None, plate_number=None):
+        session_filters = []
+        if start_date:
+            session_filters.append(ParkingSession.checkin_time >= start_date)
+        if end_date:
+            session_filters.append(ParkingSession.checkin_time < end_date)
+
+        # Visits are counted with the same filters as the exported sessions
+        visits = select(
+            ParkingSession.vehicle_id,
+            func.count(ParkingSession.id).label('total_visits')
+        ).where(*session_filters).group_by(ParkingSession.vehicle_id).subquery()
+
+        query = select(
+            VehicleDB.id.label('vehicle_id'),
+            VehicleDB.plate_number,
+            func.coalesce(visits.c.total_visits, 0).label('total_visits'),
+            ParkingSession.id.label('session_id'),
+            ParkingSession.checkin_time,
+            ParkingSession.checkout_time,
+            Transaction.amount,
+            Transaction.payment_method,
+            Transaction.paid_at
+        ).select_from(VehicleDB)\
+            .outerjoin(visits, visits.c.vehicle_id == VehicleDB.id)\
+            .outerjoin(ParkingSession, ParkingSession.vehicle_id == VehicleDB.id)\
+            .outerjoin(Transaction, Transaction.session_id == ParkingSession.id)
+
+        if session_filters:
+            # A date range only exports vehicles that have sessions inside it
+            query = query.where(*session_filters)
+        if plate_number:
+            query = query.where(VehicleDB.plate_number == plate_number)
+
+        return query.order_by(VehicleDB.id, ParkingSession.id, Transaction.id)
+
+    @staticmethod
+    def iter_rows(sqldb, query, batch_size=1000):
+        """Yield result rows, fetching `batch_size` rows at a time from the cursor."""
+        result = sqldb.session.execute(query.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            yield from partition
+
+    @staticmethod
+    def iter_sessions(rows):
+        """
+        Fold consecutive rows of the same session into one record.
+        Yields (row, session) where session is None for vehicles without sessions.
+        """
+        current_row = None
+        current_session = None
+        for row in rows:
+            if current_row is not None and (row.vehicle_id, row.session_id) == (current_row.vehicle_id, current_row.session_id):
+                current_session['transactions'].append(ExportService.transaction_record(row))
+                current_session['fee'] += float(row.amount)
+                continue
+
+            if current_row is not None:
+                yield current_row, current_session
+
+            current_row = row
+            current_session = None
+            if row.session_id is not None:
+                current_session = {
+                    'checkin_time': _isoformat(row.checkin_time),
+                    'checkout_time': _isoformat(row.checkout_time),
+                    'fee': float(row.amount) if row.amount is not None else None,
+                    'transactions': [ExportService.transaction_record(row)] if row.amount is not None else []
+                }
+
+        if current_row is not None:
+            yield current_row, current_session
+
+    @staticmethod
+    def transaction_record(row):
+        return {
+            'amount': float(row.amount),
+            'payment_method': row.payment_method,
+            'paid_at': _isoformat(row.paid_at)
+        }
+
+    @staticmethod
+    def stream_json(rows):
+        """Stream the legacy export: a JSON array with one object per vehicle and its sessions."""
+        yield '['
+        first = True
+        vehicle = None
+        for row, session in ExportService.iter_sessions(rows):
+            if vehicle is None or vehicle['id'] != row.vehicle_id:
+                if vehicle is not None:
+                    yield ('' if first else ',') + json.dumps(vehicle)
+                    first = False
+                vehicle = {
+                    'id': row.vehicle_id,
+                    'plate_number': row.plate_number,
+                    'total_visits': row.total_visits,
+                    'sessions': []
+                }
+            if session is not None:
+                vehicle['sessions'].append(session)
+        if vehicle is not None:
+            yield ('' if first else ',') + json.dumps(vehicle)
+        yield ']'
+
+    @staticmethod
+    def stream_ndjson(rows):
+        """Stream one JSON line per parking session."""
+        for row, session in ExportService.iter_sessions(rows):
+            if session is None:
+                continue
+            record = {
+                'vehicle_id': row.vehicle_id,
+                'plate_number': row.plate_number,
+                'total_visits': row.total_visits,
+                'session_id': row.session_id
+            }
+            record.update(session)
+            yield json.dumps(record) + '\n'
+
+    @staticmethod
+    def stream_csv(rows):
+        """Stream one CSV line per session and transaction, like the admin dashboard export."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush():
+            value = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return value
+
+        writer.writerow(CSV_HEADERS)
+        yield flush()
+        for row in rows:
+            if row.session_id is None:
+                continue
+            writer.writerow([
+                row.vehicle_id,
+                row.plate_number,
+                row.total_visits,
+                row.session_id,
+                _isoformat(row.checkin_time) or '',
+                _isoformat(row.checkout_time) or '',
+                row.payment_method or '',
+                float(row.amount) if row.amount is not None else '',
+                _isoformat(row.paid_at) or ''
+            ])
+            yield flush()
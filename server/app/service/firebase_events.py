@@ -0,0 +1,66 @@
+from .plates import sanitize_license_plate
+
+def vehicle_path(license_plate):
+    return f"vehicles/{sanitize_license_plate(license_plate)}"
+
+class FirebaseEventPublisher:
+    """
+    Publish a gate event as one multi-location update.
+    Every path of the event is written by a single PATCH, so dashboards never see the
+    vehicle node, the last action and its details from different events.
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def publish(self, updates):
+        self.db.update(updates)
+        return True
+
+    @staticmethod
+    def last_action_updates(vehicle_data, action):
+        return {
+            "vehicle_last_action/action": action,
+            "vehicle_last_action/infor": vehicle_data
+        }
+
+    @staticmethod
+    def last_scan_updates(image_src, license_plate):
+        return {
+            "lastScan": {"imageSrc": image_src, "licensePlate": license_plate}
+        }
+
+    @staticmethod
+    def enter_updates(vehicle_data, last_scan=False):
+        updates = {vehicle_path(vehicle_data["licensePlate"]): vehicle_data}
+        updates.update(FirebaseEventPublisher.last_action_updates(vehicle_data, "enter"))
+        if last_scan:
+            updates.update(FirebaseEventPublisher.last_scan_updates(vehicle_data["imageSrc"], vehicle_data["licensePlate"]))
+        return updates
+
+    @staticmethod
+    def exit_updates(vehicle_data, update_vehicle=True):
+        """`vehicle_data` is the stored vehicle with its exitTime set."""
+        updates = {}
+        if update_vehicle:
+            updates[vehicle_path(vehicle_data["licensePlate"]) + "/exitTime"] = vehicle_data["exitTime"]
+        updates.update(FirebaseEventPublisher.last_action_updates(vehicle_data, "exit"))
+        return updates
+
+    @staticmethod
+    def conflict_updates(vehicle_data):
+        return FirebaseEventPublisher.last_action_updates(vehicle_data, "conflict")
+
+    def enter(self, vehicle_data, last_scan=False):
+        return self.publish(self.enter_updates(vehicle_data, last_scan))
+
+    def exit(self, vehicle_data, update_vehicle=True):
+        return self.publish(self.exit_updates(vehicle_data, update_vehicle))
+
+    def conflict(self, vehicle_data):
+        return self.publish(self.conflict_updates(vehicle_data))
+
+    def last_action(self, vehicle_data, action):
+        return self.publish(self.last_action_updates(vehicle_data, action))
+
+    def last_scan(self, image_src, license_plate):
+        return self.publish(self.last_scan_updates(image_src, license_plate))
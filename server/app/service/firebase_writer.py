@@ -0,0 +1,278 @@
+import json
+import time
+import queue
+import threading
+import logging
+from collections import namedtuple, deque
+from sqlalchemy import event
+from ..models import db, FirebaseOutbox
+
+logger = logging.getLogger(__name__)
+
+OutboxItem = namedtuple('OutboxItem', ['id', 'plate_number', 'event', 'payload', 'attempts'])
+
+def coalesce(items):
+    """
+    Drop events made obsolete by a later event of the same plate.
+    An 'enter' rewrites the whole vehicle node and last action, so everything queued
+    before it for that plate is superseded; repeated events of the same kind keep the last one.
+    Returns (items to apply in order, ids of superseded items).
+    """
+    last_enter = {}
+    for position, item in enumerate(items):
+        if item.plate_number is not None and item.event == 'enter':
+            last_enter[item.plate_number] = position
+
+    kept = []
+    superseded = []
+    for position, item in enumerate(items):
+        if item.plate_number is not None and position < last_enter.get(item.plate_number, -1):
+            superseded.append(item.id)
+            continue
+        previous = kept[-1] if kept else None
+        if previous is not None and (previous.plate_number, previous.event) == (item.plate_number, item.event):
+            superseded.append(previous.id)
+            kept[-1] = item
+            continue
+        kept.append(item)
+    return kept, superseded
+
+class FirebaseWriter:
+    """
+    Write-behind queue for Firebase side effects.
+    Events are stored in the firebase_outbox table in the same SQLite transaction as the
+    gate change, handed to a background thread after commit through a bounded queue, and
+    deleted once Firebase accepted them. Rows left over by a restart, a full queue or a
+    Firebase outage are replayed every `retry_interval` seconds.
+    Events of one plate are applied in outbox order: once a plate has a row left behind
+    (failed write, full queue), its newer events wait until the older rows are applied.
+    `firebase_db` must not be shared with other threads (pyrebase's child() mutates it).
+    """
+    def __init__(self, app, firebase_db, apply_event, maxsize=1000, batch_size=100, retry_interval=5.0, max_attempts=10):
+        self.app = app
+        self.firebase_db = firebase_db
+        self.apply_event = apply_event
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        # Plates with outbox rows left behind, whose newer events must wait for them
+        self._blocked = set()
+        self._next_replay = 0.0
+        self._process_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enqueue(self, session, plate_number, event_name, payload):
+        """
+        Add an event to the outbox in `session`. It is handed to the worker when the session commits,
+        and discarded with the rest of the transaction on rollback.
+        """
+        row = FirebaseOutbox(plate_number=plate_number, event=event_name, payload=json.dumps(payload))
+        session.add(row)
+        session.flush()
+        item = OutboxItem(row.id, plate_number, event_name, payload, 0)
+        session.info.setdefault('firebase_outbox', []).append((self, item))
+        return item
+
+    def notify(self, item):
+        """Hand a committed item to the worker. When the queue is full the item stays in the outbox for replay."""
+        with self._pending_lock:
+            if item.id in self._pending:
+                return
+            self._pending.add(item.id)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._pending_lock:
+                self._pending.discard(item.id)
+                if item.plate_number is not None:
+                    self._blocked.add(item.plate_number)
+            logger.warning("Firebase queue full, outbox item %s will be replayed", item.id)
+
+    def replay(self):
+        """Queue outbox rows that are not already waiting in memory. Returns the number queued."""
+        with self.app.app_context():
+            rows = db.session.query(FirebaseOutbox)\
+                .order_by(FirebaseOutbox.id)\
+                .limit(self._queue.maxsize or self.batch_size).all()
+            items = [OutboxItem(r.id, r.plate_number, r.event, json.loads(r.payload), r.attempts) for r in rows]
+            db.session.remove()
+
+        queued = 0
+        for item in items:
+            if self._queue.full():
+                break
+            with self._pending_lock:
+                if item.id in self._pending:
+                    continue
+            self.notify(item)
+            queued += 1
+        return queued
+
+    def _drain(self, timeout=None):
+        try:
+            items = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(items) < self.batch_size:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    @staticmethod
+    def _outbox_ids(plates, exclude):
+        """Outbox row ids of `plates`, oldest first: the order their events must be applied in."""
+        ids = {plate: deque() for plate in plates}
+        if plates:
+            rows = db.session.query(FirebaseOutbox.plate_number, FirebaseOutbox.id)\
+                .filter(FirebaseOutbox.plate_number.in_(plates), FirebaseOutbox.id.notin_(exclude))\
+                .order_by(FirebaseOutbox.id).all()
+            for plate, item_id in rows:
+                ids[plate].append(item_id)
+        return ids
+
+    def _apply(self, items):
+        """
+        Apply a batch in order. A failure holds back the later events of the same plate, in this
+        batch and in the next ones, until the failed row is applied by a replay.
+        """
+        items = sorted(items, key=lambda item: item.id)
+        kept, done = coalesce(items)
+        with self._pending_lock:
+            blocked = {item.plate_number for item in kept if item.plate_number in self._blocked}
+        with self.app.app_context():
+            # Blocked plates only apply the oldest outbox row left, then the next one...
+            expected = self._outbox_ids(blocked, done)
+            db.session.remove()
+
+        failed = {}
+        failed_plates = set()
+        for item in kept:
+            plate = item.plate_number
+            if plate in expected and (not expected[plate] or expected[plate][0] != item.id):
+                # Stays in the outbox and is replayed after the older rows
+                continue
+            try:
+                ok = self.apply_event(self.firebase_db, item.event, item.payload)
+                error = None if ok else "Firebase write failed"
+            except Exception as e:
+                error = str(e)
+            if error is not None and item.attempts + 1 < self.max_attempts:
+                failed[item.id] = error
+                if plate is not None:
+                    failed_plates.add(plate)
+                    expected[plate] = deque()
+                continue
+            if error is not None:
+                # Give up so one bad event does not hold back the plate forever
+                logger.error("Dropping Firebase %s for %s after %d attempts: %s", item.event, plate, self.max_attempts, error)
+            done.append(item.id)
+            if plate in expected and expected[plate]:
+                expected[plate].popleft()
+
+        with self.app.app_context():
+            if done:
+                db.session.query(FirebaseOutbox)\
+                    .filter(FirebaseOutbox.id.in_(done))\
+                    .delete(synchronize_session=False)
+            for item_id, error in failed.items():
+                db.session.query(FirebaseOutbox).filter(FirebaseOutbox.id == item_id).update({
+                    FirebaseOutbox.attempts: FirebaseOutbox.attempts + 1,
+                    FirebaseOutbox.last_error: error
+                }, synchronize_session=False)
+            db.session.commit()
+            db.session.remove()
+
+        # Items that were not applied go back to the outbox replay
+        with self._pending_lock:
+            self._pending.difference_update(item.id for item in items)
+            self._blocked |= failed_plates
+            # Every row left behind was applied: newer events can go straight through again
+            self._blocked -= {plate for plate, ids in expected.items() if not ids and plate not in failed_plates}
+        if failed:
+            logger.warning("%d Firebase writes failed, retrying in %ss", len(failed), self.retry_interval)
+        return len(done), len(failed)
+
+    def flush(self):
+        """Apply everything queued so far in the calling thread. Returns (applied, failed)."""
+        applied = failed = 0
+        with self._process_lock:
+            while True:
+                items = self._drain(timeout=0)
+                if not items:
+                    break
+                batch_applied, batch_failed = self._apply(items)
+                applied += batch_applied
+                failed += batch_failed
+        return applied, failed
+
+    def _run(self):
+        while not self._stop.is_set():
+            items = self._drain(timeout=self.retry_interval)
+            try:
+                if items:
+                    with self._process_lock:
+                        self._apply(items)
+                # Rows left behind are retried when idle, and every retry_interval under steady traffic
+                if not items or (self._blocked and time.monotonic() >= self._next_replay):
+                    self._next_replay = time.monotonic() + self.retry_interval
+                    self.replay()
+            except Exception as e:
+                logger.error("Firebase writer error: %s", e)
+                with self._pending_lock:
+                    self._pending.difference_update(item.id for item in items)
+
+    def start(self):
+        """Replay rows left from a previous run and start the background thread."""
+        self.replay()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='firebase-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def queue_size(self):
+        return self._queue.qsize()
+
+class DirectFirebaseWriter:
+    """
+    Same interface as FirebaseWriter without the outbox or the thread:
+    events are applied synchronously right after the SQLite commit.
+    Used when the app was created without a background writer.
+    """
+    def __init__(self, firebase_db, apply_event):
+        self.firebase_db = firebase_db
+        self.apply_event = apply_event
+
+    def enqueue(self, session, plate_number, event_name, payload):
+        item = OutboxItem(None, plate_number, event_name, payload, 0)
+        session.info.setdefault('firebase_outbox', []).append((self, item))
+        return item
+
+    def notify(self, item):
+        try:
+            self.apply_event(self.firebase_db, item.event, item.payload)
+        except Exception as e:
+            logger.error("Firebase %s for %s failed: %s", item.event, item.plate_number, e)
+
+    def flush(self):
+        return 0, 0
+
+@event.listens_for(db.session, 'after_commit')
+def _notify_committed(session):
+    for writer, item in session.info.pop('firebase_outbox', []):
+        writer.notify(item)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('firebase_outbox', None)
@@ -0,0 +1,88 @@
+import os
+import json
+import random
+import logging
+from .logs import queue_handler, file_handler
+from datetime import datetime
+
+class ChangeJournal:
+    """
+    Append-only journal of gate mutations: one compact JSON line per change.
+    Writing a line costs the same whatever the size of the database; the file is rotated
+    by size (`max_bytes`, `backup_count`) and entries can be sampled with `sample_rate`.
+    Lines are written by a queue listener thread, so they reach the file shortly after `record`;
+    `query` waits for the lines queued before it, so a reader always sees its own changes.
+    """
+    def __init__(self):
+        self.path = None
+        self.backup_count = 0
+        self.sample_rate = 1.0
+        self._logger = logging.getLogger('parking.journal')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._listener = None
+
+    def configure(self, path, max_bytes=5 * 1024 * 1024, backup_count=5, sample_rate=1.0):
+        self.close()
+        handler = file_handler(path, max_bytes, backup_count)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        queued, self._listener = queue_handler(handler)
+        self._logger.addHandler(queued)
+        self.path = path
+        self.backup_count = backup_count
+        self.sample_rate = sample_rate
+        return self
+
+    def close(self):
+        """Write the queued lines and close the file."""
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+
+    def record(self, action, plate_number, **fields):
+        """Append one change. Does nothing before `configure` or when the entry is sampled out."""
+        if self.path is None or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return False
+        entry = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'action': action, 'plate': plate_number}
+        entry.update(fields)
+        self._logger.info(json.dumps(entry, separators=(',', ':'), default=str))
+        return True
+
+    def _files(self):
+        """Journal files, newest first."""
+        files = [self.path] + [f"{self.path}.{i}" for i in range(1, self.backup_count + 1)]
+        return [path for path in files if os.path.exists(path)]
+
+    def query(self, plate_number=None, action=None, since=None, limit=100):
+        """Return the most recent entries matching the filters, newest first."""
+        if self.path is None:
+            return []
+        if self._listener is not None:
+            self._listener.flush()
+        since = since.isoformat() if since else None
+        results = []
+        for path in self._files():
+            with open(path, encoding='utf-8') as f:
+                lines = f.readlines()
+            for line in reversed(lines):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if since and entry.get('ts', '') < since:
+                    # Entries are chronological: everything older is out of range
+                    return results
+                if plate_number and entry.get('plate') != plate_number:
+                    continue
+                if action and entry.get('action') != action:
+                    continue
+                results.append(entry)
+                if len(results) >= limit:
+                    return results
+        return results
+
+journal = ChangeJournal()
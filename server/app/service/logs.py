@@ -0,0 +1,128 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import threading
+from decimal import Decimal
+from datetime import datetime, date
+from collections.abc import Mapping
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# LogRecord attributes, everything else on a record came from `extra=`
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+# %-style arguments that cannot change after the call, safe to merge later on the listener thread
+IMMUTABLE_ARGS = (str, bytes, int, float, bool, type(None), Decimal, datetime, date)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, the `extra=` fields and the exception."""
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Hand records to the listener thread as they are. The stock QueueHandler formats the message
+    on the calling thread (it prepares records for other processes); here the queue stays in the
+    process, so %-style arguments are only merged when the listener writes the record.
+    A record with a mutable argument (a payload dict the gate keeps changing...) is merged right
+    away instead, so the line shows the value at the time of the call.
+    """
+    def prepare(self, record):
+        args = record.args
+        if args:
+            values = args.values() if isinstance(args, Mapping) else args
+            if not all(isinstance(value, IMMUTABLE_ARGS) for value in values):
+                record.msg = record.getMessage()
+                record.args = None
+        return record
+
+class FlushableQueueListener(QueueListener):
+    """QueueListener whose `flush` waits until everything queued before the call is written."""
+    class _Marker:
+        def __init__(self):
+            self.written = threading.Event()
+
+    def handle(self, record):
+        if isinstance(record, self._Marker):
+            record.written.set()
+            return
+        super().handle(record)
+
+    def flush(self, timeout=5.0):
+        if self._thread is None:
+            return False
+        marker = self._Marker()
+        self.queue.put_nowait(marker)
+        return marker.written.wait(timeout)
+
+def queue_handler(*handlers):
+    """A handler that only enqueues, and the started listener writing to `handlers` on its own thread."""
+    log_queue = queue.SimpleQueue()
+    listener = FlushableQueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return LazyQueueHandler(log_queue), listener
+
+def file_handler(path, max_bytes=10 * 1024 * 1024, backup_count=5, when=None):
+    """Size-based rotation, or time-based when `when` is given ('midnight', 'H', ...)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if when:
+        return TimedRotatingFileHandler(path, when=when, backupCount=backup_count, encoding='utf-8')
+    return RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+
+class LoggingSetup:
+    """
+    Application logging: the root logger only puts records on a queue, a listener thread
+    formats them and writes the rotated log file (and the console). Disk I/O never runs
+    on a request thread.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handler = None
+        self._listener = None
+        atexit.register(self.stop)
+
+    def configure(self, path='parking.log', level='INFO', max_bytes=10 * 1024 * 1024, backup_count=5,
+                  when=None, log_format='text', console=True):
+        formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+        handlers = [file_handler(path, max_bytes, backup_count, when)]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        with self._lock:
+            self._stop()
+            self._handler, self._listener = queue_handler(*handlers)
+            root = logging.getLogger()
+            root.addHandler(self._handler)
+            root.setLevel(level)
+        return self
+
+    def _stop(self):
+        if self._handler is not None:
+            logging.getLogger().removeHandler(self._handler)
+            self._handler = None
+        if self._listener is not None:
+            # Writes what is still queued, then closes the files
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+
+    def stop(self):
+        with self._lock:
+            self._stop()
+
+logging_setup = LoggingSetup()
@@ -0,0 +1,226 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Seconds, Prometheus' default buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Time spent outside of a request (Firebase writer thread, startup sync...)
+BACKGROUND = 'background'
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [count per bucket..., sum, count]
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            base = _labels(self.label_names, labels)
+            prefix = base + ',' if base else ''
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{base}}} {_number(series[-2])}')
+            lines.append(f'{self.name}_count{{{base}}} {series[-1]}')
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, labels, value=1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {_number(value)}")
+        return lines
+
+class Metrics:
+    """
+    Process-wide request metrics in Prometheus text format.
+    - request latency histograms per route rule, method and status
+    - time and number of calls per route of each component: sql (engine events),
+      firebase (calls through the instrumented database handle) and image (image writes)
+    - Firebase call latency per method
+    Requests slower than `slow_request_seconds` are logged with their component breakdown.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.slow_request_seconds = None
+        self.requests = Histogram(
+            'parking_http_request_duration_seconds', 'Latency of HTTP requests.', ('route', 'method', 'status'))
+        self.component_seconds = Counter(
+            'parking_component_seconds_total', 'Time spent in SQLite, Firebase and image writes.', ('route', 'component'))
+        self.component_calls = Counter(
+            'parking_component_calls_total', 'SQL statements, Firebase calls and image writes.', ('route', 'component'))
+        self.firebase_calls = Histogram(
+            'parking_firebase_call_duration_seconds', 'Latency of Firebase calls.', ('method',))
+        self.firebase_errors = Counter(
+            'parking_firebase_errors_total', 'Firebase calls that raised.', ('method',))
+
+    def configure(self, slow_request_seconds=None):
+        self.slow_request_seconds = slow_request_seconds
+
+    @staticmethod
+    def _route():
+        if has_request_context():
+            return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        return BACKGROUND
+
+    def record_component(self, component, seconds):
+        """Add one call of `component` to the current route and to the request breakdown."""
+        route = self._route()
+        with self._lock:
+            self.component_seconds.inc((route, component), seconds)
+            self.component_calls.inc((route, component))
+        if has_request_context() and 'metrics_breakdown' in g:
+            calls, total = g.metrics_breakdown.get(component, (0, 0.0))
+            g.metrics_breakdown[component] = (calls + 1, total + seconds)
+
+    @contextmanager
+    def timed(self, component):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_component(component, time.perf_counter() - started)
+
+    def record_firebase(self, method, seconds, failed=False):
+        with self._lock:
+            self.firebase_calls.observe((method,), seconds)
+            if failed:
+                self.firebase_errors.inc((method,))
+        self.record_component('firebase', seconds)
+
+    # Request middleware, registered on the blueprint by `instrument_blueprint`
+    def before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_breakdown = {}
+
+    def after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        route = self._route()
+        with self._lock:
+            self.requests.observe((route, request.method, str(response.status_code)), duration)
+
+        if self.slow_request_seconds is not None and duration >= self.slow_request_seconds:
+            breakdown = ', '.join(
+                f"{component}={calls} calls/{total * 1000:.1f}ms"
+                for component, (calls, total) in sorted(g.metrics_breakdown.items())
+            )
+            logger.warning("Slow request %s %s -> %s in %.1fms (%s)", request.method, request.path,
+                           response.status_code, duration * 1000, breakdown or 'no sql/firebase/image time')
+        return response
+
+    def instrument_blueprint(self, blueprint):
+        blueprint.before_request(self.before_request)
+        blueprint.after_request(self.after_request)
+
+    def instrument_engine(self, engine):
+        """Time every SQL statement executed on `engine`."""
+        if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+            return
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.component_seconds, self.component_calls,
+                           self.firebase_calls, self.firebase_errors):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if started:
+        metrics.record_component('sql', time.perf_counter() - started.pop())
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute, it still counts
+    conn = context.connection
+    started = conn.info.get('metrics_started') if conn is not None else None
+    if started:
+        metrics.record_component('sql', time.perf_counter() - started.pop())
+
+class InstrumentedFirebase:
+    """
+    Wrap a pyrebase database (or reference) so every network call is timed.
+    child() and the other query builders (which return the database itself in pyrebase)
+    return a wrapped reference; other attributes are passed through.
+    """
+    TIMED_METHODS = ('get', 'set', 'update', 'push', 'remove', 'stream')
+
+    def __init__(self, target):
+        self._target = target
+
+    def child(self, *args):
+        return InstrumentedFirebase(self._target.child(*args))
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+        if name not in self.TIMED_METHODS:
+            def builder(*args, **kwargs):
+                result = attribute(*args, **kwargs)
+                return InstrumentedFirebase(result) if result is self._target else result
+            return builder
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = attribute(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                metrics.record_firebase(name, time.perf_counter() - started, failed)
+        return timed
+
+def instrument_firebase(firebase_db):
+    if firebase_db is None or isinstance(firebase_db, InstrumentedFirebase):
+        return firebase_db
+    return InstrumentedFirebase(firebase_db)
+
+metrics = Metrics()
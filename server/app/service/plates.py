@@ -0,0 +1,144 @@
+import re
+import threading
+from collections import namedtuple
+
+# OCR misreads folded to one character: the plates differ only by these are the same key
+CONFUSABLES = {'O': '0', 'I': '1', 'B': '8'}
+# Other frequent misreads, each costing half an edit
+SIMILAR = {frozenset(pair) for pair in [
+    ('5', 'S'), ('2', 'Z'), ('6', 'G'), ('0', 'D'), ('0', 'Q'), ('1', 'L'), ('7', 'T'), ('4', 'A')
+]}
+FIREBASE_FORBIDDEN = re.compile(r'[.#$\[\]/]')
+NOT_ALNUM = re.compile(r'[^0-9A-Z]')
+
+PlateMatch = namedtuple('PlateMatch', ['plate', 'distance'])
+
+def canonical_plate(plate):
+    """Stored form of a scanned plate: trimmed, upper case, single spaces."""
+    return ' '.join(plate.split()).upper()
+
+def sanitize_license_plate(plate: str) -> str:
+    """Canonical plate made safe as a Firebase key (. # $ [ ] / replaced by underscores)."""
+    return FIREBASE_FORBIDDEN.sub('_', canonical_plate(plate))
+
+def match_key(plate):
+    """Canonical plate reduced to letters and digits, with confusable characters folded."""
+    key = NOT_ALNUM.sub('', canonical_plate(plate))
+    return ''.join(CONFUSABLES.get(char, char) for char in key)
+
+def substitution_cost(a, b):
+    if a == b:
+        return 0.0
+    return 0.5 if frozenset((a, b)) in SIMILAR else 1.0
+
+def plate_distance(a, b):
+    """Edit distance between two match keys where similar-looking substitutions cost 0.5."""
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [float(i)]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + substitution_cost(char_a, char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+# Matches are looked up through keys with up to this many characters deleted: any plate within
+# one edit of the scan (a wrong, missing or extra character after folding) is found
+MAX_DELETES = 1
+
+def deletion_variants(key, depth=MAX_DELETES):
+    """The key and every string obtained by deleting up to `depth` characters from it."""
+    variants = {key}
+    frontier = {key}
+    for _ in range(depth):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+class PlateMatcher:
+    """
+    Fuzzy index of plates (symmetric deletion index). Every match key is stored under its
+    deletion variants; a scanned plate only probes its own variants and computes the exact
+    distance for the few keys sharing one, instead of comparing against every plate.
+    """
+    def __init__(self):
+        self._plates = {}
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def _add_key(self, key):
+        for variant in deletion_variants(key):
+            self._variants.setdefault(variant, set()).add(key)
+
+    def _remove_key(self, key):
+        for variant in deletion_variants(key):
+            keys = self._variants.get(variant)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._variants[variant]
+
+    def rebuild(self, plates):
+        by_key = {}
+        for plate in plates:
+            by_key.setdefault(match_key(plate), set()).add(plate)
+        with self._lock:
+            self._plates = by_key
+            self._variants = {}
+            for key in by_key:
+                self._add_key(key)
+
+    def add(self, plate):
+        key = match_key(plate)
+        with self._lock:
+            plates = self._plates.get(key)
+            if plates is None:
+                plates = self._plates[key] = set()
+                self._add_key(key)
+            plates.add(plate)
+
+    def discard(self, plate):
+        key = match_key(plate)
+        with self._lock:
+            plates = self._plates.get(key)
+            if plates is None or plate not in plates:
+                return
+            plates.discard(plate)
+            if not plates:
+                del self._plates[key]
+                self._remove_key(key)
+
+    def search(self, plate, max_distance=1.0, limit=5):
+        """Return the closest plates as [PlateMatch], nearest first."""
+        key = match_key(plate)
+        with self._lock:
+            exact = self._plates.get(key)
+            if exact and max_distance < 0.5:
+                candidates = {key}
+            else:
+                candidates = set()
+                for variant in deletion_variants(key):
+                    candidates |= self._variants.get(variant, set())
+            matches = []
+            for candidate in candidates:
+                if abs(len(candidate) - len(key)) > max_distance:
+                    continue
+                distance = plate_distance(key, candidate)
+                if distance <= max_distance:
+                    matches.extend(PlateMatch(p, distance) for p in self._plates[candidate])
+        matches.sort(key=lambda match: (match.distance, match.plate))
+        return matches[:limit]
+
+    def best(self, plate, max_distance=1.0):
+        """The single closest plate, or None when nothing is in range or the best distance is tied."""
+        matches = self.search(plate, max_distance, limit=2)
+        if not matches or (len(matches) > 1 and matches[1].distance == matches[0].distance):
+            return None
+        return matches[0]
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(plates) for plates in self._plates.values())
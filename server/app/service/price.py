@@ -0,0 +1,99 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRICE = 1.0
+
+class PriceCache:
+    """
+    In-memory copy of the Firebase `price` value used on the exit path.
+    It is kept current by a Firebase stream listener and by /api/price, and re-read in the
+    background once older than `ttl` seconds. Exits always get the last known price
+    without waiting for Firebase; only the very first read is synchronous. When that read
+    failed, exits get `default` and the read is retried in the background every `retry_interval` seconds.
+    """
+    def __init__(self, ttl=60.0, default=DEFAULT_PRICE, retry_interval=10.0):
+        self.ttl = ttl
+        self.default = default
+        self.retry_interval = retry_interval
+        self._value = None
+        self._fetched_at = 0.0
+        self._attempted_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._stream = None
+
+    def set(self, price):
+        """Store a price known to be current (stream event or /api/price)."""
+        try:
+            value = float(price) if price is not None else None
+        except (TypeError, ValueError):
+            logger.warning("Ignoring invalid price value: %r", price)
+            return
+        with self._lock:
+            self._value = value
+            self._fetched_at = time.monotonic()
+
+    def refresh(self, db):
+        """Read the price from Firebase. Keeps the last known value when Firebase fails."""
+        with self._lock:
+            self._attempted_at = time.monotonic()
+        try:
+            self.set(db.child("price").get().val())
+        except Exception as e:
+            logger.warning("Failed to refresh price, keeping last known value: %s", e)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _refresh_in_background(self, db):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, args=(db,), name='price-refresh', daemon=True).start()
+
+    def get(self, db):
+        """Return the current price, falling back to the default when none was ever read."""
+        with self._lock:
+            value = self._value
+            now = time.monotonic()
+            loaded = self._fetched_at > 0
+            attempted = self._attempted_at > 0
+            stale = now - self._fetched_at > self.ttl
+            retry = now - self._attempted_at > self.retry_interval
+
+        if not loaded and not attempted:
+            self.refresh(db)
+            with self._lock:
+                value = self._value
+        elif not loaded:
+            # The first read failed: do not make every exit wait for Firebase (pyrebase has no timeout)
+            if retry:
+                self._refresh_in_background(db)
+        elif stale:
+            self._refresh_in_background(db)
+
+        return value if value is not None else self.default
+
+    def _on_stream_event(self, message):
+        # Only changes of the price node itself are relevant ('put' at the root of the stream)
+        if message.get("event") in ("put", "patch") and message.get("path") == "/":
+            self.set(message.get("data"))
+
+    def listen(self, db):
+        """Follow price changes through a Firebase stream."""
+        try:
+            self._stream = db.child("price").stream(self._on_stream_event)
+        except Exception as e:
+            logger.warning("Price stream unavailable, using TTL refresh only: %s", e)
+        return self
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+price_cache = PriceCache()
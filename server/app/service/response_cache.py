@@ -0,0 +1,142 @@
+import os
+import hashlib
+import time
+import threading
+from functools import wraps
+from collections import OrderedDict
+from flask import request, Response, make_response
+
+class ResponseCache:
+    """
+    Cache of read endpoint responses keyed by route and query arguments.
+    Every entry is tagged with the data version it was computed from; write paths call
+    `invalidate()` after committing, which bumps the version and makes all entries stale.
+    The ETag of a response is derived from its cache key and the version only, so a poll whose
+    If-None-Match still matches is answered 304 before the view (and SQLite) is reached.
+    The version lives in this process: only one worker process is supported (run.py, or a
+    threaded server). With several workers, a write in one would not invalidate the others;
+    set RESPONSE_CACHE_ENABLED = False there.
+    Entries are bounded by count (`max_entries`) and by total body size (`max_bytes`).
+    """
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.enabled = True
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._bytes = 0
+        # Distinguishes processes, so an ETag issued by another worker never matches by accident
+        self._boot = os.urandom(4).hex()
+        self._version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        """Mark every cached response stale. Called by the write paths after commit."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def configure(self, enabled=True, max_entries=256, max_bytes=32 * 1024 * 1024):
+        with self._lock:
+            self.enabled = enabled
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self._entries.clear()
+            self._bytes = 0
+        return self
+
+    @staticmethod
+    def key():
+        args = sorted(request.args.items(multi=True))
+        return request.path + '?' + '&'.join(f"{name}={value}" for name, value in args)
+
+    def etag(self, key, version, max_age=None):
+        # Responses that depend on the clock (e.g. "3 minutes ago") also change every `max_age` seconds
+        window = f"-{int(time.time() // max_age)}" if max_age else ''
+        # The key is part of the tag: an ETag of one route or query never matches another
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+        return f"{self._boot}-{digest}-{version}{window}"
+
+    def _get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _put(self, key, version, etag, response):
+        body = response.get_data()
+        # A body larger than the whole budget would evict everything else
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            # A write committed while the view ran: the result may predate it, do not keep it
+            if version != self._version:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            self._entries[key] = (etag, body, response.status_code, response.mimetype)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[1])
+
+    def cached(self, max_age=None):
+        """Decorator for GET views whose result only changes when the database is written."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+                # Read the version before computing, so a concurrent write always makes the result stale
+                version = self._version
+                key = self.key()
+                etag = self.etag(key, version, max_age)
+                if etag in request.if_none_match:
+                    self.not_modified += 1
+                    response = Response(status=304)
+                else:
+                    entry = self._get(key, etag)
+                    if entry is not None:
+                        _, body, status, mimetype = entry
+                        response = Response(body, status=status, mimetype=mimetype)
+                    else:
+                        response = make_response(view(*args, **kwargs))
+                        if response.status_code != 200:
+                            return response
+                        self._put(key, version, etag, response)
+
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self._version,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified
+            }
+
+response_cache = ResponseCache()
@@ -0,0 +1,211 @@
+import threading
+from collections import namedtuple
+from sqlalchemy import and_
+from ..models import db, VehicleDB, ParkingSession
+from .plates import PlateMatcher
+
+# session_id and checkin_time are None when the vehicle is known but not parked
+ActiveSession = namedtuple('ActiveSession', ['vehicle_id', 'session_id', 'checkin_time'])
+# Result of a fuzzy lookup: the matched plate, its edit distance to the scan and its entry
+SessionMatch = namedtuple('SessionMatch', ['plate', 'distance', 'entry'])
+
+class ActiveSessionIndex:
+    """
+    Process-local index plate -> ActiveSession used by the gate hot path.
+    It is warmed from SQLite at startup, kept current by the write paths after each commit,
+    and falls back to SQL for plates it does not know. "Not parked" is never trusted on its own:
+    exits re-check those plates in SQLite (`refresh`), since other workers do not update this index.
+    Plates with an open session are also kept in a fuzzy matcher for OCR misreads.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._matcher = PlateMatcher()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _load(plate_number=None, plate_numbers=None):
+        """Read vehicles and their open session from SQLite (one plate, a list of plates, or all)."""
+        query = db.session.query(
+            VehicleDB.plate_number,
+            VehicleDB.id,
+            ParkingSession.id,
+            ParkingSession.checkin_time
+        ).outerjoin(ParkingSession, and_(
+            ParkingSession.vehicle_id == VehicleDB.id,
+            ParkingSession.checkout_time.is_(None)
+        ))
+        if plate_number is not None:
+            query = query.filter(VehicleDB.plate_number == plate_number)
+        if plate_numbers is not None:
+            query = query.filter(VehicleDB.plate_number.in_(plate_numbers))
+
+        entries = {}
+        for plate, vehicle_id, session_id, checkin_time in query.all():
+            current = entries.get(plate)
+            # Same choice as ParkingSession.query.filter_by(...).first(): the oldest open session
+            if current is None or current.session_id is None or (session_id is not None and session_id < current.session_id):
+                entries[plate] = ActiveSession(vehicle_id, session_id, checkin_time)
+        return entries
+
+    def warm(self):
+        """Replace the whole index with the current SQLite state. Returns the number of plates."""
+        entries = self._load()
+        with self._lock:
+            self._entries = entries
+            self._rebuild_matcher()
+        return len(entries)
+
+    def _rebuild_matcher(self):
+        """Caller holds the lock."""
+        self._matcher.rebuild(plate for plate, entry in self._entries.items() if entry.session_id is not None)
+
+    def _track(self, plate_number, entry):
+        if entry is not None and entry.session_id is not None:
+            self._matcher.add(plate_number)
+        else:
+            self._matcher.discard(plate_number)
+
+    def lookup(self, plate_number):
+        """Return the ActiveSession of a plate, or None if the vehicle is unknown."""
+        with self._lock:
+            entry = self._entries.get(plate_number)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = self._load(plate_number).get(plate_number)
+        if entry is not None:
+            with self._lock:
+                entry = self._entries.setdefault(plate_number, entry)
+                self._track(plate_number, entry)
+        return entry
+
+    def lookup_many(self, plate_numbers):
+        """
+        Return {plate: ActiveSession} for the known plates among `plate_numbers`.
+        Plates missing from the index are read from SQLite with a single query.
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for plate in set(plate_numbers):
+                entry = self._entries.get(plate)
+                if entry is not None:
+                    self.hits += 1
+                    found[plate] = entry
+                else:
+                    self.misses += 1
+                    missing.append(plate)
+
+        if missing:
+            loaded = self._load(plate_numbers=missing)
+            with self._lock:
+                for plate, entry in loaded.items():
+                    found[plate] = self._entries.setdefault(plate, entry)
+                    self._track(plate, found[plate])
+        return found
+
+    def refresh_many(self, plate_numbers):
+        """
+        Re-read plates from SQLite and return {plate: ActiveSession} for the known ones.
+        Used when the index says "not parked": a session opened by another worker (or a write path
+        that does not update this index) is only visible in SQLite.
+        """
+        plate_numbers = list(plate_numbers)
+        with self._lock:
+            before = {plate: self._entries.get(plate) for plate in plate_numbers}
+        loaded = self._load(plate_numbers=plate_numbers)
+        with self._lock:
+            for plate in plate_numbers:
+                # A write path updated the plate while SQLite was read: its entry is newer
+                if self._entries.get(plate) is not before[plate]:
+                    continue
+                entry = loaded.get(plate)
+                if entry is None:
+                    self._entries.pop(plate, None)
+                else:
+                    self._entries[plate] = entry
+                self._track(plate, entry)
+        return loaded
+
+    def refresh(self, plate_number):
+        """Re-read one plate from SQLite. Returns its ActiveSession, or None if the vehicle is unknown."""
+        return self.refresh_many([plate_number]).get(plate_number)
+
+    def open_session(self, plate_number, vehicle_id, session_id, checkin_time):
+        # SQLite stores the wall-clock time without timezone
+        checkin_time = checkin_time.replace(tzinfo=None) if checkin_time else None
+        with self._lock:
+            self._entries[plate_number] = ActiveSession(vehicle_id, session_id, checkin_time)
+            self._matcher.add(plate_number)
+
+    def close_session(self, plate_number):
+        with self._lock:
+            entry = self._entries.get(plate_number)
+            if entry is not None:
+                self._entries[plate_number] = ActiveSession(entry.vehicle_id, None, None)
+            self._matcher.discard(plate_number)
+
+    def invalidate(self, plate_number):
+        """Forget a plate so the next lookup reads it from SQLite."""
+        with self._lock:
+            self._entries.pop(plate_number, None)
+            self._matcher.discard(plate_number)
+
+    def check_consistency(self, repair=True):
+        """
+        Compare the index with SQLite and return the plates that differ.
+        With `repair`, the index is replaced by the SQLite state.
+        """
+        expected = self._load()
+        with self._lock:
+            plates = set(expected) | set(self._entries)
+            # Plates missing from the index are only cold: lookups fall back to SQLite for them
+            mismatches = sorted(
+                plate for plate, entry in self._entries.items()
+                if expected.get(plate) is None or entry[:2] != expected[plate][:2]
+            )
+            if repair:
+                self._entries = expected
+                self._rebuild_matcher()
+        return {
+            'checked': len(plates),
+            'mismatches': mismatches,
+            'repaired': bool(repair and mismatches)
+        }
+
+    def match(self, plate_number, max_distance=1.0, limit=5):
+        """Open sessions whose plate is within `max_distance` of a scanned plate, nearest first."""
+        matches = []
+        for plate, distance in self._matcher.search(plate_number, max_distance, limit):
+            with self._lock:
+                entry = self._entries.get(plate)
+            if entry is not None and entry.session_id is not None:
+                matches.append(SessionMatch(plate, distance, entry))
+        return matches
+
+    def resolve(self, plate_number, max_distance=1.0):
+        """The open session a misread plate most likely belongs to, or None if there is no unambiguous match."""
+        best = self._matcher.best(plate_number, max_distance)
+        if best is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(best.plate)
+        if entry is None or entry.session_id is None:
+            return None
+        return SessionMatch(best.plate, best.distance, entry)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'plates': len(self._entries),
+                'active_sessions': sum(1 for entry in self._entries.values() if entry.session_id is not None),
+                'matcher_plates': len(self._matcher),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+active_sessions = ActiveSessionIndex()
@@ -0,0 +1,315 @@
+from datetime import timedelta
+import numpy as np
+from sqlalchemy import func, cast, Integer, union_all
+from sqlalchemy.dialects.sqlite import insert
+from ..models import db, ParkingSession, Transaction, RevenueRollup
+from .tariff import EPOCH, wall_clock_seconds
+
+WEEK_DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+# Upper bound of occupancy buckets per request (a week at one minute)
+MAX_OCCUPANCY_BUCKETS = 7 * 24 * 60
+
+class BucketLayout:
+    """
+    Describe how a dashboard time range is split into buckets.
+    `keys` are the values SQLite produces for `key_expr(column)`, in display order,
+    and `labels` are the names returned to the dashboards for each bucket.
+    """
+    def __init__(self, labels, keys, key_expr, window_start, window_end):
+        self.labels = labels
+        self.keys = keys
+        self.key_expr = key_expr
+        self.window_start = window_start
+        self.window_end = window_end
+
+    def fill(self, counts, default=0):
+        """Return one value per bucket in display order, using `default` for empty buckets."""
+        return [counts.get(key, default) for key in self.keys]
+
+def _day_keys(start_date, days):
+    return [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+
+def bucket_layout(start_date, end_date, time_range):
+    """
+    Build the bucket layout for `time_range` (day, week or month).
+    - day: 24 hourly buckets of `start_date`
+    - week: 7 daily buckets starting at `start_date`
+    - month: one daily bucket per day between `start_date` and `end_date`
+    """
+    if start_date is None:
+        raise ValueError("start_date is required")
+
+    if time_range == 'day':
+        return BucketLayout(
+            labels=[f"{hour:02d}:00" for hour in range(24)],
+            keys=[f"{hour:02d}" for hour in range(24)],
+            key_expr=lambda column: func.strftime('%H', column),
+            window_start=start_date,
+            window_end=start_date + timedelta(days=1)
+        )
+
+    if time_range == 'week':
+        return BucketLayout(
+            labels=list(WEEK_DAYS),
+            keys=_day_keys(start_date, len(WEEK_DAYS)),
+            key_expr=func.date,
+            window_start=start_date,
+            window_end=start_date + timedelta(days=len(WEEK_DAYS))
+        )
+
+    if end_date is None:
+        raise ValueError("end_date is required for time_range=month")
+    days_in_month = (end_date - start_date).days
+    return BucketLayout(
+        labels=[f"{day + 1}" for day in range(days_in_month)],
+        keys=_day_keys(start_date, days_in_month),
+        key_expr=func.date,
+        window_start=start_date,
+        window_end=start_date + timedelta(days=max(days_in_month, 0))
+    )
+
+def aggregate_by_bucket(layout, column, aggregate, filters=()):
+    """Compute `aggregate` per bucket of `column` with a single GROUP BY statement."""
+    bucket = layout.key_expr(column).label('bucket')
+    rows = db.session.query(bucket, aggregate)\
+        .filter(*filters)\
+        .filter(column >= layout.window_start, column < layout.window_end)\
+        .group_by(bucket).all()
+    return dict(rows)
+
+def count_by_bucket(layout, column, filters=()):
+    """Count rows per bucket of `column` with a single GROUP BY statement."""
+    return aggregate_by_bucket(layout, column, func.count(), filters)
+
+def rollup_hour(paid_at):
+    """Truncate `paid_at` to the start of its hour, keeping the wall-clock time stored in SQLite."""
+    return paid_at.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+def add_to_revenue_rollup(transaction):
+    """
+    Add a new transaction to its hourly revenue bucket.
+    The upsert runs in the caller's session so it is committed together with the transaction.
+    """
+    statement = insert(RevenueRollup).values(
+        hour=rollup_hour(transaction.paid_at),
+        payment_method=transaction.payment_method,
+        amount=float(transaction.amount),
+        transaction_count=1
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[RevenueRollup.hour, RevenueRollup.payment_method],
+        set_={
+            'amount': RevenueRollup.amount + statement.excluded.amount,
+            'transaction_count': RevenueRollup.transaction_count + 1
+        }
+    )
+    db.session.execute(statement)
+
+def add_many_to_revenue_rollup(transactions):
+    """
+    Add a batch of new transactions (dicts with paid_at, payment_method and amount) to the rollup.
+    Transactions are summed per bucket first, then upserted with one executemany statement.
+    """
+    buckets = {}
+    for transaction in transactions:
+        key = (rollup_hour(transaction['paid_at']), transaction['payment_method'])
+        amount, count = buckets.get(key, (0.0, 0))
+        buckets[key] = (amount + float(transaction['amount']), count + 1)
+    if not buckets:
+        return
+
+    statement = insert(RevenueRollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=[RevenueRollup.hour, RevenueRollup.payment_method],
+        set_={
+            'amount': RevenueRollup.amount + statement.excluded.amount,
+            'transaction_count': RevenueRollup.transaction_count + statement.excluded.transaction_count
+        }
+    )
+    db.session.execute(statement, [{
+        'hour': hour,
+        'payment_method': payment_method,
+        'amount': amount,
+        'transaction_count': count
+    } for (hour, payment_method), (amount, count) in buckets.items()])
+
+def rebuild_revenue_rollup():
+    """Recompute the whole revenue rollup from the transactions table. Returns the number of rollup rows."""
+    # Same text format as SQLAlchemy uses for DateTime columns on SQLite
+    hour = func.strftime('%Y-%m-%d %H:00:00.000000', Transaction.paid_at)
+    source = db.select(
+        hour,
+        Transaction.payment_method,
+        func.sum(Transaction.amount),
+        func.count(Transaction.id)
+    ).group_by(hour, Transaction.payment_method)
+
+    db.session.execute(db.delete(RevenueRollup))
+    db.session.execute(insert(RevenueRollup).from_select(
+        ['hour', 'payment_method', 'amount', 'transaction_count'], source
+    ))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(RevenueRollup).scalar()
+
+def load_stays(start, end):
+    """
+    Check-in and check-out wall-clock seconds of every session present at some point of [start, end),
+    clipped to the range. Sessions still open are counted until `end`.
+    One query: the sessions checked in during the range, plus the ones checked in before it and
+    still inside at its start, each part an index range scan (instead of scanning all past sessions).
+    """
+    columns = (
+        cast(func.strftime('%s', ParkingSession.checkin_time), Integer),
+        func.coalesce(cast(func.strftime('%s', ParkingSession.checkout_time), Integer), -1)
+    )
+    statement = union_all(
+        db.select(*columns).where(ParkingSession.checkin_time >= start, ParkingSession.checkin_time < end),
+        db.select(*columns).where(ParkingSession.checkin_time < start, ParkingSession.checkout_time > start),
+        db.select(*columns).where(ParkingSession.checkin_time < start, ParkingSession.checkout_time.is_(None))
+    )
+    rows = db.session.execute(statement)
+    stays = np.fromiter((value for row in rows for value in row), dtype=np.int64).reshape(-1, 2)
+    start_seconds, end_seconds = wall_clock_seconds(start), wall_clock_seconds(end)
+    checkin = np.maximum(stays[:, 0], start_seconds)
+    checkout = np.where(stays[:, 1] < 0, end_seconds, np.minimum(stays[:, 1], end_seconds))
+    # Rows checked out before their check-in (clock errors) count as zero-length stays
+    return checkin, np.maximum(checkout, checkin)
+
+def occupancy_series(checkin, checkout, start, end, resolution):
+    """
+    Sweep-line over the entry (+1) and exit (-1) events of the stays, all in seconds.
+    Returns (edges, at_start, average, peak) with one value per bucket of `resolution` seconds:
+    cars inside at the bucket start, time-weighted average and maximum during the bucket.
+    """
+    edges = np.arange(start, end, resolution, dtype=np.int64)
+    bucket_ends = np.minimum(edges + resolution, end)
+
+    if len(checkin) == 0:
+        empty = np.zeros(len(edges), dtype=np.int64)
+        return edges, empty, empty.astype(np.float64), empty
+
+    times = np.concatenate([checkin, checkout])
+    deltas = np.concatenate([np.ones(len(checkin), dtype=np.int64), -np.ones(len(checkout), dtype=np.int64)])
+    order = np.argsort(times, kind='stable')
+    times, inside = times[order], np.cumsum(deltas[order])
+    # Only the count after the last event of each second is real: a car leaving as another
+    # enters is no extra peak
+    last_of_second = np.append(times[1:] != times[:-1], True)
+    times, inside = times[last_of_second], inside[last_of_second]
+    # Car-seconds accumulated up to each event
+    area = np.concatenate([[0], np.cumsum(inside[:-1] * np.diff(times))])
+
+    def occupancy_at(points):
+        """Cars inside and car-seconds accumulated at each point."""
+        last = np.searchsorted(times, points, side='right') - 1
+        index = np.maximum(last, 0)
+        count = np.where(last >= 0, inside[index], 0)
+        accumulated = np.where(last >= 0, area[index] + count * (points - times[index]), 0)
+        return count, accumulated
+
+    at_start, area_start = occupancy_at(edges)
+    _, area_end = occupancy_at(bucket_ends)
+    average = (area_end - area_start) / (bucket_ends - edges)
+
+    # Peak of a bucket: its starting value or any count reached by an event inside it,
+    # reduceat over [first, last) pairs (the odd segments in between are dropped)
+    first = np.searchsorted(times, edges, side='left')
+    last = np.searchsorted(times, bucket_ends, side='left')
+    peak = at_start.copy()
+    has_events = last > first
+    if has_events.any():
+        bounds = np.column_stack([first[has_events], last[has_events]]).ravel()
+        maxima = np.maximum.reduceat(np.append(inside, 0), bounds)[::2]
+        peak[has_events] = np.maximum(peak[has_events], maxima)
+    return edges, at_start, average, peak
+
+def ensure_revenue_rollup():
+    """Backfill the rollup on databases created before it existed."""
+    if db.session.query(RevenueRollup.hour).first() is None and db.session.query(Transaction.id).first() is not None:
+        return rebuild_revenue_rollup()
+    return 0
+
+class StatsService:
+    @staticmethod
+    def parking_stats(start_date, end_date, time_range):
+        """
+        Count entries and exits per bucket of the requested time range.
+        Runs one grouped query for entries and one for exits, whatever the number of buckets.
+        `end_date` is exclusive and only restricts which sessions are considered.
+        """
+        layout = bucket_layout(start_date, end_date, time_range)
+
+        # Sessions considered by the dashboard are the ones checked in inside the range
+        session_filters = [ParkingSession.checkin_time >= start_date]
+        if end_date is not None:
+            session_filters.append(ParkingSession.checkin_time < end_date)
+
+        entries = count_by_bucket(layout, ParkingSession.checkin_time, session_filters)
+        exits = count_by_bucket(layout, ParkingSession.checkout_time, session_filters)
+
+        return [{
+            'hour': label,
+            'entries': entry_count,
+            'exits': exit_count
+        } for label, entry_count, exit_count in zip(layout.labels, layout.fill(entries), layout.fill(exits))]
+
+    @staticmethod
+    def revenue_stats(start_date, end_date, time_range, payment_method=None):
+        """
+        Sum revenue per bucket of the requested time range from the hourly rollup.
+        Reads at most one rollup row per hour and payment method of the window.
+        """
+        layout = bucket_layout(start_date, end_date, time_range)
+
+        # Range bounds are midnights, so filtering on the truncated hour keeps the same transactions
+        filters = [RevenueRollup.hour >= start_date]
+        if end_date is not None:
+            filters.append(RevenueRollup.hour < end_date)
+        if payment_method:
+            filters.append(RevenueRollup.payment_method == payment_method)
+
+        revenue = aggregate_by_bucket(layout, RevenueRollup.hour, func.sum(RevenueRollup.amount), filters)
+
+        return [{
+            'name': label,
+            'revenue': float(amount or 0)
+        } for label, amount in zip(layout.labels, layout.fill(revenue))]
+
+    @staticmethod
+    def occupancy_stats(start, end, resolution_minutes=60):
+        """
+        Cars inside the parking lot over [start, end), per bucket of `resolution_minutes`.
+        One query loads the stays, the series is computed with a sweep over their sorted events.
+        """
+        if resolution_minutes < 1:
+            raise ValueError("resolution must be at least 1 minute")
+        if end <= start:
+            raise ValueError("end must be after start")
+        resolution = resolution_minutes * 60
+        start_seconds, end_seconds = wall_clock_seconds(start), wall_clock_seconds(end)
+        if (end_seconds - start_seconds) / resolution > MAX_OCCUPANCY_BUCKETS:
+            raise ValueError(f"Too many buckets, use a coarser resolution (at most {MAX_OCCUPANCY_BUCKETS})")
+
+        checkin, checkout = load_stays(start, end)
+        edges, at_start, average, peak = occupancy_series(checkin, checkout, start_seconds, end_seconds, resolution)
+
+        def as_time(seconds):
+            return (EPOCH + timedelta(seconds=int(seconds))).isoformat()
+
+        busiest = int(np.argmax(peak)) if len(peak) else None
+        duration = end_seconds - start_seconds
+        return {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'resolution_minutes': resolution_minutes,
+            'sessions': int(len(checkin)),
+            'peak': int(peak[busiest]) if busiest is not None else 0,
+            'peak_bucket': as_time(edges[busiest]) if busiest is not None else None,
+            'average': round(float((average * (np.minimum(edges + resolution, end_seconds) - edges)).sum() / duration), 2),
+            'series': [{
+                'time': as_time(edge),
+                'occupancy': count,
+                'average': round(mean, 2),
+                'peak': maximum
+            } for edge, count, mean, maximum in zip(edges.tolist(), at_start.tolist(), average.tolist(), peak.tolist())]
+        }
@@ -0,0 +1,273 @@
+import json
+import math
+import threading
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, cast, select, event, Integer
+from ..models import db, ParkingSession, Transaction
+from .price import price_cache
+
+DAY = 24 * 3600
+EPOCH = datetime(1970, 1, 1)
+
+def wall_clock_seconds(value):
+    """Seconds since 1970 of a Vietnam wall-clock time (naive as stored in SQLite, or aware)."""
+    return int((value.replace(tzinfo=None) - EPOCH).total_seconds())
+
+def _parse_time_of_day(value):
+    try:
+        hours, minutes = (int(part) for part in str(value).split(':'))
+    except ValueError:
+        raise ValueError(f"Invalid time of day {value!r}, expected HH:MM")
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise ValueError(f"Invalid time of day {value!r}, expected HH:MM")
+    return hours * 3600 + minutes * 60
+
+def _non_negative(data, name, default=None):
+    value = data.get(name, default)
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    if value < 0:
+        raise ValueError(f"{name} must not be negative")
+    return value
+
+class Tariff:
+    """
+    Parking tariff, applied to whole arrays of sessions at once.
+    - entry_fee: charged once per session (the Firebase `price` when not configured)
+    - hourly_rate: charged per hour outside of the bands
+    - bands: time-of-day rates [{"start": "08:00", "end": "18:00", "rate": 5}], may wrap midnight
+    - grace_minutes: sessions up to this long are free
+    - daily_max: cap of the time charge of every 24 hours since check-in
+    - max_fee: cap of the whole session fee
+    Times are Vietnam wall-clock, so bands follow the local day.
+    """
+    def __init__(self, entry_fee=0.0, hourly_rate=0.0, bands=(), grace_minutes=0.0, daily_max=None, max_fee=None):
+        self.entry_fee = entry_fee
+        self.hourly_rate = hourly_rate
+        self.bands = list(bands)
+        self.grace_minutes = grace_minutes
+        self.daily_max = daily_max
+        self.max_fee = max_fee
+        self._build_day_curve()
+
+    @classmethod
+    def from_dict(cls, data, default_entry_fee=0.0):
+        if not isinstance(data, dict):
+            raise ValueError("tariff must be an object")
+        bands = data.get('bands') or []
+        if not isinstance(bands, list):
+            raise ValueError("bands must be a list")
+        parsed = []
+        for band in bands:
+            if not isinstance(band, dict) or 'start' not in band or 'end' not in band:
+                raise ValueError("Every band needs start, end and rate")
+            parsed.append({
+                'start': _parse_time_of_day(band['start']),
+                'end': _parse_time_of_day(band['end']),
+                'rate': _non_negative(band, 'rate', 0.0)
+            })
+        return cls(
+            entry_fee=_non_negative(data, 'entry_fee', default_entry_fee),
+            hourly_rate=_non_negative(data, 'hourly_rate', 0.0),
+            bands=parsed,
+            grace_minutes=_non_negative(data, 'grace_minutes', 0.0),
+            daily_max=_non_negative(data, 'daily_max'),
+            max_fee=_non_negative(data, 'max_fee')
+        )
+
+    def to_dict(self):
+        def time_of_day(seconds):
+            return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+        return {
+            'entry_fee': self.entry_fee,
+            'hourly_rate': self.hourly_rate,
+            'bands': [{'start': time_of_day(band['start']), 'end': time_of_day(band['end']), 'rate': band['rate']}
+                      for band in self.bands],
+            'grace_minutes': self.grace_minutes,
+            'daily_max': self.daily_max,
+            'max_fee': self.max_fee
+        }
+
+    def _build_day_curve(self):
+        """
+        Cumulative time charge over one day, as (second of day, charge so far) points.
+        Charges between two instants are then differences of one np.interp per array.
+        """
+        # Per-second rate of every band, wrapping bands split at midnight
+        spans = []
+        for band in self.bands:
+            if band['start'] == band['end']:
+                raise ValueError("Band start and end must differ")
+            pieces = [(band['start'], band['end'])] if band['start'] < band['end'] \
+                else [(band['start'], DAY), (0, band['end'])]
+            spans.extend((start, end, band['rate'] / 3600) for start, end in pieces)
+        spans.sort()
+        for (_, previous_end, _), (start, _, _) in zip(spans, spans[1:]):
+            if start < previous_end:
+                raise ValueError("Bands must not overlap")
+
+        edges = [0]
+        cumulative = [0.0]
+        def advance(to, rate):
+            if to > edges[-1]:
+                cumulative.append(cumulative[-1] + (to - edges[-1]) * rate)
+                edges.append(to)
+        for start, end, rate in spans:
+            advance(start, self.hourly_rate / 3600)
+            advance(end, rate)
+        advance(DAY, self.hourly_rate / 3600)
+
+        self._edges = np.array(edges, dtype=np.float64)
+        self._cumulative = np.array(cumulative)
+        self.day_charge = cumulative[-1]
+
+    def _charge_until(self, seconds):
+        """Time charge accumulated from 1970 to each instant of `seconds`."""
+        days, second_of_day = np.divmod(seconds, DAY)
+        return days * self.day_charge + np.interp(second_of_day, self._edges, self._cumulative)
+
+    def fees(self, checkin, checkout):
+        """
+        Fee of every session, for arrays of check-in and check-out wall-clock seconds
+        (see `wall_clock_seconds`). Returns a float array rounded to cents.
+        """
+        checkin = np.asarray(checkin, dtype=np.int64)
+        checkout = np.maximum(np.asarray(checkout, dtype=np.int64), checkin)
+        duration = checkout - checkin
+
+        if self.daily_max is None:
+            charge = self._charge_until(checkout) - self._charge_until(checkin)
+        else:
+            # Every full 24 hours costs the same whatever the start, only the last partial day varies
+            full_days = duration // DAY
+            last_day_start = checkin + full_days * DAY
+            charge = full_days * min(self.day_charge, self.daily_max) \
+                + np.minimum(self._charge_until(checkout) - self._charge_until(last_day_start), self.daily_max)
+
+        fees = self.entry_fee + charge
+        if self.max_fee is not None:
+            fees = np.minimum(fees, self.max_fee)
+        if self.grace_minutes:
+            fees = np.where(duration <= self.grace_minutes * 60, 0.0, fees)
+        return np.round(fees, 2)
+
+    def fee(self, checkin_time, checkout_time):
+        """Fee of one session from its check-in and check-out datetimes."""
+        return float(self.fees([wall_clock_seconds(checkin_time)], [wall_clock_seconds(checkout_time)])[0])
+
+@lru_cache(maxsize=8)
+def _tariff_for(config, price):
+    return Tariff.from_dict(json.loads(config), default_entry_fee=price)
+
+def current_tariff(db):
+    """
+    Tariff used on the exit paths: Config.TARIFF, with the Firebase `price` as entry fee unless
+    the config sets one. Without TARIFF every session costs the flat price, as before.
+    """
+    config = json.dumps(current_app.config.get('TARIFF') or {}, sort_keys=True)
+    return _tariff_for(config, price_cache.get(db))
+
+def summarize_fees(fees):
+    if len(fees) == 0:
+        return {'revenue': 0.0, 'mean': None, 'median': None, 'p95': None, 'max': None, 'free_sessions': 0}
+    return {
+        'revenue': round(float(fees.sum()), 2),
+        'mean': round(float(fees.mean()), 2),
+        'median': round(float(np.median(fees)), 2),
+        'p95': round(float(np.percentile(fees, 95)), 2),
+        'max': round(float(fees.max()), 2),
+        'free_sessions': int(np.count_nonzero(fees == 0))
+    }
+
+def compare_tariffs(candidate, current, checkin, checkout):
+    """Price the same sessions under both tariffs and summarize the difference."""
+    candidate_fees = candidate.fees(checkin, checkout)
+    current_fees = current.fees(checkin, checkout)
+    difference = candidate_fees - current_fees
+    return {
+        'sessions': int(len(candidate_fees)),
+        'candidate': summarize_fees(candidate_fees),
+        'current': summarize_fees(current_fees),
+        'revenue_change': round(float(difference.sum()), 2),
+        'sessions_higher': int(np.count_nonzero(difference > 0.005)),
+        'sessions_lower': int(np.count_nonzero(difference < -0.005))
+    }
+
+# Sessions of the last simulated range: (range, data version) -> arrays, reused by the next what-if
+_loaded_lock = threading.Lock()
+_loaded = {}
+# Bumped by every commit that wrote sessions or transactions, whatever the write path
+_data_version = 0
+SIMULATED_TABLES = {ParkingSession.__tablename__, Transaction.__tablename__}
+
+@event.listens_for(db.session, 'after_flush')
+def _track_flushed_writes(session, flush_context):
+    if any(isinstance(obj, (ParkingSession, Transaction)) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['tariff_data_changed'] = True
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _track_statement_writes(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements do not go through the flush
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if not orm_execute_state.is_select and getattr(table, 'name', None) in SIMULATED_TABLES:
+        orm_execute_state.session.info['tariff_data_changed'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_data_version(session):
+    global _data_version
+    if session.info.pop('tariff_data_changed', False):
+        with _loaded_lock:
+            _data_version += 1
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_data_change(session):
+    session.info.pop('tariff_data_changed', None)
+
+def load_closed_sessions(start_date=None, end_date=None):
+    """
+    Check-in and check-out wall-clock seconds of the closed sessions checked in within the range,
+    as two int64 arrays, plus the revenue recorded for them.
+    SQLite converts the stored times itself, no datetime is built per row. The last range is kept
+    until the next write, so trying several tariffs on it only reads SQLite once.
+    """
+    key = (start_date, end_date, _data_version)
+    with _loaded_lock:
+        if key in _loaded:
+            return _loaded[key]
+
+    filters = [ParkingSession.checkout_time.isnot(None)]
+    if start_date is not None:
+        filters.append(ParkingSession.checkin_time >= start_date)
+    if end_date is not None:
+        filters.append(ParkingSession.checkin_time < end_date)
+    statement = select(
+        cast(func.strftime('%s', ParkingSession.checkin_time), Integer),
+        cast(func.strftime('%s', ParkingSession.checkout_time), Integer)
+    ).where(*filters)
+    rows = db.session.execute(statement)
+    times = np.fromiter((value for row in rows for value in row), dtype=np.int64).reshape(-1, 2)
+
+    recorded = db.session.query(func.sum(Transaction.amount))\
+        .join(ParkingSession, ParkingSession.id == Transaction.session_id)\
+        .filter(*filters).scalar()
+    loaded = (times[:, 0], times[:, 1], float(recorded or 0))
+    with _loaded_lock:
+        _loaded.clear()
+        _loaded[key] = loaded
+    return loaded
+
+def simulate_tariff(candidate, current, start_date=None, end_date=None):
+    """Re-price the historical sessions of the range under `candidate`, next to the current tariff."""
+    checkin, checkout, recorded = load_closed_sessions(start_date, end_date)
+    result = compare_tariffs(candidate, current, checkin, checkout)
+    result['recorded_revenue'] = round(recorded, 2)
+    return result
@@ -1,14 +1,26 @@
-import requests
 from werkzeug.utils import secure_filename
 import os
+from concurrent.futures import ThreadPoolExecutor
 from ..models import Vehicle, VehicleDB, ParkingSession, Transaction
 from datetime import datetime
 import pytz
 from .door import set_door_status, get_door_status
+from .stats import add_to_revenue_rollup, add_many_to_revenue_rollup
+from .session_index import active_sessions
+from .tariff import current_tariff, wall_clock_seconds
+from .journal import journal
+from .response_cache import response_cache
+from .metrics import metrics
+from .firebase_writer import DirectFirebaseWriter
+from .firebase_events import FirebaseEventPublisher
+from .plates import canonical_plate, sanitize_license_plate
+from ..utils.http import get_http_session, DEFAULT_TIMEOUT
+from ..utils.image_store import ImageStore
 from flask import current_app
-from sqlalchemy import func
+from sqlalchemy import func, update, insert
+from collections import namedtuple
 import logging
-import sqlite3
+import time
 
 # Define Vietnam timezone
 VIETNAM_TZ = pytz.timezone('Asia/Ho_Chi_Minh')
@@ -17,39 +29,63 @@ def get_vietnam_time():
     """Get current time in Vietnam timezone"""
     return datetime.now(VIETNAM_TZ)
 
-def sanitize_license_plate(plate: str) -> str:
-    """Sanitize license plate number for Firebase path compatibility."""
-    # Replace invalid characters with underscores
-    return plate.replace('.', '_').replace('/', '_').replace('#', '_').replace('$', '_').replace('[', '_').replace(']', '_')
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('parking.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+
+BATCH_ACTIONS = ("enter", "exit", "conflict")
+MAX_BATCH_EVENTS = 1000
+# Largest plate distance an exit closes another plate's session at: confusable (0/O, 8/B, 1/I)
+# and similar-character misreads only. Wider matches are for the operator (/api/plates/match)
+EXIT_MATCH_MAX_DISTANCE = 0.5
+
+# Same fields as the RETURNING of close_parking_session, for sessions opened and closed in one batch
+ClosedSession = namedtuple('ClosedSession', ['checkin_time', 'image_src', 'rfid_code'])
+
+def scan_time(timestamp):
+    """Vietnam wall-clock time (naive, as stored in SQLite) of a buffered scan, or now when it has none."""
+    if not timestamp:
+        return get_vietnam_time().replace(tzinfo=None)
+    value = datetime.fromisoformat(timestamp)
+    if value.tzinfo is not None:
+        value = value.astimezone(VIETNAM_TZ).replace(tzinfo=None)
+    return value
+
+def validate_batch_event(event):
+    """
+    Check one buffered scan and canonicalize its plate in place. Returns its scan time,
+    raises ValueError with a message for the client when the event cannot be applied.
+    """
+    plate = event.get("licensePlate")
+    if not isinstance(plate, str) or not plate.strip():
+        raise ValueError("licensePlate must be a non-empty string")
+    event["licensePlate"] = canonical_plate(plate)
+    if event.get("status") not in BATCH_ACTIONS:
+        raise ValueError(f"status must be one of: {', '.join(BATCH_ACTIONS)}")
+    timestamp = event.get("timestamp")
+    if timestamp is not None and not isinstance(timestamp, str):
+        raise ValueError("timestamp must be an ISO 8601 date-time string")
+    try:
+        return scan_time(timestamp)
+    except ValueError:
+        raise ValueError("timestamp must be an ISO 8601 date-time string")
+
 def set_image_src_last_scan(db, image_src, license_plate):
     try:
-        db.child("lastScan").set({"imageSrc": image_src, "licensePlate": license_plate})
-        logger.info(f"Successfully updated last scan for vehicle {license_plate}")
+        FirebaseEventPublisher(db).last_scan(image_src, license_plate)
+        logger.info("Successfully updated last scan for vehicle %s", license_plate)
         return True
     except Exception as e:
-        logger.error(f"Failed to update last scan: {str(e)}")
+        logger.error("Failed to update last scan: %s", e)
         return False
 
 def set_vehicle_last_action(db, vehicle_data, action):
     try:
-        db.child("vehicle_last_action").child("action").set(action)
-        db.child("vehicle_last_action").child("infor").set(vehicle_data)
-        logger.info(f"Successfully set last action '{action}' for vehicle {vehicle_data['licensePlate']}")
+        # action and infor are written together so they always describe the same event
+        FirebaseEventPublisher(db).last_action(vehicle_data, action)
+        logger.info("Successfully set last action '%s' for vehicle %s", action, vehicle_data['licensePlate'])
         return True
     except Exception as e:
-        logger.error(f"Failed to set last action: {str(e)}")
+        logger.error("Failed to set last action: %s", e)
         return False
 
 def get_vehicle_action(db,vehicle_data,action):
@@ -57,7 +93,7 @@ def get_vehicle_action(db,vehicle_data,action):
         db.child("vehicles").child(vehicle_data["licensePlate"]).set(vehicle_data)
         return db.child("vehicle_last_action").child("infor").set(vehicle_data)
     except Exception as e:
-        print(f"Vehicle data retrieval error: {e}")
+        logger.error("Vehicle data retrieval error: %s", e)
         return None
 
 def store_vehicle_data(vehicle_data):
@@ -66,7 +102,7 @@ def store_vehicle_data(vehicle_data):
         sql_db.session.commit()
         return True
     except Exception as e:
-        print(f"Vehicle data retrieval error: {e}")
+        logger.error("Vehicle data retrieval error: %s", e)
         return False
 
 def update_vehicle_data(vehicle_data):
@@ -74,51 +110,109 @@ def update_vehicle_data(vehicle_data):
         sql_db.session.commit()
         return True
     except Exception as e:
-        print(f"Vehicle data retrieval error: {e}")
+        logger.error("Vehicle data retrieval error: %s", e)
         return False
 
-def log_sqlite_data(vehicle_data, action):
-    """Log current state of SQLite database"""
-    try:
-        db_path = os.path.join(current_app.instance_path, 'example.db')
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Log vehicles table
-        cursor.execute("SELECT * FROM vehicles")
-        vehicles = cursor.fetchall()
-        
-        # Log parking_sessions table
-        cursor.execute("SELECT * FROM parking_sessions")
-        sessions = cursor.fetchall()
-        
-        # Log transactions table
-        cursor.execute("SELECT * FROM transactions")
-        transactions = cursor.fetchall()
-        
-        conn.close()
-    except Exception as e:
-        logger.error(f"Error logging SQLite data: {str(e)}")
+def close_parking_session(sqldb, session_id, checkout_time):
+    """
+    Set the checkout time of a session that is still open.
+    Returns the session's (checkin_time, image_src, rfid_code), or None if it was already closed.
+    """
+    statement = update(ParkingSession)\
+        .where(ParkingSession.id == session_id, ParkingSession.checkout_time.is_(None))\
+        .values(checkout_time=checkout_time)\
+        .returning(ParkingSession.checkin_time, ParkingSession.image_src, ParkingSession.rfid_code)\
+        .execution_options(synchronize_session=False)
+    return sqldb.session.execute(statement).first()
+
+def exit_vehicle_data(license_plate, checkout_time, closed_session=None):
+    """Vehicle data published on exit, rebuilt from the closed session instead of read back from Firebase."""
+    vehicle_data = {"licensePlate": license_plate, "exitTime": checkout_time.isoformat()}
+    if closed_session is not None:
+        vehicle_data.update({
+            "entryTime": VIETNAM_TZ.localize(closed_session.checkin_time).isoformat(),
+            "imageSrc": closed_session.image_src,
+            "rfid": closed_session.rfid_code
+        })
+    return vehicle_data
+
+def apply_firebase_event(db, event, payload):
+    """Push one queued gate event to Firebase. Returns False when Firebase rejected it."""
+    if event == "enter":
+        return VehicleService.handle_vehicle_enter(db, payload)
+    if event == "exit":
+        # Outbox rows written before exit payloads carried the vehicle only have the plate
+        return VehicleService.handle_vehicle_exit(db, payload["licensePlate"], payload if "exitTime" in payload else None)
+    if event == "conflict":
+        return VehicleService.handle_vehicle_conflict(db, payload)
+    if event == "last_scan":
+        return set_image_src_last_scan(db, payload["imageSrc"], payload["licensePlate"])
+    raise ValueError(f"Unknown Firebase event: {event}")
+
+def get_firebase_writer(db):
+    """Background writer of the app, or a synchronous one when the app has none."""
+    writer = current_app.config.get('FIREBASE_WRITER')
+    if writer is None:
+        writer = DirectFirebaseWriter(db, apply_firebase_event)
+    return writer
+
+def normalize_firebase_vehicle(data):
+    """
+    A `vehicles` entry as Firebase stores it, for comparisons: Firebase drops None fields,
+    and entryTime is compared as an instant whatever its ISO format.
+    """
+    if not isinstance(data, dict):
+        return data
+    normalized = {key: value for key, value in data.items() if value is not None}
+    entry_time = normalized.get('entryTime')
+    if isinstance(entry_time, str):
+        try:
+            parsed = datetime.fromisoformat(entry_time)
+        except ValueError:
+            return normalized
+        if parsed.tzinfo is None:
+            parsed = VIETNAM_TZ.localize(parsed)
+        normalized['entryTime'] = parsed.astimezone(pytz.utc)
+    return normalized
 
 class VehicleService:
     @staticmethod
-    def store_image(image_url, static_folder):
+    def store_image(image_url, static_folder, session=None, timeout=DEFAULT_TIMEOUT):
+        """
+        Download `image_url` into the content-addressed ImageStore at `static_folder` and return
+        its URL path (see ImageStore.save), or None on failure. The body is streamed and hashed
+        in chunks over the shared pooled session (timeouts and retries included); snapshots that
+        share a file name (every camera's snapshot.jpg) are stored under their own content hash.
+        """
         try:
-            response = requests.get(image_url)
-            if response.status_code != 200:
-                raise ValueError("Failed to download image")
-            
-            image_name = secure_filename(image_url.split("/")[-1])
-            image_path = os.path.join(static_folder, image_name)
-            
-            with open(image_path, "wb") as f:
-                f.write(response.content)
-            
-            return image_name
+            session = session or get_http_session()
+            image_name = secure_filename(image_url.split("?")[0].split("/")[-1])
+            with metrics.timed('image'), session.get(image_url, stream=True, timeout=timeout) as response:
+                if response.status_code != 200:
+                    raise ValueError(f"Failed to download image: HTTP {response.status_code}")
+                # Undo the transfer encoding (gzip...) while reading the raw stream
+                response.raw.decode_content = True
+                return ImageStore(static_folder).save(response.raw, image_name)
         except Exception as e:
-            print(f"Image storage error: {e}")
+            logger.error("Image storage error for %s: %s", image_url, e)
             return None
 
+    @staticmethod
+    def store_images(image_urls, static_folder, max_workers=8, timeout=DEFAULT_TIMEOUT):
+        """
+        Download many images in parallel into the ImageStore at `static_folder`, for the image URLs
+        of a batch of gate events. Returns the stored URL paths in the order of `image_urls`
+        (None for failed downloads).
+        """
+        session = get_http_session()
+        if max_workers <= 1 or len(image_urls) <= 1:
+            return [VehicleService.store_image(url, static_folder, session, timeout) for url in image_urls]
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-download') as executor:
+            return list(executor.map(
+                lambda url: VehicleService.store_image(url, static_folder, session, timeout),
+                image_urls
+            ))
+
     @staticmethod
     def handle_vehicle_scan(db, license_plate, rfid_code=None, image_src=None):
         try:
@@ -141,10 +235,8 @@ class VehicleService:
                 # Vehicle is exiting
                 active_session.checkout_time = get_vietnam_time()
                 
-                # Calculate fee based on time difference
-                time_diff = active_session.checkout_time - active_session.checkin_time
-                hours = time_diff.total_seconds() / 3600
-                fee = hours * 10  # $10 per hour
+                # Calculate fee from the stay with the current tariff
+                fee = current_tariff(db).fee(active_session.checkin_time, active_session.checkout_time)
                 active_session.fee = fee
 
                 # Create transaction record
@@ -155,6 +247,7 @@ class VehicleService:
                     paid_at=get_vietnam_time()
                 )
                 sqldb.session.add(transaction)
+                add_to_revenue_rollup(transaction)
             else:
                 # Vehicle is entering
                 new_session = ParkingSession(
@@ -166,25 +259,26 @@ class VehicleService:
                 sqldb.session.add(new_session)
 
             sqldb.session.commit()
+            if active_session:
+                active_sessions.close_session(license_plate)
+                journal.record("exit", license_plate, session_id=active_session.id, fee=fee, scan=True)
+            else:
+                active_sessions.open_session(license_plate, vehicle.id, new_session.id, new_session.checkin_time)
+                journal.record("enter", license_plate, vehicle_id=vehicle.id, session_id=new_session.id, scan=True)
+            response_cache.invalidate()
 
-            # Update Firebase data
-            vehicle_data = db.child("vehicles").child(license_plate).get()
-            if vehicle_data.val():
+            # Update Firebase data, one multi-location update per event
+            if active_session:
                 # Vehicle is exiting
-                db.child("vehicles").child(license_plate).update({
-                    "exitTime": get_vietnam_time().isoformat()
-                })
-                set_vehicle_last_action(db, vehicle_data, "exit")
+                VehicleService.handle_vehicle_exit(db, license_plate)
             else:
                 # Vehicle is entering
                 vehicle_data = Vehicle.create(license_plate)
-                db.child("vehicles").child(license_plate).set(vehicle_data)
-                set_image_src_last_scan(db, vehicle_data["imageSrc"], vehicle_data["licensePlate"])
-                set_vehicle_last_action(db, vehicle_data, "enter")
+                FirebaseEventPublisher(db).enter(vehicle_data, last_scan=True)
 
             return True
         except Exception as e:
-            print(f"Vehicle scan error: {e}")
+            logger.error("Vehicle scan error: %s", e)
             sqldb.session.rollback()
             return False
 
@@ -206,139 +300,350 @@ class VehicleService:
             )
             sqldb.session.add(session)
             sqldb.session.commit()
+            active_sessions.open_session(vehicle_data["licensePlate"], vehicle.id, session.id, session.checkin_time)
+            response_cache.invalidate()
+            journal.record("enter", vehicle_data["licensePlate"], vehicle_id=vehicle.id, session_id=session.id, new_vehicle=True)
 
-            # Update Firebase
-            db.child("vehicles").child(vehicle_data["licensePlate"]).set(vehicle_data)
-            set_image_src_last_scan(db, vehicle_data["imageSrc"], vehicle_data["licensePlate"])
-            set_vehicle_last_action(db, vehicle_data, "enter")
+            # Update Firebase: vehicle, last scan and last action in one update
+            FirebaseEventPublisher(db).enter(vehicle_data, last_scan=True)
             return True
         except Exception as e:
-            logger.error(f"Failed to add new vehicle {vehicle_data['licensePlate']}: {str(e)}")
+            logger.error("Failed to add new vehicle %s: %s", vehicle_data['licensePlate'], e)
             sqldb.session.rollback()
             return False
 
     @staticmethod
-    def handle_vehicle_exit(db,license_plate):
+    def handle_vehicle_batch(db, events):
+        """
+        Apply buffered gate scans in order within one SQLite transaction.
+        Each event is a dict with licensePlate, status (enter/exit/conflict) and optional rfid,
+        timestamp (ISO 8601) and imageSrc. Vehicles, sessions and transactions are written with
+        bulk statements, and Firebase only receives the final state of each plate.
+        Returns one result per event; invalid events are reported and skipped.
+        """
+        sqldb = current_app.config['SQLDB']
+        results = []
+        valid = []
+        for index, event in enumerate(events):
+            result = {"index": index, "licensePlate": event.get("licensePlate"), "status": event.get("status")}
+            results.append(result)
+            try:
+                when = validate_batch_event(event)
+                result["licensePlate"] = event["licensePlate"]
+                valid.append((result, event, when))
+            except ValueError as e:
+                result.update(ok=False, error=str(e))
+        if not valid:
+            return results
+
+        try:
+            plates = [event["licensePlate"] for _, event, _ in valid]
+            # plate -> [vehicle_id, open session]: an existing session id, or the dict of a session inserted by this batch
+            state = {plate: [entry.vehicle_id, entry.session_id] for plate, entry in active_sessions.lookup_many(plates).items()}
+            # Exiting plates the index holds as not parked are checked in SQLite (session opened by another worker)
+            exiting = {event["licensePlate"] for _, event, _ in valid if event["status"] == "exit"}
+            not_parked = [plate for plate in exiting if plate in state and state[plate][1] is None]
+            if not_parked:
+                for plate, entry in active_sessions.refresh_many(not_parked).items():
+                    state[plate] = [entry.vehicle_id, entry.session_id]
+
+            # Unknown plates that enter get their vehicle row up front, in one INSERT
+            new_plates = list(dict.fromkeys(
+                event["licensePlate"] for _, event, _ in valid
+                if event["status"] == "enter" and event["licensePlate"] not in state
+            ))
+            new_vehicles = {}
+            if new_plates:
+                rows = sqldb.session.execute(
+                    insert(VehicleDB).returning(VehicleDB.id, VehicleDB.plate_number),
+                    [{"plate_number": plate} for plate in new_plates]
+                ).all()
+                new_vehicles = {plate: vehicle_id for vehicle_id, plate in rows}
+
+            new_sessions = []
+            session_results = []
+            transactions = []
+            # plate -> [last enter, last exit/conflict after it], ordered by the plate's last event
+            firebase = {}
+            for result, event, when in valid:
+                plate = event["licensePlate"]
+                action = event["status"]
+                if action == "enter":
+                    if plate not in state:
+                        state[plate] = [new_vehicles[plate], None]
+                    session = {
+                        "vehicle_id": state[plate][0],
+                        "checkin_time": when,
+                        "checkout_time": None,
+                        "rfid_code": event.get("rfid"),
+                        "image_src": event.get("imageSrc")
+                    }
+                    new_sessions.append(session)
+                    session_results.append((result, session))
+                    state[plate][1] = session
+                    vehicle_data = {
+                        "licensePlate": plate,
+                        "entryTime": VIETNAM_TZ.localize(when).isoformat(),
+                        "exitTime": None,
+                        "imageSrc": event.get("imageSrc"),
+                        "rfid": event.get("rfid")
+                    }
+                    firebase.pop(plate, None)
+                    firebase[plate] = [("enter", vehicle_data), None]
+
+                elif action == "exit":
+                    if plate not in state:
+                        result.update(ok=False, error="Vehicle not found")
+                        continue
+                    open_session = state[plate][1]
+                    closed = None
+                    if isinstance(open_session, dict):
+                        open_session["checkout_time"] = when
+                        closed = ClosedSession(open_session["checkin_time"], open_session["image_src"], open_session["rfid_code"])
+                        session_results.append((result, open_session))
+                    elif open_session is not None:
+                        closed = close_parking_session(sqldb, open_session, when)
+                        if closed is None:
+                            # Index was stale (session closed elsewhere): read the plate again from SQLite
+                            active_sessions.invalidate(plate)
+                            entry = active_sessions.lookup(plate)
+                            open_session = entry.session_id if entry else None
+                            closed = close_parking_session(sqldb, open_session, when) if open_session is not None else None
+                        if closed is not None:
+                            result["session_id"] = open_session
+
+                    if closed is not None:
+                        transactions.append((open_session, closed.checkin_time, result,
+                                             {"payment_method": "cash", "paid_at": when}))
+                    state[plate][1] = None
+                    if closed is not None:
+                        last = firebase.pop(plate, [None, None])
+                        last[1] = ("exit", exit_vehicle_data(plate, VIETNAM_TZ.localize(when), closed))
+                        firebase[plate] = last
+
+                else:
+                    last = firebase.pop(plate, [None, None])
+                    last[1] = ("conflict", {
+                        "licensePlate": plate,
+                        "entryTime": VIETNAM_TZ.localize(when).isoformat(),
+                        "exitTime": None,
+                        "imageSrc": event.get("imageSrc"),
+                        "rfid": event.get("rfid")
+                    })
+                    firebase[plate] = last
+                result["ok"] = True
+
+            if new_sessions:
+                session_ids = sqldb.session.execute(
+                    insert(ParkingSession).returning(ParkingSession.id, sort_by_parameter_order=True),
+                    new_sessions
+                ).scalars().all()
+                for session, session_id in zip(new_sessions, session_ids):
+                    session["id"] = session_id
+                for result, session in session_results:
+                    result["session_id"] = session["id"]
+
+            if transactions:
+                # Fees of the whole batch in one vectorized pass
+                fees = current_tariff(db).fees(
+                    [wall_clock_seconds(checkin_time) for _, checkin_time, _, _ in transactions],
+                    [wall_clock_seconds(transaction["paid_at"]) for _, _, _, transaction in transactions]
+                )
+                rows = []
+                for (session, _, result, transaction), fee in zip(transactions, fees.tolist()):
+                    result["fee"] = fee
+                    rows.append(dict(transaction, amount=fee,
+                                     session_id=session["id"] if isinstance(session, dict) else session))
+                sqldb.session.execute(insert(Transaction), rows)
+                add_many_to_revenue_rollup(rows)
+
+            # Firebase only gets the final state of each plate, queued with the SQLite changes
+            writer = get_firebase_writer(db)
+            for plate, final_events in firebase.items():
+                for item in final_events:
+                    if item is not None:
+                        writer.enqueue(sqldb.session, plate, item[0], item[1])
+            sqldb.session.commit()
+        except Exception as e:
+            logger.error("Error in batch of %d events: %s", len(events), e)
+            sqldb.session.rollback()
+            raise
+
+        for plate, (vehicle_id, open_session) in state.items():
+            if isinstance(open_session, dict):
+                active_sessions.open_session(plate, vehicle_id, open_session["id"], open_session["checkin_time"])
+            elif open_session is None:
+                active_sessions.close_session(plate)
+        response_cache.invalidate()
+
+        for result, event, _ in valid:
+            if result.get("ok"):
+                journal.record(event["status"], event["licensePlate"], session_id=result.get("session_id"),
+                               fee=result.get("fee"), batch=True)
+        logger.info("Applied %d/%d batched events", sum(1 for result in results if result.get('ok')), len(events))
+        return results
+
+    @staticmethod
+    def handle_vehicle_exit(db,license_plate,vehicle_data=None):
+        """
+        Publish an exit. `vehicle_data` is the stored vehicle with its exitTime; when it is not
+        given it is read back from Firebase.
+        """
         try:
-            vehicle_data = db.child("vehicles").child(license_plate).get().val()
-            time_exit = get_vietnam_time().isoformat()
-            db.child("vehicles").child(license_plate).update({"exitTime": time_exit})
-            vehicle_data["exitTime"] = time_exit
-            set_vehicle_last_action(db,vehicle_data,"exit")
+            if vehicle_data is None:
+                vehicle_data = db.child("vehicles").child(sanitize_license_plate(license_plate)).get().val()
+                vehicle_data["exitTime"] = get_vietnam_time().isoformat()
+            # Only touch the vehicle node when the exit matches a stored entry
+            FirebaseEventPublisher(db).exit(vehicle_data, update_vehicle="entryTime" in vehicle_data)
             return True
         except Exception as e:
-            print(f"Vehicle exit error: {e}")
+            logger.error("Vehicle exit error: %s", e)
             return False
 
     @staticmethod   
     def handle_vehicle_enter(db,vehicle_data):
-        print("vehicle_data: ",vehicle_data)
+        logger.debug("vehicle_data: %s", vehicle_data)
         try:
-            db.child("vehicles").child(vehicle_data["licensePlate"]).set(vehicle_data)
-            set_vehicle_last_action(db,vehicle_data,"enter")
+            FirebaseEventPublisher(db).enter(vehicle_data)
             return True
         except Exception as e:
-            print(f"Vehicle enter error: {e}")
+            logger.error("Vehicle enter error: %s", e)
             return False
 
     @staticmethod
     def handle_vehicle_conflict(db,vehicle_data):
         try:
-            set_vehicle_last_action(db,vehicle_data,"conflict")
+            FirebaseEventPublisher(db).conflict(vehicle_data)
             return True
         except Exception as e:
-            print(f"Vehicle conflict error: {e}")
+            logger.error("Vehicle conflict error: %s", e)
             return False
 
     @staticmethod
     def handle_vehicle(db, vehicle_data, action):
         try:
             sqldb = current_app.config['SQLDB']            
-            # Log current state before changes
-            log_sqlite_data(vehicle_data, action)
+            if vehicle_data.get("licensePlate"):
+                vehicle_data["licensePlate"] = canonical_plate(vehicle_data["licensePlate"])
             
             if action == "enter":
                 try:
-                    # SQLite operations
-                    vehicle = VehicleDB.query.filter_by(plate_number=vehicle_data["licensePlate"]).first()
-                    if not vehicle:
-                        vehicle = VehicleDB(plate_number=vehicle_data["licensePlate"])
+                    # SQLite operations, vehicle resolved from the in-memory index
+                    license_plate = vehicle_data["licensePlate"]
+                    entry = active_sessions.lookup(license_plate)
+                    new_vehicle = entry is None
+                    if new_vehicle:
+                        vehicle = VehicleDB(plate_number=license_plate)
                         sqldb.session.add(vehicle)
-                        sqldb.session.commit()
+                        sqldb.session.flush()
+                        vehicle_id = vehicle.id
+                    else:
+                        vehicle_id = entry.vehicle_id
 
+                    checkin_time = get_vietnam_time()
                     session = ParkingSession(
-                        vehicle_id=vehicle.id,
-                        checkin_time=get_vietnam_time(),
+                        vehicle_id=vehicle_id,
+                        checkin_time=checkin_time,
                         rfid_code=vehicle_data.get("rfid"),
                         image_src=vehicle_data["imageSrc"]
                     )
                     sqldb.session.add(session)
+                    sqldb.session.flush()
+                    session_id = session.id
+
+                    # Firebase update is queued with the SQLite changes and pushed after commit
+                    get_firebase_writer(db).enqueue(sqldb.session, license_plate, "enter", vehicle_data)
                     sqldb.session.commit()
+                    active_sessions.open_session(license_plate, vehicle_id, session_id, checkin_time)
+                    response_cache.invalidate()
 
-                    VehicleService.handle_vehicle_enter(db,vehicle_data)        
-                    log_sqlite_data(vehicle_data, action)
+                    journal.record(action, license_plate, vehicle_id=vehicle_id, session_id=session_id, new_vehicle=new_vehicle)
                     return True
                     
                 except Exception as e:
-                    logger.error(f"Error in enter operation: {str(e)}")
+                    logger.error("Error in enter operation: %s", e)
                     sqldb.session.rollback()
                     return False
 
             elif action == "exit":
                 try:
-                    # SQLite operations
-                    vehicle = VehicleDB.query.filter_by(plate_number=vehicle_data["licensePlate"]).first()
-                    if not vehicle:
-                        logger.warning(f"Vehicle {vehicle_data['licensePlate']} not found in database")
+                    # SQLite operations, active session resolved from the in-memory index
+                    license_plate = vehicle_data["licensePlate"]
+                    scanned_plate = license_plate
+                    entry = active_sessions.lookup(license_plate)
+                    if entry is not None and entry.session_id is None:
+                        # "Not parked" in the index: check SQLite, the session may have been opened by another worker
+                        entry = active_sessions.refresh(license_plate)
+                    if entry is None:
+                        # Unknown plate, likely an OCR misread (0/O, 8/B, 1/I...): take the open session
+                        # of a near-identical plate. A known vehicle that is not parked is never matched
+                        match = active_sessions.resolve(license_plate, EXIT_MATCH_MAX_DISTANCE)
+                        if match is not None:
+                            logger.warning("Exit plate %s matched open session of %s (distance %s)", scanned_plate, match.plate, match.distance)
+                            license_plate, entry = match.plate, match.entry
+                    if entry is None:
+                        logger.warning("Vehicle %s not found in database", license_plate)
                         return False
 
-                    active_session = ParkingSession.query.filter_by(
-                        vehicle_id=vehicle.id,
-                        checkout_time=None
-                    ).first()
-
-                    if active_session:
-                        active_session.checkout_time = get_vietnam_time()
-                        
-                        # Get price from Firebase
-                        price_data = db.child("price").get()
-                        fee = 1.0  # Default fee
-                        if price_data.val() is not None:
-                            fee = float(price_data.val())
-                            
-                        active_session.fee = fee
+                    checkout_time = get_vietnam_time()
+                    session_id = entry.session_id
+                    closed = close_parking_session(sqldb, session_id, checkout_time) if session_id is not None else None
+                    if session_id is not None and closed is None:
+                        # Index was stale (session closed elsewhere): read the plate again from SQLite
+                        active_sessions.invalidate(license_plate)
+                        entry = active_sessions.lookup(license_plate)
+                        session_id = entry.session_id if entry else None
+                        closed = close_parking_session(sqldb, session_id, checkout_time) if session_id is not None else None
+
+                    fee = None
+                    if closed is not None:
+                        # Tariff of the stay, the flat price is read from memory (kept current from Firebase)
+                        fee = current_tariff(db).fee(closed.checkin_time, checkout_time)
 
                         transaction = Transaction(
-                            session_id=active_session.id,
+                            session_id=session_id,
                             amount=fee,
                             payment_method='cash',
                             paid_at=get_vietnam_time()
                         )
                         sqldb.session.add(transaction)
-                        sqldb.session.commit()
-                        logger.info(f"Created transaction for vehicle {vehicle_data['licensePlate']} with fee ${fee}")
+                        add_to_revenue_rollup(transaction)
+                        logger.info("Created transaction for vehicle %s with fee $%s", license_plate, fee)
+
+                    # Firebase update is queued with the SQLite changes and pushed after commit.
+                    # A vehicle that was not parked has nothing to publish
+                    if closed is not None:
+                        exit_data = exit_vehicle_data(license_plate, checkout_time, closed)
+                        get_firebase_writer(db).enqueue(sqldb.session, license_plate, "exit", exit_data)
+                    sqldb.session.commit()
+                    if closed is not None:
+                        active_sessions.close_session(license_plate)
+                        response_cache.invalidate()
 
-                    VehicleService.handle_vehicle_exit(db,vehicle_data["licensePlate"])
-                    log_sqlite_data(vehicle_data, action)
+                    journal.record(action, license_plate, session_id=session_id if closed is not None else None, fee=fee,
+                                   scanned=scanned_plate if scanned_plate != license_plate else None)
                     return True
                     
                 except Exception as e:
-                    logger.error(f"Error in exit operation: {str(e)}")
+                    logger.error("Error in exit operation: %s", e)
                     sqldb.session.rollback()
                     return False
 
             elif action == "conflict":
                 try:
-                    VehicleService.handle_vehicle_conflict(db, vehicle_data)
-                    logger.warning(f"Vehicle conflict detected for {vehicle_data['licensePlate']}")
+                    get_firebase_writer(db).enqueue(sqldb.session, vehicle_data["licensePlate"], "conflict", vehicle_data)
+                    sqldb.session.commit()
+                    journal.record(action, vehicle_data["licensePlate"])
+                    logger.warning("Vehicle conflict detected for %s", vehicle_data['licensePlate'])
                     return True
                 except Exception as e:
-                    logger.error(f"Error in conflict operation: {str(e)}")
+                    logger.error("Error in conflict operation: %s", e)
+                    sqldb.session.rollback()
                     return False
 
             return False
         except Exception as e:
-            logger.error(f"Error processing vehicle {vehicle_data['licensePlate']}: {str(e)}")
+            logger.error("Error processing vehicle %s: %s", vehicle_data['licensePlate'], e)
             sqldb.session.rollback()
             return False
 
@@ -347,66 +652,88 @@ class VehicleService:
         """
         Synchronize vehicles from SQLite to Firebase.
         Only sync vehicles that are currently parked and have sessions from today.
-        Clears existing Firebase data before syncing.
+        The desired `vehicles` node is built from one joined query and compared with the
+        current Firebase snapshot; only changed and removed plates are sent, in one update.
         Returns a dictionary with sync results.
         """
+        started = time.perf_counter()
+        sync_results = {
+            'synced_vehicles': 0,
+            'unchanged_vehicles': 0,
+            'removed_vehicles': 0,
+            'active_vehicles': 0,
+            'duration_ms': 0,
+            'errors': []
+        }
         try:
             sqldb = current_app.config['SQLDB']
-            sync_results = {
-                'synced_vehicles': 0,
-                'errors': []
-            }
-
-            # Clear existing Firebase data
-            try:
-                db.child("vehicles").remove()
-                logger.info("Cleared existing Firebase vehicles data")
-            except Exception as e:
-                logger.error(f"Error clearing Firebase data: {str(e)}")
-                sync_results['errors'].append(f"Error clearing Firebase data: {str(e)}")
-                return sync_results
 
             # Get today's date in Vietnam timezone
             today = get_vietnam_time().date()
 
-            # Get all active sessions from today
-            active_sessions = ParkingSession.query.filter(
+            # All active sessions from today with their plate, in one query
+            active_sessions = sqldb.session.query(
+                VehicleDB.plate_number,
+                ParkingSession.checkin_time,
+                ParkingSession.image_src,
+                ParkingSession.rfid_code
+            ).join(VehicleDB, ParkingSession.vehicle_id == VehicleDB.id).filter(
                 ParkingSession.checkin_time >= today,
                 ParkingSession.checkout_time.is_(None)  # Only sessions that haven't checked out
             ).all()
 
-            # Sync each vehicle to Firebase
-            for session in active_sessions:
+            desired = {}
+            for plate_number, checkin_time, image_src, rfid_code in active_sessions:
+                # Sanitize plate for Firebase path
+                desired[sanitize_license_plate(plate_number)] = {
+                    'licensePlate': plate_number,
+                    # Same format as the gate: SQLite stores the Vietnam wall-clock time
+                    'entryTime': VIETNAM_TZ.localize(checkin_time.replace(tzinfo=None)).isoformat(),
+                    'imageSrc': image_src,
+                    'rfid': rfid_code
+                }
+            sync_results['active_vehicles'] = len(desired)
+
+            # Current Firebase snapshot
+            try:
+                remote = db.child("vehicles").get().val() or {}
+            except Exception as e:
+                error_msg = f"Error reading Firebase vehicles data: {str(e)}"
+                logger.error(error_msg)
+                sync_results['errors'].append(error_msg)
+                sync_results['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                return sync_results
+            if not isinstance(remote, dict):
+                # Firebase returns a list for integer-like keys
+                remote = {str(i): value for i, value in enumerate(remote) if value is not None}
+
+            updates = {}
+            for plate, vehicle_data in desired.items():
+                if normalize_firebase_vehicle(remote.get(plate)) == normalize_firebase_vehicle(vehicle_data):
+                    sync_results['unchanged_vehicles'] += 1
+                else:
+                    updates[plate] = vehicle_data
+            removed = [plate for plate in remote if plate not in desired]
+            for plate in removed:
+                updates[plate] = None  # null removes the plate in a multi-location update
+
+            if updates:
                 try:
-                    vehicle = session.vehicle
-                    # Sanitize plate for Firebase path
-                    sanitized_plate = sanitize_license_plate(vehicle.plate_number)
-                    
-                    # Prepare vehicle data for Firebase
-                    vehicle_data = {
-                        'licensePlate': vehicle.plate_number,
-                        'entryTime': session.checkin_time.astimezone(VIETNAM_TZ).isoformat(),
-                        'imageSrc': session.image_src,
-                        'rfid': session.rfid_code
-                    }
-
-                    # Add to Firebase
-                    db.child("vehicles").child(sanitized_plate).set(vehicle_data)
-                    sync_results['synced_vehicles'] += 1
-                    logger.info(f"Synced vehicle {vehicle.plate_number} to Firebase")
+                    db.child("vehicles").update(updates)
+                    sync_results['synced_vehicles'] = len(updates) - len(removed)
+                    sync_results['removed_vehicles'] = len(removed)
                 except Exception as e:
-                    error_msg = f"Error syncing vehicle {vehicle.plate_number} to Firebase: {str(e)}"
+                    error_msg = f"Error updating Firebase vehicles data: {str(e)}"
                     logger.error(error_msg)
                     sync_results['errors'].append(error_msg)
 
-            logger.info(f"Sync completed: {sync_results}")
+            sync_results['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            logger.info("Sync completed: %s", sync_results)
             return sync_results
 
         except Exception as e:
             error_msg = f"Error during sync: {str(e)}"
             logger.error(error_msg)
-            return {
-                'synced_vehicles': 0,
-                'errors': [error_msg]
-            }
-     
+            sync_results['errors'].append(error_msg)
+            sync_results['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            return sync_results
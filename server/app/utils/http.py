@@ -0,0 +1,39 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) seconds: a camera that stops answering must not hold a worker
+DEFAULT_TIMEOUT = (3.05, 10)
+POOL_SIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+
+def build_http_session(pool_size=POOL_SIZE, retries=3, backoff_factor=0.3):
+    """
+    requests.Session with a connection pool per host and retries on connection errors
+    and 429/5xx answers, so consecutive downloads reuse the same TCP/TLS connection.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD'])
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_http_session():
+    """Process-wide session shared by every image download (requests.Session is safe for concurrent GETs)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_http_session()
+    return _session
@@ -0,0 +1,65 @@
+import os
+import hashlib
+import tempfile
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif'}
+
+class ImageStore:
+    """
+    Content-addressed store for gate snapshots.
+    An image is saved as <root>/<h[0:2]>/<h[2:4]>/<h>.<ext> where h is the SHA-256 of its bytes,
+    so identical frames are stored once and no directory grows past a few hundred entries.
+    Bytes are streamed to a temporary file while hashing, never fully held in memory.
+    """
+    def __init__(self, root, url_prefix='/images'):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+
+    @staticmethod
+    def extension(filename):
+        ext = os.path.splitext(secure_filename(filename or ''))[1].lower()
+        return ext if ext in IMAGE_EXTENSIONS else '.jpg'
+
+    @staticmethod
+    def relative_path(digest, ext):
+        return os.path.join(digest[:2], digest[2:4], digest + ext)
+
+    def save(self, stream, filename=None):
+        """Store the bytes read from `stream` and return their URL path (e.g. /images/ab/cd/abcd...jpg)."""
+        ext = self.extension(filename)
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            relative_path = self.relative_path(digest.hexdigest(), ext)
+            final_path = os.path.join(self.root, relative_path)
+            if os.path.exists(final_path):
+                # Same bytes already stored
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return f"{self.url_prefix}/{relative_path.replace(os.sep, '/')}"
+
+    def resolve(self, url_path):
+        """Filesystem path of a stored URL path, or None if it points outside the store."""
+        if not url_path.startswith(self.url_prefix + '/'):
+            return None
+        relative_path = url_path[len(self.url_prefix) + 1:]
+        full_path = os.path.realpath(os.path.join(self.root, relative_path))
+        if not full_path.startswith(os.path.realpath(self.root) + os.sep):
+            return None
+        return full_path
@@ -1,15 +1,101 @@
-import os
+import base64
+from datetime import datetime
 from flask import current_app
-import random
-import string
-def generate_random_number(length=6):
-    return ''.join(random.choices('0123456789', k=length))
+from sqlalchemy import tuple_
+from .image_store import ImageStore
+from .thumbnails import ThumbnailCache
+from ..service.metrics import metrics
+
+def get_image_store():
+    return ImageStore(current_app.config['IMAGE_FOLDER'])
+
+def get_thumbnail_cache():
+    """One cache per app, so its size accounting is shared by all requests."""
+    cache = current_app.extensions.get('thumbnail_cache')
+    if cache is None:
+        cache = ThumbnailCache(
+            current_app.config.get('THUMBNAIL_FOLDER', 'app/static/thumbnails'),
+            current_app.config.get('THUMBNAIL_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        )
+        current_app.extensions['thumbnail_cache'] = cache
+    return cache
+
 def store_image(file,license_plate):
-    file_name = file.filename
-    random_number = generate_random_number()
-    new_file_name = random_number + file_name
-    save_path = os.path.join("app/static/images/",new_file_name)
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    file.save(save_path)
-    return "/images/"+new_file_name
\ No newline at end of file
+    """Save an uploaded image in the content-addressed store and return its path under /static."""
+    with metrics.timed('image'):
+        return get_image_store().save(file.stream, file.filename)
+
+def parse_pagination(args, default_per_page=50, max_per_page=500):
+    """
+    Read `page`/`per_page` from the query string.
+    Returns None when the client did not ask for pagination, so endpoints keep returning the full list.
+    """
+    if 'page' not in args and 'per_page' not in args:
+        return None
+    try:
+        page = int(args.get('page', 1))
+        per_page = int(args.get('per_page', default_per_page))
+    except ValueError:
+        raise ValueError("page and per_page must be integers")
+    if page < 1 or per_page < 1:
+        raise ValueError("page and per_page must be positive")
+    return page, min(per_page, max_per_page)
+
+def parse_keyset(args, default_limit=100, max_limit=1000):
+    """
+    Read `limit`/`cursor` from the query string.
+    Returns None when the client asked for neither, so endpoints keep returning the full list,
+    otherwise (limit, cursor) where cursor is None for the first page.
+    """
+    if 'limit' not in args and 'cursor' not in args:
+        return None
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    cursor = args.get('cursor')
+    return min(limit, max_limit), decode_cursor(cursor) if cursor else None
+
+def encode_cursor(time_value, row_id):
+    """Opaque cursor for the position (time_value, row_id) of a keyset page."""
+    raw = f"{time_value.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        time_value, row_id = raw.split('|')
+        return datetime.fromisoformat(time_value), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def keyset_page(query, time_column, id_column, limit, cursor=None):
+    """
+    Fetch one page of `query` ordered by (time_column, id_column) descending.
+    The cursor is the last row of the previous page, so deep pages cost the same as the first one
+    (an index range scan instead of skipping OFFSET rows).
+    Rows must expose the two columns under their attribute names (ORM entities or labeled columns).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor is not None:
+        query = query.filter(tuple_(time_column, id_column) < tuple_(*cursor))
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+
+def format_time_since(time_diff):
+    """Format a timedelta as '3 days ago', '1 hour ago', 'Just now'..."""
+    if time_diff.days > 0:
+        return "1 day ago" if time_diff.days == 1 else f"{time_diff.days} days ago"
+    if time_diff.seconds >= 3600:
+        hours = time_diff.seconds // 3600
+        return "1 hour ago" if hours == 1 else f"{hours} hours ago"
+    if time_diff.seconds >= 60:
+        minutes = time_diff.seconds // 60
+        return "1 minute ago" if minutes == 1 else f"{minutes} minutes ago"
+    return "Just now"
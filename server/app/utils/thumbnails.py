@@ -0,0 +1,127 @@
+import os
+import re
+import threading
+import tempfile
+from collections import OrderedDict
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional: without it originals are served
+    Image = None
+
+# Requested widths are snapped to these so each image has a handful of variants at most
+VARIANT_WIDTHS = (80, 160, 320, 640, 1280)
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{64}$')
+
+class UnsupportedImage(ValueError):
+    """The stored source cannot be decoded as an image, so it has no resized variants."""
+
+def snap_width(width):
+    for variant_width in VARIANT_WIDTHS:
+        if width <= variant_width:
+            return variant_width
+    return VARIANT_WIDTHS[-1]
+
+def source_version(source_path):
+    """Identity of the source bytes: the content hash when the file name is one, else size and mtime."""
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    if CONTENT_ADDRESSED.match(name):
+        return name, True
+    stat = os.stat(source_path)
+    return f"{stat.st_size:x}-{int(stat.st_mtime):x}", False
+
+class ThumbnailCache:
+    """
+    Resized JPEG variants of stored images, generated on first request.
+    Variants live in `root` and the cache is trimmed to `max_bytes`, evicting the least
+    recently used files first. Recency is kept in memory (the directory is scanned once, in
+    mtime order, hits also refresh the file mtime for the next start), and eviction goes down
+    to `low_water` of the budget so it does not run again on every new variant.
+    """
+    def __init__(self, root, max_bytes=256 * 1024 * 1024, quality=80, low_water=0.9):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.low_water = low_water
+        self._lock = threading.Lock()
+        self._entries = None  # path -> size, least recently used first
+        self._size = 0
+
+    @staticmethod
+    def available():
+        return Image is not None
+
+    def _scan(self):
+        """Load the variants on disk, oldest mtime first. Caller holds the lock."""
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        self._entries = OrderedDict((path, size) for _, size, path in entries)
+        self._size = sum(self._entries.values())
+
+    def _evict(self):
+        """Remove least recently used variants down to the low-water mark. Caller holds the lock."""
+        if self._size <= self.max_bytes:
+            return
+        target = self.max_bytes * self.low_water
+        while self._entries and self._size > target:
+            path, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def variant(self, source_path, width):
+        """
+        Return (variant path, etag) of `source_path` resized to `width`, creating it if needed.
+        Raises UnsupportedImage when the source cannot be decoded.
+        """
+        version, _ = source_version(source_path)
+        name = f"{version}_w{width}.jpg"
+        path = os.path.join(self.root, version[:2], name)
+        etag = f"{version}-w{width}"
+
+        if os.path.exists(path):
+            # Refresh recency for the LRU
+            os.utime(path, None)
+            with self._lock:
+                if self._entries is not None and path in self._entries:
+                    self._entries.move_to_end(path)
+            return path, etag
+
+        # Decode before creating any file: a source that is not an image leaves nothing behind
+        try:
+            with Image.open(source_path) as image:
+                image.thumbnail((width, width * 4))
+                thumbnail = image.convert('RGB')
+        except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+            raise UnsupportedImage(f"Cannot decode {os.path.basename(source_path)}: {e}") from e
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                thumbnail.save(out, 'JPEG', quality=self.quality, optimize=True)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._entries is None:
+                self._scan()
+            else:
+                size = os.path.getsize(path)
+                self._size += size - self._entries.pop(path, 0)
+                self._entries[path] = size
+            self._evict()
+        return path, etag
@@ -0,0 +1,66 @@
+"""
+Download camera snapshots from a local HTTP server, one by one and with VehicleService.store_images.
+
+    cd server
+    python -m benchmarks.bench_image_download --images 200 --latency 0.02
+"""
+import os
+import time
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from app.service.vehicle import VehicleService
+from app.utils.image_store import ImageStore
+from .common import timer, report
+
+def serve_images(image_size, latency):
+    """Start a threaded HTTP server answering /<name>.jpg with `image_size` bytes after `latency` seconds."""
+    body = os.urandom(image_size)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--size', type=int, default=200 * 1024, help="Bytes per image")
+    parser.add_argument('--latency', type=float, default=0.02, help="Server delay per image in seconds")
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    server = serve_images(args.size, args.latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    rows = []
+    try:
+        for name, workers in [('sequential', 1), (f'{args.workers} workers', args.workers)]:
+            folder = tempfile.mkdtemp()
+            urls = [f"{base_url}/cam_{i}.jpg" for i in range(args.images)]
+            timings = {}
+            with timer(timings, name):
+                stored = VehicleService.store_images(urls, folder, max_workers=workers)
+            assert all(stored), "some downloads failed"
+            assert all(os.path.getsize(ImageStore(folder).resolve(f)) == args.size for f in stored)
+            rows.append((name, args.images, f"{timings[name] * 1000:.0f}", f"{args.images / timings[name]:.0f}"))
+    finally:
+        server.shutdown()
+
+    report(rows, ['mode', 'images', 'ms', 'images/s'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare keyset pages of /parking-sessions and /transactions at increasing depth with OFFSET pages.
+
+    cd server
+    python -m benchmarks.bench_keyset_pagination --sessions 1000000 --vehicles 50000
+"""
+import argparse
+from create_data import create_bulk_data
+from app.models import db, ParkingSession, Transaction
+from app.utils.index import encode_cursor, decode_cursor, keyset_page
+from .common import make_app, timer, report
+
+DEPTHS = [0, 1000, 10000, 100000]
+
+def cursor_at(column, id_column, depth):
+    """Cursor of the row just before `depth` in (time, id) descending order."""
+    row = db.session.query(column, id_column)\
+        .order_by(column.desc(), id_column.desc())\
+        .offset(depth - 1).limit(1).first()
+    return encode_cursor(*row) if row else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=1000000)
+    parser.add_argument('--vehicles', type=int, default=50000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--db', default=None, help="Reuse an already seeded SQLite file")
+    args = parser.parse_args()
+
+    app = make_app(args.db)
+    with app.app_context():
+        if not db.session.query(ParkingSession.id).first():
+            print(f"Seeding {args.sessions} sessions for {args.vehicles} vehicles...")
+            create_bulk_data(args.sessions, num_vehicles=args.vehicles, seed=42)
+
+    client = app.test_client()
+    endpoints = [
+        ('/parking-sessions', ParkingSession.checkin_time, ParkingSession.id, ParkingSession),
+        ('/transactions', Transaction.paid_at, Transaction.id, Transaction),
+    ]
+    rows = []
+    for url, column, id_column, model in endpoints:
+        for depth in DEPTHS:
+            with app.app_context():
+                if depth and depth >= db.session.query(model).count():
+                    continue
+                cursor = cursor_at(column, id_column, depth) if depth else None
+                timings = {}
+                with timer(timings, 'keyset'):
+                    keyset_page(db.session.query(model), column, id_column, args.limit,
+                                decode_cursor(cursor) if cursor else None)
+                # Same page read with OFFSET, the cost keyset pagination avoids
+                with timer(timings, 'offset'):
+                    db.session.query(model).order_by(column.desc(), id_column.desc())\
+                        .offset(depth).limit(args.limit).all()
+
+            query = f"{url}?limit={args.limit}" + (f"&cursor={cursor}" if cursor else '')
+            with timer(timings, 'endpoint'):
+                response = client.get(query)
+            assert response.status_code == 200, response.get_json()
+            assert len(response.get_json()['items']) == args.limit
+            rows.append((url, depth, f"{timings['keyset'] * 1000:.1f}", f"{timings['offset'] * 1000:.1f}",
+                         f"{timings['endpoint'] * 1000:.1f}"))
+
+    report(rows, ['endpoint', 'depth', 'keyset query ms', 'offset query ms', 'endpoint ms'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Rows/sec of /parking-sessions and /transactions: lazy-loading ORM serialization (the previous
+implementation, reproduced below) against the column projections the endpoints now use.
+
+    cd server
+    python -m benchmarks.bench_list_endpoints --sessions 500000 --vehicles 20000
+"""
+import argparse
+from flask import jsonify
+from create_data import create_bulk_data
+from app.models import db, ParkingSession, Transaction, VehicleDB
+from .common import make_app, QueryCounter, timer, report
+
+def orm_sessions():
+    sessions = ParkingSession.query.join(VehicleDB).order_by(ParkingSession.checkin_time.desc()).all()
+    return jsonify([{
+        'id': s.id,
+        'vehicle_id': s.vehicle_id,
+        'plate_number': s.vehicle.plate_number,
+        'checkin_time': s.checkin_time.isoformat(),
+        'checkout_time': s.checkout_time.isoformat() if s.checkout_time else None,
+        'duration_hours': ((s.checkout_time - s.checkin_time).total_seconds() / 3600) if s.checkout_time else None,
+        'rfid_code': s.rfid_code,
+        'image_src': s.image_src
+    } for s in sessions])
+
+def orm_transactions():
+    transactions = Transaction.query.join(ParkingSession).join(VehicleDB).order_by(Transaction.paid_at.desc()).all()
+    return jsonify([{
+        'id': t.id,
+        'session_id': t.session_id,
+        'plate_number': t.parking_session.vehicle.plate_number,
+        'amount': float(t.amount),
+        'payment_method': t.payment_method,
+        'paid_at': t.paid_at.isoformat()
+    } for t in transactions])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=500000)
+    parser.add_argument('--vehicles', type=int, default=20000)
+    parser.add_argument('--db', default=None, help="Reuse an already seeded SQLite file")
+    args = parser.parse_args()
+
+    app = make_app(args.db)
+    with app.app_context():
+        if not db.session.query(ParkingSession.id).first():
+            print(f"Seeding {args.sessions} sessions for {args.vehicles} vehicles...")
+            create_bulk_data(args.sessions, num_vehicles=args.vehicles, seed=42)
+        engine = db.engine
+
+    client = app.test_client()
+    rows = []
+    for url, legacy in [('/parking-sessions', orm_sessions), ('/transactions', orm_transactions)]:
+        timings = {}
+        with app.test_request_context(url):
+            with QueryCounter(engine) as before, timer(timings, 'orm'):
+                count = len(legacy().get_json())
+            db.session.remove()
+
+        with QueryCounter(engine) as after, timer(timings, 'projection'):
+            response = client.get(url)
+        assert response.status_code == 200, response.get_json()
+        assert len(response.get_json()) == count
+
+        for name, queries in [('orm', before), ('projection', after)]:
+            rows.append((url, name, count, queries.count, f"{timings[name]:.2f}", f"{count / timings[name]:,.0f}"))
+
+    report(rows, ['endpoint', 'variant', 'rows', 'queries', 's', 'rows/s'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Compare the per-bucket COUNT implementation of /api/stats/parking with the grouped one,
+and time the occupancy sweep of /api/stats/occupancy.
+
+    cd server
+    python -m benchmarks.bench_parking_stats --sessions 1000000
+"""
+import argparse
+from datetime import datetime, timedelta
+from create_data import create_bulk_data
+from app.models import db, ParkingSession
+from app.service.stats import StatsService, WEEK_DAYS
+from .common import make_app, QueryCounter, timer, report
+
+def legacy_parking_stats(start_date, end_date, time_range):
+    """The original implementation: two COUNT queries per bucket."""
+    query = ParkingSession.query.filter(ParkingSession.checkin_time >= start_date)
+    if end_date:
+        query = query.filter(ParkingSession.checkin_time < end_date)
+
+    if time_range == 'day':
+        buckets = [(f"{h:02d}:00", start_date.replace(hour=h), timedelta(hours=1)) for h in range(24)]
+    elif time_range == 'week':
+        buckets = [(d, start_date + timedelta(days=i), timedelta(days=1)) for i, d in enumerate(WEEK_DAYS)]
+    else:
+        buckets = [(f"{d + 1}", start_date + timedelta(days=d), timedelta(days=1))
+                   for d in range((end_date - start_date).days)]
+
+    result = []
+    for label, bucket_start, width in buckets:
+        bucket_end = bucket_start + width
+        entries = query.filter(ParkingSession.checkin_time >= bucket_start,
+                               ParkingSession.checkin_time < bucket_end).count()
+        exits = query.filter(ParkingSession.checkout_time >= bucket_start,
+                             ParkingSession.checkout_time < bucket_end).count()
+        result.append({'hour': label, 'entries': entries, 'exits': exits})
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=1000000)
+    parser.add_argument('--db', default=None, help="Reuse an already seeded SQLite file")
+    args = parser.parse_args()
+
+    app = make_app(args.db)
+    with app.app_context():
+        if not db.session.query(ParkingSession.id).first():
+            print(f"Seeding {args.sessions} sessions...")
+            create_bulk_data(args.sessions, seed=42)
+
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        month_start = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+        cases = [
+            ('day', today - timedelta(days=1), today),
+            ('week', today - timedelta(days=7), today),
+            ('month', month_start, today.replace(day=1)),
+        ]
+
+        rows = []
+        for time_range, start_date, end_date in cases:
+            timings = {}
+            with QueryCounter(db.engine) as legacy_queries, timer(timings, 'legacy'):
+                legacy = legacy_parking_stats(start_date, end_date, time_range)
+            with QueryCounter(db.engine) as grouped_queries, timer(timings, 'grouped'):
+                grouped = StatsService.parking_stats(start_date, end_date, time_range)
+            assert legacy == grouped, f"Result mismatch for time_range={time_range}"
+            rows.append((time_range, legacy_queries.count, f"{timings['legacy'] * 1000:.1f}",
+                         grouped_queries.count, f"{timings['grouped'] * 1000:.1f}",
+                         f"{timings['legacy'] / timings['grouped']:.1f}x"))
+
+        occupancy_rows = []
+        for name, start_date, end_date, resolution in [
+            ('day / 1 min', today - timedelta(days=1), today, 1),
+            ('week / 1 min', today - timedelta(days=7), today, 1),
+            ('month / 1 hour', month_start, today.replace(day=1), 60),
+        ]:
+            timings = {}
+            with QueryCounter(db.engine) as queries, timer(timings, name):
+                result = StatsService.occupancy_stats(start_date, end_date, resolution)
+            occupancy_rows.append((name, queries.count, result['sessions'], len(result['series']),
+                                   result['peak'], f"{timings[name] * 1000:.1f}"))
+
+    report(rows, ['time_range', 'legacy queries', 'legacy ms', 'grouped queries', 'grouped ms', 'speedup'])
+    print()
+    report(occupancy_rows, ['occupancy', 'queries', 'sessions', 'buckets', 'peak', 'ms'])
+
+if __name__ == '__main__':
+    main()
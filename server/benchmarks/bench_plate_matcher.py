@@ -0,0 +1,66 @@
+"""
+Latency and accuracy of resolving OCR-misread plates against the open sessions.
+
+    cd server
+    python -m benchmarks.bench_plate_matcher --plates 5000 --lookups 2000
+"""
+import random
+import argparse
+from app.service.plates import PlateMatcher, CONFUSABLES, SIMILAR
+from .common import measure, report
+
+LETTERS = 'ABCDEFGHKLMNPSTUVXYZ'
+
+def random_plate(rng):
+    return f"{rng.randint(11, 99)}{rng.choice(LETTERS)}-{rng.randint(100, 999)}.{rng.randint(10, 99)}"
+
+def misread(plate, rng):
+    """Swap one character for a confusable or similar one, as the camera OCR does."""
+    swaps = {}
+    for a, b in CONFUSABLES.items():
+        swaps.setdefault(a, []).append(b)
+        swaps.setdefault(b, []).append(a)
+    for pair in SIMILAR:
+        a, b = tuple(pair)
+        swaps.setdefault(a, []).append(b)
+        swaps.setdefault(b, []).append(a)
+    positions = [i for i, char in enumerate(plate) if char in swaps]
+    if not positions:
+        return plate
+    i = rng.choice(positions)
+    return plate[:i] + rng.choice(swaps[plate[i]]) + plate[i + 1:]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--plates', type=int, default=5000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    plates = list({random_plate(rng) for _ in range(args.plates)})
+    matcher = PlateMatcher()
+    matcher.rebuild(plates)
+
+    scans = [(plate, misread(plate, rng)) for plate in (rng.choice(plates) for _ in range(args.lookups))]
+    unknown = [random_plate(rng) for _ in range(args.lookups)]
+
+    outcomes = {'correct': 0, 'wrong': 0, 'ambiguous': 0}
+    scan_iter = iter(scans)
+    def resolve_misread():
+        expected, scanned = next(scan_iter)
+        best = matcher.best(scanned)
+        if best is None:
+            outcomes['ambiguous'] += 1
+        else:
+            outcomes['correct' if best.plate == expected else 'wrong'] += 1
+
+    unknown_iter = iter(unknown)
+    rows = []
+    for name, fn in [('misread plate', resolve_misread), ('unknown plate', lambda: matcher.best(next(unknown_iter)))]:
+        r = measure(fn, args.lookups)
+        rows.append((name, r['n'], f"{r['p50'] * 1000:.0f}", f"{r['p95'] * 1000:.0f}", f"{r['p99'] * 1000:.0f}"))
+    report(rows, ['lookup', 'n', 'p50 us', 'p95 us', 'p99 us'])
+    print(f"\n{len(plates)} open plates, misread outcomes: {outcomes}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Mix gate writes (VehicleService.handle_vehicle enter/exit) with dashboard reads (/transactions)
+from several threads and compare SQLite profiles.
+
+    cd server
+    python -m benchmarks.bench_sqlite_concurrency --writers 4 --readers 4 --seconds 10
+"""
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+from create_data import create_bulk_data
+from app.models import db
+from app.service.vehicle import VehicleService
+from app.service.session_index import active_sessions
+from .common import make_app, report
+from .fake_firebase import FakeFirebase
+
+def run_profile(profile, args):
+    app = make_app(sqlite_profile=profile)
+    firebase = FakeFirebase({'price': 2})
+    app.config['DB'] = firebase
+    with app.app_context():
+        create_bulk_data(args.sessions, seed=42)
+        active_sessions.warm()
+
+    stop = threading.Event()
+    counts = {'writes': 0, 'write_errors': 0, 'reads': 0, 'read_errors': 0}
+    lock = threading.Lock()
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    week_ago = (datetime.utcnow() - timedelta(days=7)).strftime('%Y-%m-%d')
+
+    def writer(worker):
+        n = 0
+        while not stop.is_set():
+            plate = f"W{worker}-{n % 50:03d}"
+            action = 'enter' if (n // 50) % 2 == 0 else 'exit'
+            with app.test_request_context():
+                ok = VehicleService.handle_vehicle(firebase, {'licensePlate': plate, 'imageSrc': '/images/bench.jpg', 'rfid': None}, action)
+            with lock:
+                counts['writes' if ok else 'write_errors'] += 1
+            n += 1
+
+    def reader():
+        client = app.test_client()
+        while not stop.is_set():
+            response = client.get(f'/transactions?start_date={week_ago}&end_date={today}')
+            with lock:
+                counts['reads' if response.status_code == 200 else 'read_errors'] += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        db.engine.dispose()
+    return counts, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=50000)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profiles', default='default,tuned')
+    args = parser.parse_args()
+
+    rows = []
+    for profile in args.profiles.split(','):
+        counts, elapsed = run_profile(profile, args)
+        rows.append((profile, f"{counts['writes'] / elapsed:.1f}", counts['write_errors'],
+                     f"{counts['reads'] / elapsed:.1f}", counts['read_errors']))
+
+    report(rows, ['profile', 'writes/s', 'write errors', 'reads/s', 'read errors'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Re-pricing speed of the tariff engine: in-memory arrays, and the full simulator over SQLite.
+
+    cd server
+    python -m benchmarks.bench_tariff --sessions 1000000
+"""
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+from create_data import create_bulk_data
+from app.models import db, ParkingSession
+from app.service.tariff import Tariff, load_closed_sessions, simulate_tariff
+from .common import make_app, timer, report
+
+CANDIDATE = {
+    'entry_fee': 1,
+    'hourly_rate': 2,
+    'bands': [{'start': '18:00', 'end': '06:00', 'rate': 0.5}, {'start': '07:00', 'end': '09:00', 'rate': 4}],
+    'grace_minutes': 15,
+    'daily_max': 25,
+    'max_fee': 120
+}
+
+def random_sessions(count, rng):
+    checkin = rng.integers(1_700_000_000, 1_730_000_000, count)
+    return checkin, checkin + rng.integers(60, 3 * 24 * 3600, count)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=1000000)
+    parser.add_argument('--db', default=None, help="Reuse an already seeded SQLite file")
+    args = parser.parse_args()
+
+    tariff = Tariff.from_dict(CANDIDATE)
+    flat = Tariff(entry_fee=2.0)
+    checkin, checkout = random_sessions(args.sessions, np.random.default_rng(42))
+
+    timings = {}
+    with timer(timings, 'price arrays'):
+        tariff.fees(checkin, checkout)
+    with timer(timings, 'price one by one (1%)'):
+        sample = max(args.sessions // 100, 1)
+        for start, end in zip(checkin[:sample].tolist(), checkout[:sample].tolist()):
+            tariff.fees([start], [end])
+    timings['price one by one (1%)'] *= args.sessions / sample
+
+    app = make_app(args.db)
+    with app.app_context():
+        if not db.session.query(ParkingSession.id).first():
+            print(f"Seeding {args.sessions} sessions...")
+            create_bulk_data(args.sessions, seed=42)
+        last_90_days = datetime.utcnow() - timedelta(days=90)
+        with timer(timings, 'simulate 90 days (cold)'):
+            simulate_tariff(tariff, flat, last_90_days)
+        with timer(timings, 'load all sessions from SQLite'):
+            loaded = load_closed_sessions()
+        # Same range again: the sessions are reused, only the pricing runs
+        with timer(timings, 'simulate all again (warm)'):
+            result = simulate_tariff(tariff, flat)
+
+    rows = [(name, f"{seconds * 1000:.0f}") for name, seconds in timings.items()]
+    report(rows, ['step', 'ms'])
+    print(f"\n{len(loaded[0])} sessions in SQLite, candidate revenue {result['candidate']['revenue']} "
+          f"vs current {result['current']['revenue']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Measure /api/vehicles/summary and /vehicles and check it runs a constant number of SQL statements.
+
+    cd server
+    python -m benchmarks.bench_vehicle_summary --sessions 1000000 --vehicles 50000
+"""
+import argparse
+from create_data import create_bulk_data
+from app.models import db, ParkingSession
+from .common import make_app, QueryCounter, timer, report
+
+# Summary query, plus the total count when the client paginates
+MAX_QUERIES = 2
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=1000000)
+    parser.add_argument('--vehicles', type=int, default=50000)
+    parser.add_argument('--db', default=None, help="Reuse an already seeded SQLite file")
+    args = parser.parse_args()
+
+    app = make_app(args.db)
+    with app.app_context():
+        if not db.session.query(ParkingSession.id).first():
+            print(f"Seeding {args.sessions} sessions for {args.vehicles} vehicles...")
+            create_bulk_data(args.sessions, num_vehicles=args.vehicles, seed=42)
+
+    client = app.test_client()
+    cases = [
+        ('full list', '/api/vehicles/summary'),
+        ('status=in', '/api/vehicles/summary?status=in'),
+        ('page 1', '/api/vehicles/summary?page=1&per_page=100'),
+        ('deep page', '/api/vehicles/summary?page=400&per_page=100'),
+        ('vehicles full list', '/vehicles'),
+        ('vehicles by visits', '/vehicles?sort=total_visits&order=desc&page=1&per_page=100'),
+        ('vehicles by last visit', '/vehicles?sort=last_visit&order=desc&page=1&per_page=100'),
+    ]
+
+    rows = []
+    with app.app_context():
+        engine = db.engine
+    for name, url in cases:
+        timings = {}
+        with QueryCounter(engine) as queries, timer(timings, name):
+            response = client.get(url)
+        assert response.status_code == 200, response.get_json()
+        # Guard against the N+1 coming back: the count must not depend on the number of vehicles
+        assert queries.count <= MAX_QUERIES, f"{url} ran {queries.count} queries"
+        rows.append((name, queries.count, f"{timings[name] * 1000:.1f}"))
+
+    report(rows, ['case', 'queries', 'ms'])
+
+if __name__ == '__main__':
+    main()
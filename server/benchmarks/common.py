@@ -0,0 +1,99 @@
+import os
+import time
+import tempfile
+from contextlib import contextmanager
+from flask import Flask
+from sqlalchemy import event
+from app.models import db, ensure_indexes, apply_sqlite_profile, sqlite_engine_options
+from app.config import Config
+
+def make_app(db_path=None, sqlite_profile=None):
+    """
+    Build a Flask app bound to a standalone SQLite file, without Firebase.
+    The `routes` blueprint is registered so endpoints can be hit through `app.test_client()`.
+    `sqlite_profile` overrides Config.SQLITE_PROFILE.
+    """
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='parking-bench-'), 'bench.db')
+    app = Flask('app')
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.abspath(db_path)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options(app.config)
+    db.init_app(app)
+
+    from app.routes import routes
+    app.register_blueprint(routes)
+
+    if sqlite_profile is not None:
+        app.config['SQLITE_PROFILE'] = sqlite_profile
+
+    with app.app_context():
+        apply_sqlite_profile(db.engine, app.config['SQLITE_PROFILES'][app.config['SQLITE_PROFILE']])
+        db.create_all()
+        ensure_indexes()
+    app.config['SQLDB'] = db
+    return app
+
+class QueryCounter:
+    """Count the SQL statements executed on the engine while the block runs."""
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        return False
+
+@contextmanager
+def timer(results, name):
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of already sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_samples))) - 1, 0)
+    return sorted_samples[min(rank, len(sorted_samples) - 1)]
+
+def measure(fn, iterations, warmup=0):
+    """
+    Call `fn()` `iterations` times (after `warmup` untimed calls) and return latency statistics in milliseconds
+    (p50/p95/p99/mean/max) and the throughput in calls per second.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - call_started) * 1000)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        'n': iterations,
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'mean': sum(samples) / len(samples) if samples else 0.0,
+        'max': samples[-1] if samples else 0.0,
+        'throughput': iterations / elapsed if elapsed else 0.0
+    }
+
+def report(rows, headers):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    line = '  '.join(str(h).ljust(w) for h, w in zip(headers, widths))
+    print(line)
+    print('-' * len(line))
+    for r in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(r, widths)))
@@ -0,0 +1,128 @@
+import copy
+import threading
+import time
+
+class FakeResponse:
+    """Mimics pyrebase's PyreResponse for the parts the app uses."""
+    def __init__(self, value, key=None):
+        self._value = value
+        self._key = key
+
+    def val(self):
+        return self._value
+
+    def key(self):
+        return self._key
+
+class FakeStream:
+    def __init__(self, ref, handler):
+        self.ref = ref
+        self.handler = handler
+
+    def close(self):
+        self.ref.root._streams.discard(self)
+
+class FakeFirebase:
+    """
+    In-memory stand-in for a pyrebase `firebase.database()` object.
+    Supports child()/get()/set()/update() (including multi-location paths)/remove()/stream().
+    Every network call sleeps `latency` seconds, so Firebase round trips can be simulated,
+    and is counted in `calls`.
+    """
+    def __init__(self, data=None, latency=0.0):
+        self.data = data if data is not None else {}
+        self.latency = latency
+        self.calls = 0
+        self.calls_by_method = {}
+        self._lock = threading.Lock()
+        self._streams = set()
+
+    def child(self, *path):
+        return FakeRef(self, ()).child(*path)
+
+    def get(self):
+        return FakeRef(self, ()).get()
+
+    def update(self, data):
+        return FakeRef(self, ()).update(data)
+
+    def _call(self, method):
+        with self._lock:
+            self.calls += 1
+            self.calls_by_method[method] = self.calls_by_method.get(method, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _notify(self, path, value):
+        for stream in list(self._streams):
+            prefix = stream.ref.path
+            if path[:len(prefix)] == prefix:
+                relative = '/' + '/'.join(path[len(prefix):])
+                stream.handler({'event': 'put', 'path': relative, 'data': copy.deepcopy(value)})
+
+class FakeRef:
+    def __init__(self, root, path):
+        self.root = root
+        self.path = path
+
+    def child(self, *path):
+        parts = []
+        for part in path:
+            parts.extend(p for p in str(part).split('/') if p)
+        return FakeRef(self.root, self.path + tuple(parts))
+
+    def _read(self):
+        node = self.root.data
+        for key in self.path:
+            if not isinstance(node, dict) or key not in node:
+                return None
+            node = node[key]
+        return copy.deepcopy(node)
+
+    def _write(self, path, value):
+        if not path:
+            self.root.data = value if isinstance(value, dict) else {}
+            return
+        node = self.root.data
+        for key in path[:-1]:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        if value is None:
+            node.pop(path[-1], None)
+        else:
+            node[path[-1]] = copy.deepcopy(value)
+
+    def get(self):
+        self.root._call('get')
+        with self.root._lock:
+            return FakeResponse(self._read(), self.path[-1] if self.path else None)
+
+    def set(self, value):
+        self.root._call('set')
+        with self.root._lock:
+            self._write(self.path, value)
+        self.root._notify(self.path, value)
+        return value
+
+    def update(self, data):
+        """Multi-location update: keys may be nested paths relative to this reference."""
+        self.root._call('update')
+        with self.root._lock:
+            for key, value in data.items():
+                self._write(self.child(key).path, value)
+        for key, value in data.items():
+            self.root._notify(self.child(key).path, value)
+        return data
+
+    def remove(self):
+        self.root._call('remove')
+        with self.root._lock:
+            self._write(self.path, None)
+        self.root._notify(self.path, None)
+
+    def stream(self, handler):
+        stream = FakeStream(self, handler)
+        self.root._streams.add(stream)
+        handler({'event': 'put', 'path': '/', 'data': self._read()})
+        return stream
@@ -0,0 +1,162 @@
+"""
+End-to-end benchmark suite: the real create_app() over a seeded SQLite file and an in-memory
+Firebase with injectable latency. Reports p50/p95/p99 latency and throughput per scenario.
+
+    cd server
+    python -m benchmarks.suite --sessions 200000 --vehicles 10000 --parked 2000 --firebase-latency 0.02
+    python -m benchmarks.suite --json results.json   # keep the numbers to compare runs
+"""
+import io
+import os
+import json
+import itertools
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from app import create_app
+from app.models import db
+from app.service.stats import rebuild_revenue_rollup
+from app.service.session_index import active_sessions
+from app.service.response_cache import response_cache
+from app.service.vehicle import VehicleService
+from create_data import create_bulk_data
+from .common import measure, report
+from .fake_firebase import FakeFirebase
+
+def build_app(args, firebase):
+    folder = tempfile.mkdtemp(prefix='parking-suite-')
+    app = create_app(config={
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + (os.path.abspath(args.db) if args.db else os.path.join(folder, 'suite.db')),
+        'IMAGE_FOLDER': os.path.join(folder, 'images'),
+        'THUMBNAIL_FOLDER': os.path.join(folder, 'thumbnails'),
+        'JOURNAL_PATH': os.path.join(folder, 'journal.log'),
+        'LOG_PATH': os.path.join(folder, 'parking.log'),
+    }, firebase_db=firebase)
+    with app.app_context():
+        if args.sessions and not args.db:
+            print(f"Seeding {args.sessions} sessions for {args.vehicles} vehicles, {args.parked} parked...")
+            create_bulk_data(args.sessions, num_vehicles=args.vehicles, seed=42, parked=args.parked)
+            rebuild_revenue_rollup()
+        active_sessions.warm()
+    return app
+
+def gate_scenarios(app, client, iterations):
+    """Single scans through /vehicle/handle, then the same plates replayed through the batch endpoint."""
+    image = os.urandom(20 * 1024)
+    plates = itertools.count()
+    entered = []
+
+    def scan(status, plate):
+        response = client.post('/vehicle/handle', data={
+            'image': (io.BytesIO(image), 'gate.jpg'),
+            'licensePlate': plate,
+            'status': status
+        })
+        assert response.status_code == 200, response.get_data()
+
+    def enter():
+        plate = f"SUITE-{next(plates):06d}"
+        entered.append(plate)
+        scan('enter', plate)
+
+    exits = iter(entered)
+    results = {'gate enter': measure(enter, iterations)}
+    results['gate exit'] = measure(lambda: scan('exit', next(exits)), iterations)
+
+    batches = itertools.count()
+    def batch():
+        base = next(batches) * 50
+        events = [{'licensePlate': f"BATCH-{base + i // 2:06d}", 'status': 'enter' if i % 2 == 0 else 'exit'}
+                  for i in range(100)]
+        response = client.post('/vehicle/handle/batch', json={'events': events})
+        assert response.status_code == 200, response.get_data()
+    results['gate batch (100 events)'] = measure(batch, max(iterations // 10, 5))
+    return results
+
+def read_scenarios(client, iterations):
+    month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
+    month_end = (datetime.now().replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+    today = datetime.now().strftime('%Y-%m-%d')
+    urls = {
+        'stats parking (month)': f"/api/stats/parking?start_date={month_start}&end_date={month_end:%Y-%m-%d}&time_range=month",
+        'stats revenue (month)': f"/api/stats/revenue?start_date={month_start}&end_date={month_end:%Y-%m-%d}&time_range=month",
+        'vehicles summary (page)': "/api/vehicles/summary?page=1&per_page=100",
+        'transactions (keyset page)': f"/transactions?start_date={week_ago}&end_date={today}&limit=100",
+    }
+
+    results = {}
+    for name, url in urls.items():
+        def uncached(url=url):
+            # Measure the computation, not the response cache
+            response_cache.clear()
+            response = client.get(url)
+            assert response.status_code == 200, response.get_data()
+        results[name] = measure(uncached, iterations, warmup=1)
+
+    etag = client.get(urls['stats parking (month)']).headers['ETag']
+    def revalidate():
+        response = client.get(urls['stats parking (month)'], headers={'If-None-Match': etag})
+        assert response.status_code == 304
+    results['stats parking (304)'] = measure(revalidate, iterations)
+
+    def export():
+        response = client.get(f"/api/vehicles/export?format=ndjson&start_date={week_ago}&end_date={today}")
+        assert response.status_code == 200
+        for _ in response.response:
+            pass
+    results['export ndjson (7 days)'] = measure(export, max(iterations // 20, 3))
+    return results
+
+def sync_scenarios(app, firebase, iterations):
+    def cold():
+        firebase.data.pop('vehicles', None)
+        VehicleService.sync_vehicles_to_firebase(firebase)
+
+    def warm():
+        VehicleService.sync_vehicles_to_firebase(firebase)
+
+    with app.app_context():
+        results = {'startup sync (cold)': measure(cold, max(iterations // 20, 3))}
+        results['startup sync (unchanged)'] = measure(warm, max(iterations // 20, 3))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=200000)
+    parser.add_argument('--vehicles', type=int, default=10000)
+    parser.add_argument('--parked', type=int, default=2000, help="Vehicles parked since this morning (startup sync size)")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--firebase-latency', type=float, default=0.02, help="Seconds per Firebase call")
+    parser.add_argument('--db', default=None, help="Reuse an already seeded SQLite file")
+    parser.add_argument('--json', default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    firebase = FakeFirebase({'price': 2}, latency=args.firebase_latency)
+    app = build_app(args, firebase)
+    client = app.test_client()
+
+    results = {}
+    results.update(gate_scenarios(app, client, args.iterations))
+    results.update(read_scenarios(client, args.iterations))
+    results.update(sync_scenarios(app, firebase, args.iterations))
+
+    writer = app.config['FIREBASE_WRITER']
+    writer.flush()
+    writer.stop(timeout=5)
+
+    report([(name, r['n'], f"{r['p50']:.1f}", f"{r['p95']:.1f}", f"{r['p99']:.1f}", f"{r['mean']:.1f}", f"{r['throughput']:.1f}")
+            for name, r in results.items()],
+           ['scenario', 'n', 'p50 ms', 'p95 ms', 'p99 ms', 'mean ms', 'ops/s'])
+    print(f"\nFirebase calls: {firebase.calls} {firebase.calls_by_method}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'args': vars(args),
+                'firebase_calls': firebase.calls_by_method,
+                'results': results
+            }, f, indent=2)
+
+if __name__ == '__main__':
+    main()
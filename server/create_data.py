@@ -1,7 +1,10 @@
 from app import create_app
 from app.models import UserDB, VehicleDB, ParkingSession, Transaction, db
+from app.service.stats import add_to_revenue_rollup, add_many_to_revenue_rollup
 from datetime import datetime, timedelta
 import random
+import pytz
+import sys
 from werkzeug.security import generate_password_hash
 
 def create_sample_vehicles():
@@ -72,10 +75,83 @@ def create_sample_parking_sessions():
                 paid_at=checkout_time + timedelta(minutes=random.randint(1, 30))
             )
             db.session.add(transaction)
+            # Cộng vào bảng doanh thu theo giờ, nếu không thống kê doanh thu sẽ bỏ sót dữ liệu mẫu
+            add_to_revenue_rollup(transaction)
             print(f"Created transaction for session {session.id}: ${amount} via {payment_method}")
     
     db.session.commit()
 
+def create_bulk_data(num_sessions, num_vehicles=None, days=365, batch_size=50000, seed=None, parked=0):
+    """
+    Tạo nhanh một lượng lớn phiên đỗ xe và giao dịch (dùng cho benchmark).
+    Các phiên được rải đều trong `days` ngày gần nhất, mỗi phiên đã checkout có một giao dịch
+    (được cộng luôn vào bảng doanh thu theo giờ).
+    `parked` xe khác đang đỗ, vào bãi từ đầu ngày hôm nay (dữ liệu cho đồng bộ Firebase lúc khởi động).
+    """
+    rng = random.Random(seed)
+    payment_methods = ['cash', 'card', 'e-wallet']
+    num_vehicles = num_vehicles or max(num_sessions // 20, 1)
+
+    # Dùng insert theo lô để tránh tạo object ORM cho từng dòng
+    first_vehicle_id = (db.session.query(db.func.max(VehicleDB.id)).scalar() or 0) + 1
+    vehicle_rows = [{'plate_number': f"BENCH-{first_vehicle_id + i:07d}"} for i in range(num_vehicles)]
+    db.session.execute(db.insert(VehicleDB), vehicle_rows)
+
+    next_session_id = (db.session.query(db.func.max(ParkingSession.id)).scalar() or 0) + 1
+    now = datetime.utcnow().replace(microsecond=0)
+    window_seconds = days * 24 * 3600
+
+    created = 0
+    while created < num_sessions:
+        sessions = []
+        transactions = []
+        for _ in range(min(batch_size, num_sessions - created)):
+            checkin_time = now - timedelta(seconds=rng.randint(0, window_seconds))
+            checkout_time = checkin_time + timedelta(minutes=rng.randint(10, 12 * 60))
+            if checkout_time > now:
+                checkout_time = None
+            sessions.append({
+                'id': next_session_id,
+                'vehicle_id': first_vehicle_id + rng.randrange(num_vehicles),
+                'checkin_time': checkin_time,
+                'checkout_time': checkout_time,
+                'rfid_code': f"RFID{rng.randint(1000, 9999)}",
+                'image_src': "/images/bench.jpg"
+            })
+            if checkout_time:
+                transactions.append({
+                    'session_id': next_session_id,
+                    'amount': 1.00,
+                    'payment_method': rng.choice(payment_methods),
+                    'paid_at': checkout_time
+                })
+            next_session_id += 1
+        db.session.execute(db.insert(ParkingSession), sessions)
+        if transactions:
+            db.session.execute(db.insert(Transaction), transactions)
+            add_many_to_revenue_rollup(transactions)
+        db.session.commit()
+        created += len(sessions)
+
+    if parked:
+        first_parked_id = (db.session.query(db.func.max(VehicleDB.id)).scalar() or 0) + 1
+        db.session.execute(db.insert(VehicleDB), [
+            {'plate_number': f"PARKED-{first_parked_id + i:07d}"} for i in range(parked)
+        ])
+        # Giờ địa phương không timezone, giống get_vietnam_time() khi lưu vào SQLite
+        today = datetime.now(pytz.timezone('Asia/Ho_Chi_Minh')).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        db.session.execute(db.insert(ParkingSession), [{
+            'vehicle_id': first_parked_id + i,
+            'checkin_time': today + timedelta(seconds=rng.randint(0, 6 * 3600)),
+            'checkout_time': None,
+            'rfid_code': f"RFID{rng.randint(1000, 9999)}",
+            'image_src': "/images/bench.jpg"
+        } for i in range(parked)])
+        db.session.commit()
+        created += parked
+
+    return created
+
 def create_default_users():
     """Tạo tài khoản mặc định cho admin và bảo vệ"""
     try:
@@ -123,5 +199,15 @@ def create_data():
         
         print("Successfully created all sample data")
 
+def create_bench_data(num_sessions):
+    app = create_app()
+    with app.app_context():
+        created = create_bulk_data(num_sessions)
+        print(f"Successfully created {created} benchmark parking sessions")
+
 if __name__ == '__main__':
-    create_data() 
\ No newline at end of file
+    # python create_data.py [số phiên] -> tạo dữ liệu lớn cho benchmark
+    if len(sys.argv) > 1:
+        create_bench_data(int(sys.argv[1]))
+    else:
+        create_data() 
\ No newline at end of file
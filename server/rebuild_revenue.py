@@ -0,0 +1,12 @@
+from app import create_app
+from app.service.stats import rebuild_revenue_rollup
+
+def rebuild_revenue():
+    """Tính lại toàn bộ bảng revenue_hourly từ bảng transactions"""
+    app = create_app()
+    with app.app_context():
+        rows = rebuild_revenue_rollup()
+        print(f"Rebuilt revenue rollup: {rows} hourly rows")
+
+if __name__ == '__main__':
+    rebuild_revenue()
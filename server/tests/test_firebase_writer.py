@@ -0,0 +1,136 @@
+"""
+FirebaseWriter against the in-memory FakeFirebase: outbox rows follow the SQLite transaction,
+failed writes stay in the outbox for replay, and one plate's events are applied in order.
+The background thread is not started, batches are applied with flush()/replay().
+"""
+import pytest
+from app.models import db, FirebaseOutbox
+from app.service.vehicle import apply_firebase_event
+from app.service.firebase_writer import FirebaseWriter, OutboxItem, coalesce
+from benchmarks.common import make_app
+from benchmarks.fake_firebase import FakeFirebase
+
+class FlakyFirebase(FakeFirebase):
+    """FakeFirebase whose root update() (the one PATCH of every gate event) fails while `failing`."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failing = False
+
+    def update(self, data):
+        if self.failing:
+            self._call('update')
+            raise ConnectionError("Firebase unavailable")
+        return super().update(data)
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(str(tmp_path / 'outbox.db'))
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def firebase():
+    return FlakyFirebase({'price': 2})
+
+@pytest.fixture
+def writer(app, firebase):
+    return FirebaseWriter(app, firebase, apply_firebase_event, max_attempts=3)
+
+def enter(plate):
+    return {"licensePlate": plate, "entryTime": "2024-01-01T08:00:00+07:00", "exitTime": None, "imageSrc": None}
+
+def exit_(plate):
+    return dict(enter(plate), exitTime="2024-01-01T09:00:00+07:00")
+
+def commit_event(app, writer, plate, event_name, payload):
+    with app.app_context():
+        writer.enqueue(db.session, plate, event_name, payload)
+        db.session.commit()
+
+def outbox_rows(app):
+    with app.app_context():
+        rows = [(row.plate_number, row.event, row.attempts, row.last_error)
+                for row in FirebaseOutbox.query.order_by(FirebaseOutbox.id)]
+        db.session.remove()
+    return rows
+
+def test_committed_event_is_published_and_removed_from_outbox(app, writer, firebase):
+    commit_event(app, writer, '29A-11111', 'enter', enter('29A-11111'))
+    assert writer.flush() == (1, 0)
+    assert firebase.data['vehicles']['29A-11111']['licensePlate'] == '29A-11111'
+    assert firebase.data['vehicle_last_action']['action'] == 'enter'
+    assert outbox_rows(app) == []
+
+def test_rolled_back_transaction_publishes_nothing(app, writer, firebase):
+    with app.app_context():
+        writer.enqueue(db.session, '29A-11111', 'enter', enter('29A-11111'))
+        db.session.rollback()
+    assert writer.queue_size() == 0
+    assert writer.flush() == (0, 0)
+    assert firebase.calls == 0
+    assert outbox_rows(app) == []
+
+def test_failed_update_leaves_row_for_replay(app, writer, firebase):
+    firebase.failing = True
+    commit_event(app, writer, '29A-11111', 'enter', enter('29A-11111'))
+    assert writer.flush() == (0, 1)
+    [(plate, event_name, attempts, error)] = outbox_rows(app)
+    assert (plate, event_name, attempts) == ('29A-11111', 'enter', 1)
+    assert error
+    assert 'vehicles' not in firebase.data
+
+    firebase.failing = False
+    assert writer.replay() == 1
+    assert writer.flush() == (1, 0)
+    assert firebase.data['vehicles']['29A-11111']['licensePlate'] == '29A-11111'
+    assert outbox_rows(app) == []
+
+def test_blocked_plate_waits_for_its_failed_row(app, writer, firebase):
+    firebase.failing = True
+    commit_event(app, writer, '29A-11111', 'enter', enter('29A-11111'))
+    writer.flush()
+    firebase.failing = False
+
+    # A newer batch: the exit must not be applied before the failed enter
+    commit_event(app, writer, '29A-11111', 'exit', exit_('29A-11111'))
+    commit_event(app, writer, '30B-22222', 'enter', enter('30B-22222'))
+    assert writer.flush() == (1, 0)
+    assert '29A-11111' not in firebase.data['vehicles']
+    assert [row[:2] for row in outbox_rows(app)] == [('29A-11111', 'enter'), ('29A-11111', 'exit')]
+
+    # Replay applies the rows in outbox order and unblocks the plate
+    assert writer.replay() == 2
+    assert writer.flush() == (2, 0)
+    assert firebase.data['vehicles']['29A-11111']['exitTime'] == '2024-01-01T09:00:00+07:00'
+    assert firebase.data['vehicle_last_action']['action'] == 'exit'
+    assert outbox_rows(app) == []
+
+    commit_event(app, writer, '29A-11111', 'enter', enter('29A-11111'))
+    assert writer.flush() == (1, 0)
+
+def test_row_is_dropped_after_max_attempts(app, writer, firebase):
+    firebase.failing = True
+    commit_event(app, writer, '29A-11111', 'enter', enter('29A-11111'))
+    assert writer.flush() == (0, 1)
+    writer.replay()
+    assert writer.flush() == (0, 1)
+    writer.replay()
+    # Third attempt reaches max_attempts: given up and removed
+    assert writer.flush() == (1, 0)
+    assert outbox_rows(app) == []
+
+def test_coalesce_keeps_the_last_enter_and_its_followers():
+    items = [
+        OutboxItem(1, 'A', 'enter', {}, 0),
+        OutboxItem(2, 'A', 'exit', {}, 0),
+        OutboxItem(3, 'B', 'enter', {}, 0),
+        OutboxItem(4, 'A', 'enter', {}, 0),
+        OutboxItem(5, 'A', 'exit', {}, 0),
+        OutboxItem(6, 'A', 'exit', {}, 0),
+        OutboxItem(7, None, 'last_scan', {}, 0),
+    ]
+    kept, superseded = coalesce(items)
+    assert [item.id for item in kept] == [3, 4, 6, 7]
+    assert sorted(superseded) == [1, 2, 5]
@@ -0,0 +1,38 @@
+"""/api/images: originals and resized variants of the content-addressed image store."""
+import io
+import pytest
+from PIL import Image
+from app.utils.image_store import ImageStore
+from benchmarks.common import make_app
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(str(tmp_path / 'images.db'))
+    app.config['IMAGE_FOLDER'] = str(tmp_path / 'images')
+    app.config['THUMBNAIL_FOLDER'] = str(tmp_path / 'thumbnails')
+    return app
+
+def store(app, data, filename):
+    url_path = ImageStore(app.config['IMAGE_FOLDER']).save(io.BytesIO(data), filename)
+    return '/api' + url_path
+
+def png(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def test_variant_is_resized_jpeg(app):
+    url = store(app, png(800, 600), 'gate.png')
+    response = app.test_client().get(url + '?w=150')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    with Image.open(io.BytesIO(response.data)) as image:
+        assert image.size == (160, 120)
+
+def test_undecodable_source_is_rejected_without_leftovers(app, tmp_path):
+    url = store(app, b'not an image', 'broken.jpg')
+    client = app.test_client()
+    assert client.get(url + '?w=160').status_code == 415
+    assert list((tmp_path / 'thumbnails').rglob('*')) == []
+    # The original is still served as stored
+    assert client.get(url).data == b'not an image'
@@ -0,0 +1,87 @@
+"""
+Fuzzy plate matching, and its use on the exit path: an exit only closes another plate's session
+when the scanned plate is unknown and a single open session is a confusable/similar-character match.
+"""
+import pytest
+from app.models import db, VehicleDB, ParkingSession
+from app.service.plates import PlateMatcher, match_key
+from app.service.session_index import active_sessions
+from app.service.vehicle import VehicleService, EXIT_MATCH_MAX_DISTANCE
+from benchmarks.common import make_app
+from benchmarks.fake_firebase import FakeFirebase
+
+def test_match_key_folds_confusables():
+    assert match_key('51b-1oo.oo') == match_key('51B-10000') == '51810000'
+
+@pytest.mark.parametrize('scanned, distance', [
+    ('29A-1234S', 0.5),   # 5/S is a similar-character misread
+    ('29A-12346', 1.0),   # Another digit is a full edit
+    ('29A-1234', 1.0),    # Missing character
+])
+def test_distances(scanned, distance):
+    matcher = PlateMatcher()
+    matcher.add('29A-12345')
+    assert matcher.search(scanned) == [('29A-12345', distance)]
+
+def test_best_is_none_when_tied():
+    matcher = PlateMatcher()
+    matcher.rebuild(['29A-12345', '29A-12347'])
+    assert matcher.best('29A-12346') is None
+    assert matcher.best('29A-12345').plate == '29A-12345'
+
+def test_distant_plates_are_not_found():
+    matcher = PlateMatcher()
+    matcher.add('29A-12345')
+    assert matcher.search('29A-12366') == []
+    assert matcher.search('29A-12346', max_distance=EXIT_MATCH_MAX_DISTANCE) == []
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(str(tmp_path / 'plates.db'))
+    app.config['DB'] = FakeFirebase({'price': 2})
+    with app.app_context():
+        active_sessions.warm()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def gate(app, plate, action):
+    with app.app_context():
+        return VehicleService.handle_vehicle(app.config['DB'], {'licensePlate': plate, 'imageSrc': None}, action)
+
+def parked(app):
+    with app.app_context():
+        return sorted(plate for plate, in db.session.query(VehicleDB.plate_number)
+                      .join(ParkingSession, ParkingSession.vehicle_id == VehicleDB.id)
+                      .filter(ParkingSession.checkout_time.is_(None)))
+
+def test_unknown_misread_plate_closes_the_matching_session(app):
+    gate(app, '51B-10000', 'enter')
+    assert gate(app, '51B-1OOOO', 'exit')
+    assert parked(app) == []
+
+def test_unknown_similar_character_plate_closes_the_matching_session(app):
+    gate(app, '51B-10005', 'enter')
+    assert gate(app, '51B-1000S', 'exit')
+    assert parked(app) == []
+
+def test_known_plate_that_is_not_parked_is_never_matched(app):
+    gate(app, '29A-12345', 'enter')
+    gate(app, '29A-12345', 'exit')
+    gate(app, '29A-12346', 'enter')
+    # Repeated exit scan of a car that already left, one digit away from a parked car
+    gate(app, '29A-12345', 'exit')
+    assert parked(app) == ['29A-12346']
+
+def test_distant_candidate_is_never_closed(app):
+    gate(app, '29A-12346', 'enter')
+    assert not gate(app, '29A-12347', 'exit')
+    assert parked(app) == ['29A-12346']
+
+def test_ambiguous_candidates_are_never_closed(app):
+    # Both fold to the same key, the scan is half an edit from each
+    gate(app, '30A-00015', 'enter')
+    gate(app, '30A-000I5', 'enter')
+    assert not gate(app, '30A-0001S', 'exit')
+    assert parked(app) == ['30A-00015', '30A-000I5']
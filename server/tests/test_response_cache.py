@@ -0,0 +1,62 @@
+"""ResponseCache: ETags are per route and query, and a write makes every one of them stale."""
+import pytest
+from flask import Flask, request
+from app.service.response_cache import ResponseCache
+
+@pytest.fixture
+def cache():
+    return ResponseCache(max_entries=10, max_bytes=10000)
+
+@pytest.fixture
+def client(cache):
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/items')
+    @cache.cached()
+    def items():
+        calls.append(request.full_path)
+        return {'page': request.args.get('page', '1')}
+
+    @app.route('/users')
+    @cache.cached()
+    def users():
+        return {'users': []}
+
+    @app.route('/big')
+    @cache.cached()
+    def big():
+        return 'x' * int(request.args['size'])
+
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+def test_etag_only_matches_its_own_route_and_query(client):
+    etag = client.get('/items?page=1').headers['ETag']
+    assert client.get('/items?page=1', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/items?page=2', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/users', headers={'If-None-Match': etag}).status_code == 200
+
+def test_query_argument_order_does_not_matter(client):
+    etag = client.get('/items?page=1&per_page=5').headers['ETag']
+    assert client.get('/items?per_page=5&page=1', headers={'If-None-Match': etag}).status_code == 304
+    assert len(client.calls) == 1
+
+def test_invalidate_makes_etags_and_entries_stale(client, cache):
+    etag = client.get('/items').headers['ETag']
+    cache.invalidate()
+    response = client.get('/items', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(client.calls) == 2
+
+def test_entries_are_bounded_by_bytes(client, cache):
+    for size in range(1000, 1020):
+        client.get(f'/big?size={size}')
+    stats = cache.stats()
+    assert stats['bytes'] <= cache.max_bytes
+    assert stats['entries'] < 20
+    # Larger than the whole budget: served, never cached
+    client.get('/big?size=20000')
+    assert cache.stats()['bytes'] <= cache.max_bytes
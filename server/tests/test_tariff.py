@@ -0,0 +1,68 @@
+"""Tariff validation, and the session arrays the what-if simulator keeps between runs."""
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.models import db, VehicleDB, ParkingSession
+from app.service.tariff import Tariff, load_closed_sessions
+from app.service.response_cache import response_cache
+from benchmarks.common import make_app
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', float('nan')])
+def test_non_finite_values_are_rejected(value):
+    with pytest.raises(ValueError, match='finite'):
+        Tariff.from_dict({'hourly_rate': value})
+    with pytest.raises(ValueError, match='finite'):
+        Tariff.from_dict({'bands': [{'start': '08:00', 'end': '18:00', 'rate': value}]})
+
+def test_negative_values_are_rejected():
+    with pytest.raises(ValueError, match='negative'):
+        Tariff.from_dict({'daily_max': -1})
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(str(tmp_path / 'tariff.db'))
+    with app.app_context():
+        vehicle = VehicleDB(plate_number='29A-12345')
+        db.session.add(vehicle)
+        db.session.flush()
+        checkin = datetime(2024, 1, 1, 8, 0)
+        db.session.add(ParkingSession(vehicle_id=vehicle.id, checkin_time=checkin, checkout_time=checkin + timedelta(hours=1)))
+        db.session.add(ParkingSession(vehicle_id=vehicle.id, checkin_time=checkin + timedelta(hours=2)))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def closed_count(app):
+    with app.app_context():
+        return len(load_closed_sessions()[0])
+
+def test_loaded_sessions_follow_writes_without_the_response_cache(app, monkeypatch):
+    # The simulator does not depend on the HTTP response cache being enabled or invalidated
+    monkeypatch.setattr(response_cache, 'invalidate', lambda: None)
+    assert closed_count(app) == 1
+
+    # Bulk UPDATE, as the gate exit path closes sessions
+    with app.app_context():
+        db.session.execute(update(ParkingSession).where(ParkingSession.checkout_time.is_(None))
+                           .values(checkout_time=datetime(2024, 1, 1, 12, 0)))
+        db.session.commit()
+    assert closed_count(app) == 2
+
+    # ORM write through the flush
+    with app.app_context():
+        vehicle = VehicleDB.query.first()
+        db.session.add(ParkingSession(vehicle_id=vehicle.id, checkin_time=datetime(2024, 1, 2, 8, 0),
+                                      checkout_time=datetime(2024, 1, 2, 9, 0)))
+        db.session.commit()
+    assert closed_count(app) == 3
+
+def test_rolled_back_writes_keep_the_loaded_sessions(app):
+    assert closed_count(app) == 1
+    with app.app_context():
+        db.session.execute(update(ParkingSession).values(checkout_time=None))
+        db.session.rollback()
+        loaded = load_closed_sessions()
+        assert load_closed_sessions() is loaded
+    assert closed_count(app) == 1
@@ -0,0 +1,163 @@
+"""
+/vehicle/handle/batch: buffered gate scans applied in order in one transaction,
+with invalid events reported per event and the others applied.
+"""
+import io
+import json
+import threading
+import pytest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from app.models import db, VehicleDB, ParkingSession, Transaction
+from app.service.session_index import active_sessions
+from app.service.vehicle import MAX_BATCH_EVENTS
+from benchmarks.common import make_app
+from benchmarks.fake_firebase import FakeFirebase
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(str(tmp_path / 'batch.db'))
+    app.config['DB'] = FakeFirebase({'price': 2})
+    app.config['IMAGE_FOLDER'] = str(tmp_path / 'images')
+    with app.app_context():
+        # The index is process-wide: drop plates of other tests' databases
+        active_sessions.warm()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def post_events(app, events):
+    return app.test_client().post('/vehicle/handle/batch', json={'events': events})
+
+def sessions_of(app, plate):
+    with app.app_context():
+        return [(session.checkin_time.isoformat(), session.checkout_time and session.checkout_time.isoformat())
+                for session in ParkingSession.query.join(VehicleDB)
+                .filter(VehicleDB.plate_number == plate).order_by(ParkingSession.id)]
+
+def test_events_of_one_plate_are_applied_in_order(app):
+    response = post_events(app, [
+        {'licensePlate': '29a-12345', 'status': 'enter', 'timestamp': '2024-01-01T08:00:00'},
+        {'licensePlate': '29A-12345', 'status': 'exit', 'timestamp': '2024-01-01T09:00:00'},
+        {'licensePlate': '29A-12345', 'status': 'enter', 'timestamp': '2024-01-01T10:00:00'},
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['applied'] == 3
+    assert [result['licensePlate'] for result in body['results']] == ['29A-12345'] * 3
+    assert body['results'][1]['fee'] == 2
+    assert sessions_of(app, '29A-12345') == [
+        ('2024-01-01T08:00:00', '2024-01-01T09:00:00'),
+        ('2024-01-01T10:00:00', None),
+    ]
+    with app.app_context():
+        assert Transaction.query.count() == 1
+    # Firebase only gets the final state: parked again since 10:00
+    vehicle = app.config['DB'].data['vehicles']['29A-12345']
+    assert vehicle['entryTime'].startswith('2024-01-01T10:00:00')
+    assert vehicle.get('exitTime') is None
+    assert app.config['DB'].data['vehicle_last_action']['action'] == 'enter'
+
+def test_invalid_events_are_reported_and_the_others_applied(app):
+    response = post_events(app, [
+        {'licensePlate': 5, 'status': 'enter'},
+        {'licensePlate': '30B-22222', 'status': 'enter', 'timestamp': 'yesterday'},
+        {'licensePlate': '30B-22222', 'status': 'park'},
+        {'licensePlate': '30B-33333', 'status': 'exit'},
+        {'licensePlate': '30B-44444', 'status': 'enter', 'timestamp': '2024-01-01T08:00:00+07:00'},
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['applied'] == 1
+    assert [result.get('error') for result in body['results']] == [
+        'licensePlate must be a non-empty string',
+        'timestamp must be an ISO 8601 date-time string',
+        'status must be one of: enter, exit, conflict',
+        'Vehicle not found',
+        None,
+    ]
+    assert sessions_of(app, '30B-22222') == []
+    assert sessions_of(app, '30B-44444') == [('2024-01-01T08:00:00', None)]
+
+@pytest.mark.parametrize('kwargs', [
+    {'data': 'xx', 'content_type': 'application/json'},
+    {'json': [{'licensePlate': '29A-12345', 'status': 'enter'}]},
+    {'json': {'events': [1, 2]}},
+    {'data': {'events': '{not json'}},
+])
+def test_malformed_body_is_rejected(app, kwargs):
+    response = app.test_client().post('/vehicle/handle/batch', **kwargs)
+    assert response.status_code == 400
+
+def test_batch_size_is_limited(app):
+    events = [{'licensePlate': f'P-{i}', 'status': 'enter'} for i in range(MAX_BATCH_EVENTS + 1)]
+    response = post_events(app, events)
+    assert response.status_code == 400
+    with app.app_context():
+        assert VehicleDB.query.count() == 0
+
+    assert post_events(app, events[:MAX_BATCH_EVENTS]).get_json()['applied'] == MAX_BATCH_EVENTS
+
+def test_multipart_images_are_stored_for_valid_events_only(app, tmp_path):
+    events = [
+        {'licensePlate': '51F-10000', 'status': 'enter', 'image': 'front'},
+        {'licensePlate': '51F-20000', 'status': 'bogus', 'image': 'rear'},
+        {'licensePlate': '51F-30000', 'status': 'enter', 'image': 'missing'},
+    ]
+    response = app.test_client().post('/vehicle/handle/batch', content_type='multipart/form-data', data={
+        'events': json.dumps(events),
+        'front': (io.BytesIO(b'front-image'), 'front.jpg'),
+        'rear': (io.BytesIO(b'rear-image'), 'rear.jpg'),
+    })
+    assert response.status_code == 200
+    assert response.get_json()['applied'] == 2
+
+    with app.app_context():
+        image_src = dict(db.session.query(VehicleDB.plate_number, ParkingSession.image_src)
+                         .join(ParkingSession, ParkingSession.vehicle_id == VehicleDB.id).all())
+    assert image_src['51F-30000'] is None
+    assert image_src['51F-10000'].startswith('/images/')
+    stored = [path for path in (tmp_path / 'images').rglob('*.jpg')]
+    assert len(stored) == 1
+    assert stored[0].read_bytes() == b'front-image'
+
+@pytest.fixture
+def camera():
+    """Local HTTP server answering /<camera>/snapshot.jpg with bytes naming the camera, 404 for /missing/..."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/missing/'):
+                self.send_error(404)
+                return
+            body = self.path.encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+def test_image_urls_are_downloaded_into_the_store(app, tmp_path, camera):
+    response = post_events(app, [
+        {'licensePlate': '51F-10000', 'status': 'enter', 'imageUrl': f'{camera}/cam1/snapshot.jpg'},
+        {'licensePlate': '51F-20000', 'status': 'enter', 'imageUrl': f'{camera}/cam2/snapshot.jpg'},
+        {'licensePlate': '51F-30000', 'status': 'enter', 'imageUrl': f'{camera}/missing/snapshot.jpg'},
+        {'licensePlate': '51F-40000', 'status': 'bogus', 'imageUrl': f'{camera}/cam4/snapshot.jpg'},
+    ])
+    assert response.status_code == 200
+    assert response.get_json()['applied'] == 3
+
+    with app.app_context():
+        image_src = dict(db.session.query(VehicleDB.plate_number, ParkingSession.image_src)
+                         .join(ParkingSession, ParkingSession.vehicle_id == VehicleDB.id).all())
+    assert image_src['51F-30000'] is None
+    # Same file name on both cameras, stored under their own content hash
+    assert image_src['51F-10000'] != image_src['51F-20000']
+    stored = sorted(path.read_bytes() for path in (tmp_path / 'images').rglob('*.jpg'))
+    assert stored == [b'/cam1/snapshot.jpg', b'/cam2/snapshot.jpg']
@@ -0,0 +1,64 @@
+"""
+Exit of a known vehicle: a parked one is closed, billed and published to Firebase;
+one that is not parked changes nothing and publishes nothing, as before the outbox.
+"""
+import pytest
+from app.models import db, Transaction
+from app.service.session_index import active_sessions
+from app.service.vehicle import VehicleService
+from benchmarks.common import make_app
+from benchmarks.fake_firebase import FakeFirebase
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(str(tmp_path / 'exit.db'))
+    app.config['DB'] = FakeFirebase({'price': 2})
+    with app.app_context():
+        active_sessions.warm()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def gate(app, plate, action):
+    with app.app_context():
+        return VehicleService.handle_vehicle(app.config['DB'], {'licensePlate': plate, 'imageSrc': None}, action)
+
+def transactions(app):
+    with app.app_context():
+        return Transaction.query.count()
+
+def test_parked_vehicle_exit_is_billed_and_published(app):
+    firebase = app.config['DB']
+    gate(app, '29A-12345', 'enter')
+    assert gate(app, '29A-12345', 'exit')
+    assert transactions(app) == 1
+    assert firebase.data['vehicle_last_action']['action'] == 'exit'
+    assert firebase.data['vehicles']['29A-12345']['exitTime']
+
+def test_exit_of_vehicle_not_parked_publishes_nothing(app):
+    firebase = app.config['DB']
+    gate(app, '29A-12345', 'enter')
+    gate(app, '29A-12345', 'exit')
+    gate(app, '30B-22222', 'enter')
+    updates = firebase.calls_by_method.get('update', 0)
+
+    assert gate(app, '29A-12345', 'exit')
+    assert transactions(app) == 1
+    assert firebase.calls_by_method.get('update', 0) == updates
+    assert firebase.data['vehicle_last_action']['infor']['licensePlate'] == '30B-22222'
+
+def test_batch_exit_of_vehicle_not_parked_publishes_nothing(app):
+    firebase = app.config['DB']
+    gate(app, '29A-12345', 'enter')
+    gate(app, '29A-12345', 'exit')
+    gate(app, '30B-22222', 'enter')
+    updates = firebase.calls_by_method.get('update', 0)
+
+    response = app.test_client().post('/vehicle/handle/batch', json={'events': [
+        {'licensePlate': '29A-12345', 'status': 'exit'},
+    ]})
+    assert response.get_json()['applied'] == 1
+    assert 'fee' not in response.get_json()['results'][0]
+    assert transactions(app) == 1
+    assert firebase.calls_by_method.get('update', 0) == updates
@@ -0,0 +1,57 @@
+"""
+/api/vehicles/summary must run a constant number of SQL statements, whatever the number of vehicles
+(the N+1 it replaced ran two queries per vehicle).
+"""
+import pytest
+from datetime import datetime, timedelta
+from app.models import db, VehicleDB, ParkingSession
+from app.service.response_cache import response_cache
+from benchmarks.common import make_app, QueryCounter
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(str(tmp_path / 'summary.db'))
+    with app.app_context():
+        now = datetime(2024, 1, 1, 8, 0)
+        for i in range(5):
+            vehicle = VehicleDB(plate_number=f"TEST-{i:03d}")
+            db.session.add(vehicle)
+            db.session.flush()
+            for visit in range(3):
+                checkin = now + timedelta(hours=visit * 4)
+                # The last vehicle is still parked
+                checkout = None if i == 4 and visit == 2 else checkin + timedelta(hours=1)
+                db.session.add(ParkingSession(vehicle_id=vehicle.id, checkin_time=checkin, checkout_time=checkout))
+        db.session.commit()
+    # Cached responses would answer without touching SQLite
+    response_cache.invalidate()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def get_counted(app, url):
+    with app.app_context():
+        engine = db.engine
+    with QueryCounter(engine) as queries:
+        response = app.test_client().get(url)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json(), queries.count
+
+def test_summary_runs_one_statement(app):
+    body, count = get_counted(app, '/api/vehicles/summary')
+    assert count == 1
+    assert len(body) == 5
+    assert [row['parking_count'] for row in body] == [3] * 5
+    assert [row['status'] for row in body] == ['out'] * 4 + ['in']
+
+def test_summary_status_filter_runs_one_statement(app):
+    body, count = get_counted(app, '/api/vehicles/summary?status=in')
+    assert count == 1
+    assert [row['plate_number'] for row in body] == ['TEST-004']
+
+def test_paginated_summary_adds_only_the_count(app):
+    body, count = get_counted(app, '/api/vehicles/summary?page=2&per_page=2')
+    assert count == 2
+    assert body['total'] == 5
+    assert [row['plate_number'] for row in body['items']] == ['TEST-002', 'TEST-003']